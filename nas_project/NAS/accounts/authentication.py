@@ -0,0 +1,44 @@
+# accounts/authentication.py
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .tokens import IS_ACTIVE_CLAIM, REVOKED, TOKEN_VERSION_CLAIM, get_token_version
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    署名済みのクレーム（user_id / is_active / トークンバージョン）を信頼する JWT 認証
+
+    ユーザーの行は読まず、クレームの値だけを持つ User を返す（他のフィールドは遅延読み込み。
+    最初に触れたときに残りをまとめて1回で読む）。失効の判定はキャッシュ上の
+    トークンバージョンとの比較で行うため、通常はクエリを発行しない。
+    クレームを持たない旧形式のトークンは従来どおりDBから読む。
+    """
+
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token or IS_ACTIVE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if not validated_token[IS_ACTIVE_CLAIM]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        version = get_token_version(user_id)
+        if version == REVOKED:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if validated_token[TOKEN_VERSION_CLAIM] != version:
+            raise AuthenticationFailed("トークンは失効しています", code="token_revoked")
+
+        return User.from_db(
+            User.objects.db,
+            ["user_id", "is_active", "token_version"],
+            [user_id, True, version],
+        )
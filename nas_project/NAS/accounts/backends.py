@@ -1,60 +1,109 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
 from django.contrib.auth.backends import BaseBackend
-from django.contrib.auth import get_user_model
+from django.db.models import Q
 from .models import User, AdminUser
 
 
+# --------------------------------------
+# セッション復元用のプロセス内キャッシュ
+# {(種別, pk): (有効期限, インスタンス)}。プロフィール・パスワードの変更時は
+# シグナルで破棄する（他プロセスのキャッシュは AUTH_USER_CACHE_TTL 秒で切れる）
+# --------------------------------------
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+USER_CACHE_MAX_ENTRIES = 1000
+
+# ID の接頭辞で種別がわかる（User.save / AdminUser.save の採番形式）
+ID_PREFIXES = (("NA", AdminUser, "admin"), ("NU", User, "user"))
+
+
+def _cache_get(key):
+    entry = _user_cache.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    # リクエストごとに別インスタンスを返す（属性の変更が他のリクエストに漏れないように）
+    return copy.copy(entry[1])
+
+
+def _cache_set(key, instance):
+    ttl = settings.AUTH_USER_CACHE_TTL
+    if ttl <= 0:
+        return
+    now = time.monotonic()
+    with _user_cache_lock:
+        if len(_user_cache) >= USER_CACHE_MAX_ENTRIES:
+            for stale in [k for k, (expires, _) in _user_cache.items() if expires < now]:
+                del _user_cache[stale]
+            if len(_user_cache) >= USER_CACHE_MAX_ENTRIES:
+                _user_cache.clear()
+        _user_cache[key] = (now + ttl, copy.copy(instance))
+
+
+def invalidate_user(user_type, pk):
+    """キャッシュしたユーザーを破棄（保存・削除のシグナルから呼ぶ）"""
+    with _user_cache_lock:
+        _user_cache.pop((user_type, pk), None)
+
+
 class UserOrAdminBackend(BaseBackend):
 
     def authenticate(self, request, email=None, password=None, user_id=None, **kwargs):
-        if not password:
+        if not password or not email:
             return None
 
-        DjangoUser = get_user_model()
+        normalized = email.strip().lower()
 
         # --------------------------------------
-        # superuser は最優先で admin として扱う
+        # email の一意インデックスで引く（最大2クエリ）。照合の優先順は
+        #   1. superuser（User）は admin として扱う（入力どおりの email でも照合）
+        #   2. AdminUser
+        #   3. User
         # --------------------------------------
-        try:
-            su = DjangoUser.objects.get(email=email)
+        condition = Q(email=normalized)
+        if email != normalized:
+            condition |= Q(email=email, is_superuser=True)
+        users = list(User.objects.filter(condition))
+
+        # check_password は実際の行で照合する（ハッシュの更新が必要な場合もこのインスタンスが保存される）
+        for su in users:
             if su.is_superuser and su.check_password(password):
                 su._user_type = "admin"
                 return su
-        except DjangoUser.DoesNotExist:
-            pass
 
-        # --------------------------------------
-        # AdminUser 認証
-        # --------------------------------------
-        try:
-            admin = AdminUser.objects.get(email=email.strip().lower())
-            if admin.check_password(password) and admin.is_active:
-                admin._user_type = "admin"
-                return admin
-        except AdminUser.DoesNotExist:
-            pass
+        admin = AdminUser.objects.filter(email=normalized).first()
+        if admin is not None and admin.check_password(password) and admin.is_active:
+            admin._user_type = "admin"
+            return admin
 
-        # --------------------------------------
-        # User 認証
-        # --------------------------------------
-        try:
-            user = User.objects.get(email=email.strip().lower())
-            if user.check_password(password) and user.is_active:
+        for user in users:
+            if not user.is_superuser and user.check_password(password) and user.is_active:
                 user._user_type = "user"
                 return user
-        except User.DoesNotExist:
-            pass
 
         return None
 
     # --------------------------------------
-    # セッション復元は pk （標準id）だけでOK
+    # セッション復元: pk の接頭辞（NA/NU）で種別を判定し、対象のテーブルだけを引く
+    # キャッシュにあればクエリなし
     # --------------------------------------
     def get_user(self, pk):
-        DjangoUser = get_user_model()
+        models = [(model, user_type) for prefix, model, user_type in ID_PREFIXES if str(pk).startswith(prefix)]
+        if not models:
+            # 採番形式以外のID（手動で作成したアカウントなど）は両方を探す
+            models = [(AdminUser, "admin"), (User, "user")]
+
+        for model, user_type in models:
+            key = (user_type, pk)
+            cached = _cache_get(key)
+            if cached is not None:
+                return cached
 
-        for model in [AdminUser, User, DjangoUser]:
-            try:
-                return model.objects.get(pk=pk)
-            except model.DoesNotExist:
-                continue
+            instance = model.objects.filter(pk=pk).first()
+            if instance is not None:
+                _cache_set(key, instance)
+                return instance
         return None
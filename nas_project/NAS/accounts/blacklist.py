@@ -0,0 +1,202 @@
+# accounts/blacklist.py
+
+"""
+リフレッシュトークンのブラックリスト（simplejwt の token_blacklist）の補助
+
+- 照合: ブラックリスト入りの jti をプロセス内の Bloom フィルタに持ち、
+  フィルタにない（＝ブラックリストにない）トークンはDBを引かずに通す。
+  フィルタは AUTH_TOKEN_BLACKLIST_FILTER_TTL 秒ごとに、前回より新しい id の行だけを
+  読んで追加する（期限切れの分を落とすための全件の作り直しは FULL_REBUILD_INTERVAL 秒ごと）。
+  更新は1スレッドだけが行い、その間も他のリクエストは今のフィルタで照合する。
+  他プロセスで追加された分は次の更新まで含まれないが、ローテーション時のブラックリスト登録
+  （RefreshToken.blacklist）が一意制約で二重使用を検出するので、再利用は通らない。
+- 削除: 期限切れの OutstandingToken / BlacklistedToken を id の範囲ごとに削除する。
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1024
+PURGE_CHUNK_SIZE = 5000
+FULL_REBUILD_INTERVAL = 3600
+
+
+# ==========================================================
+# Bloom フィルタ
+# ==========================================================
+class BloomFilter:
+    """
+    文字列の集合の Bloom フィルタ（偽陽性はあるが偽陰性はない）
+
+    Args:
+        capacity: 想定する要素数（超えると偽陽性率が上がる）
+        error_rate: 想定する偽陽性率
+    """
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.count = 0
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = np.zeros(self.size, dtype=bool)
+
+    def _positions(self, values):
+        """値ごとの k 個の位置（len(values) x k の配列）"""
+        # 1回のハッシュから k 個の位置を作る（double hashing、uint64 の桁あふれは mod 2**64）
+        digests = b"".join(hashlib.blake2b(value.encode(), digest_size=16).digest() for value in values)
+        halves = np.frombuffer(digests, dtype="<u8").reshape(-1, 2)
+        h1 = halves[:, :1]
+        h2 = halves[:, 1:] | np.uint64(1)
+        return (h1 + np.arange(self.hashes, dtype=np.uint64) * h2) % np.uint64(self.size)
+
+    def add_many(self, values):
+        values = list(values)
+        if values:
+            self.bits[self._positions(values)] = True
+            self.count += len(values)
+
+    def add(self, value):
+        self.add_many([value])
+
+    def __contains__(self, value):
+        return bool(self.bits[self._positions([value])].all())
+
+
+_filter = None
+_filter_pid = None
+_last_id = 0
+_refreshed_at = 0.0
+_rebuilt_at = 0.0
+_lock = threading.Lock()
+
+
+def _active_blacklist():
+    return BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+
+
+def _build():
+    """期限内のブラックリストから Bloom フィルタを作る。(フィルタ, 読んだ最大の id) を返す"""
+    active = _active_blacklist()
+    bloom = BloomFilter(max(active.count() * 2, MIN_CAPACITY))
+    last_id = 0
+
+    chunk = []
+    for pk, jti in active.values_list("id", "token__jti").iterator(chunk_size=PURGE_CHUNK_SIZE):
+        chunk.append(jti)
+        last_id = max(last_id, pk)
+        if len(chunk) >= PURGE_CHUNK_SIZE:
+            bloom.add_many(chunk)
+            chunk = []
+    bloom.add_many(chunk)
+    return bloom, last_id
+
+
+def _refresh(bloom, last_id):
+    """前回より新しいブラックリストの行だけをフィルタに追加する。読んだ最大の id を返す"""
+    rows = list(
+        _active_blacklist().filter(id__gt=last_id).order_by("id").values_list("id", "token__jti")
+    )
+    if rows:
+        bloom.add_many(jti for _, jti in rows)
+        last_id = rows[-1][0]
+    return last_id
+
+
+def _current_filter():
+    global _filter, _filter_pid, _last_id, _refreshed_at, _rebuilt_at
+    now = time.monotonic()
+    pid = os.getpid()
+
+    if _filter is None or _filter_pid != pid:
+        # 初回（fork 後を含む）だけは作り終わるまで待つ
+        with _lock:
+            if _filter is None or _filter_pid != pid:
+                _filter, _last_id = _build()
+                _filter_pid = pid
+                _refreshed_at = _rebuilt_at = now
+        return _filter
+
+    if now - _refreshed_at < settings.AUTH_TOKEN_BLACKLIST_FILTER_TTL:
+        return _filter
+
+    # 更新中のスレッドがあれば待たずに今のフィルタで照合する
+    if not _lock.acquire(blocking=False):
+        return _filter
+    try:
+        if now - _refreshed_at >= settings.AUTH_TOKEN_BLACKLIST_FILTER_TTL:
+            if now - _rebuilt_at >= FULL_REBUILD_INTERVAL or _filter.count > _filter.capacity:
+                # 期限切れの分を落とし、容量を見直す（作り終えてから差し替える）
+                _filter, _last_id = _build()
+                _rebuilt_at = now
+            else:
+                _last_id = _refresh(_filter, _last_id)
+            _refreshed_at = now
+    finally:
+        _lock.release()
+    return _filter
+
+
+def might_be_blacklisted(jti):
+    """False ならブラックリストにない（フィルタ作成時点）。True ならDBで確認が必要"""
+    if settings.AUTH_TOKEN_BLACKLIST_FILTER_TTL <= 0:
+        return True
+    return jti in _current_filter()
+
+
+def remember_blacklisted(jti):
+    """このプロセスで登録した jti を、次の更新を待たずにフィルタへ反映"""
+    bloom = _filter
+    if bloom is not None and _filter_pid == os.getpid():
+        bloom.add(jti)
+
+
+# ==========================================================
+# 期限切れトークンの削除
+# ==========================================================
+def purge_expired(chunk_size=PURGE_CHUNK_SIZE, dry_run=False):
+    """
+    期限切れの OutstandingToken と、それに紐づく BlacklistedToken を削除する
+
+    expires_at には索引がないため、id の範囲ごとに区切って走査・削除する
+    （1回の DELETE で長時間テーブルをロックしないように）。
+
+    Returns:
+        dict: {'outstanding': 件数, 'blacklisted': 件数}
+    """
+    now = timezone.now()
+    result = {"outstanding": 0, "blacklisted": 0}
+
+    bounds = OutstandingToken.objects.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return result
+
+    for start in range(bounds["low"], bounds["high"] + 1, chunk_size):
+        ids = list(OutstandingToken.objects.filter(
+            id__gte=start, id__lt=start + chunk_size, expires_at__lte=now
+        ).values_list("id", flat=True))
+        if not ids:
+            continue
+
+        if dry_run:
+            result["outstanding"] += len(ids)
+            result["blacklisted"] += BlacklistedToken.objects.filter(token_id__in=ids).count()
+            continue
+
+        with transaction.atomic():
+            result["blacklisted"] += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            result["outstanding"] += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+
+    return result
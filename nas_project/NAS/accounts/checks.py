@@ -0,0 +1,27 @@
+# accounts/checks.py
+
+"""
+起動時のチェック（manage.py check / runserver / migrate で表示）
+"""
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_token_version_cache(app_configs, **kwargs):
+    """トークンバージョンのキャッシュに共有キャッシュが設定されているか"""
+    from django.core.cache import caches
+    from .tokens import PROCESS_LOCAL_CACHES
+
+    cache = caches[settings.AUTH_TOKEN_VERSION_CACHE]
+    if not isinstance(cache, PROCESS_LOCAL_CACHES):
+        return []
+    return [
+        Warning(
+            f"AUTH_TOKEN_VERSION_CACHE（'{settings.AUTH_TOKEN_VERSION_CACHE}'）がプロセスごとのキャッシュ"
+            f"（{type(cache).__name__}）のため、JWT 認証のたびにトークンバージョンをDBから読みます。",
+            hint="CACHE_BACKEND / CACHE_LOCATION で Redis や Memcached などの共有キャッシュを設定してください。",
+            id="accounts.W001",
+        )
+    ]
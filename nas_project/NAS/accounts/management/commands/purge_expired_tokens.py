@@ -0,0 +1,38 @@
+# accounts/management/commands/purge_expired_tokens.py
+
+from django.core.management.base import BaseCommand
+from accounts.blacklist import PURGE_CHUNK_SIZE, purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        '期限切れのリフレッシュトークン（OutstandingToken / BlacklistedToken）を'
+        '一定件数ずつ削除する。cron で日次実行を想定'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=PURGE_CHUNK_SIZE,
+            help=f'1回の削除で走査する id の範囲（デフォルト: {PURGE_CHUNK_SIZE}）'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='実際には削除せず、削除対象の件数を表示するだけ'
+        )
+
+    def handle(self, *args, **options):
+        result = purge_expired(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'【ドライラン】削除対象: 発行済みトークン {result["outstanding"]}件'
+                f'（うちブラックリスト {result["blacklisted"]}件）'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'発行済みトークン {result["outstanding"]}件'
+                f'（うちブラックリスト {result["blacklisted"]}件）を削除しました'
+            ))
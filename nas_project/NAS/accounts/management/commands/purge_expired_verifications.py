@@ -0,0 +1,58 @@
+# accounts/management/commands/purge_expired_verifications.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts.purge import PURGE_BATCH_SIZE, purge_expired_verifications, report_expired
+
+
+LABELS = {
+    'verification_token': '認証トークン',
+    'pre_registration': '仮登録',
+    'pending_email_change': 'メール変更',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        '期限切れの認証トークン・仮登録・メール変更を一定件数ずつ削除する。'
+        'cron で日次実行を想定'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PURGE_BATCH_SIZE,
+            help=f'1トランザクションで削除する件数（デフォルト: {PURGE_BATCH_SIZE}）'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='バッチ間の待ち時間[秒]（デフォルト: 0）'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='実際には削除せず、削除対象の件数を表示するだけ'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size は 1 以上を指定してください')
+
+        now = timezone.now()
+
+        if options['dry_run']:
+            report = report_expired(now)
+            self.stdout.write(self.style.WARNING('【ドライラン】削除対象:'))
+            for name, row in report.items():
+                oldest = timezone.localtime(row['oldest']).strftime('%Y-%m-%d %H:%M') if row['oldest'] else '-'
+                self.stdout.write(f'  - {LABELS[name]}: {row["rows"]}件（最も古い期限: {oldest}）')
+            return
+
+        result = purge_expired_verifications(
+            batch_size=options['batch_size'], pause=options['pause'], now=now
+        )
+        summary = '、'.join(f'{LABELS[name]} {rows}件' for name, rows in result.items())
+        self.stdout.write(self.style.SUCCESS(f'期限切れを削除しました: {summary}'))
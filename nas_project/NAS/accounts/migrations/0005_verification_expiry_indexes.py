@@ -0,0 +1,55 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:59
+
+from datetime import timedelta
+
+import accounts.models
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_email_change_expiry(apps, schema_editor):
+    """既存のメール変更は従来どおり作成から1日で期限切れにする"""
+    PendingEmailChange = apps.get_model('accounts', 'PendingEmailChange')
+    PendingEmailChange.objects.update(expires_at=F('created_at') + timedelta(days=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingemailchange',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=accounts.models.default_email_change_expires_at),
+        ),
+        migrations.RunPython(backfill_email_change_expiry, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='verificationtoken',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='pendingemailchange',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='preregistration',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='preregistration',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=accounts.models.default_expires_at),
+        ),
+        migrations.AlterField(
+            model_name='verificationtoken',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=accounts.models.default_expires_at),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:32
+
+import accounts.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_verification_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='token_version',
+            field=accounts.models.TokenVersionField(default=0),
+        ),
+    ]
@@ -1,5 +1,5 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from datetime import timedelta
 from django.utils import timezone
@@ -11,6 +11,23 @@ def default_expires_at():
     return timezone.now() + timedelta(hours=1)
 
 
+def default_email_change_expires_at():
+    return timezone.now() + timedelta(days=1)
+
+
+class TokenVersionField(models.PositiveIntegerField):
+    """
+    JWT のトークンバージョン
+    UPDATE ではインスタンスの値を書き戻さず、DB上の値をそのまま残す
+    （古いインスタンスの保存で失効が取り消されないように。進めるのは User.revoke_tokens() だけ）
+    """
+
+    def pre_save(self, model_instance, add):
+        if add:
+            return super().pre_save(model_instance, add)
+        return models.F(self.attname)
+
+
 # ======================================================
 # 共通マネージャー
 # ======================================================
@@ -86,6 +103,9 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     birthdate = models.DateField(db_column='date', verbose_name="生年月日", null=True, blank=True)
 
+    # ✅ JWT のトークンバージョン（進めると発行済みのトークンが無効になる。accounts/tokens.py）
+    token_version = TokenVersionField(default=0)
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
@@ -96,12 +116,43 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def save(self, *args, **kwargs):
         if not self.user_id:
+            from .sequences import format_id, max_suffix, next_value
             prefix = "NU"
-            last_user = User.objects.filter(user_id__startswith=prefix).order_by('-user_id').first()
-            next_num = int(last_user.user_id[2:]) + 1 if last_user and last_user.user_id[2:].isdigit() else 1
-            self.user_id = f"{prefix}{next_num:05d}"
+            # 利用者IDは画面に表示されるため、欠番が出ないよう1つずつ払い出す
+            next_num = next_value("user", block_size=1, initial=lambda: max_suffix(
+                User.objects.filter(user_id__startswith=prefix).order_by('-user_id')
+                .values_list('user_id', flat=True)[:1], prefix
+            ))
+            self.user_id = format_id(prefix, next_num, User._meta.get_field('user_id').max_length)
+        # set_password() のあとの保存だけをパスワード変更とみなす
+        # （check_password() によるハッシュの更新は _password を残さない）
+        password_changed = self._password is not None and not self._state.adding
+
         super().save(*args, **kwargs)
 
+        if password_changed:
+            self.revoke_tokens()
+
+    def revoke_tokens(self):
+        """発行済みのJWTをすべて失効させる（トークンバージョンをDB上で1つ進める）"""
+        from .tokens import publish_token_version
+
+        with transaction.atomic():
+            User.objects.filter(pk=self.pk).update(token_version=models.F('token_version') + 1)
+            self.token_version = User.objects.filter(pk=self.pk).values_list(
+                'token_version', flat=True
+            ).get()
+            publish_token_version(self.pk, self.token_version)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # JWT 認証で作った一部のフィールドだけの User は、最初に触れたときに残りをまとめて読む
+        if fields is not None:
+            fields = set(fields)
+            deferred_fields = self.get_deferred_fields()
+            if fields.intersection(deferred_fields):
+                fields = fields.union(deferred_fields)
+        super().refresh_from_db(using, fields, **kwargs)
+
     def __str__(self):
         return f"{self.user_id} / {self.email}"
 
@@ -141,10 +192,14 @@ class AdminUser(AbstractBaseUser, PermissionsMixin):
 
     def save(self, *args, **kwargs):
         if not self.admin_id:
+            from .sequences import format_id, max_suffix, next_value
             prefix = "NA"
-            last_admin = AdminUser.objects.filter(admin_id__startswith=prefix).order_by('-admin_id').first()
-            next_num = int(last_admin.admin_id[2:]) + 1 if last_admin and last_admin.admin_id[2:].isdigit() else 1
-            self.admin_id = f"{prefix}{next_num:05d}"
+            # 管理者の追加はまれなので、欠番が出ないよう1つずつ払い出す
+            next_num = next_value("admin", block_size=1, initial=lambda: max_suffix(
+                AdminUser.objects.filter(admin_id__startswith=prefix).order_by('-admin_id')
+                .values_list('admin_id', flat=True)[:1], prefix
+            ))
+            self.admin_id = format_id(prefix, next_num, AdminUser._meta.get_field('admin_id').max_length)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -176,7 +231,9 @@ class VerificationToken(models.Model):
 
     token = models.UUIDField(default=uuid.uuid4, unique=True)
     token_type = models.CharField(max_length=20, choices=TOKEN_TYPE_CHOICES)
-    expires_at = models.DateTimeField(default=default_expires_at)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # ✅ 期限切れの削除（purge_expired_verifications）で範囲検索するため索引を付ける
+    expires_at = models.DateTimeField(default=default_expires_at, db_index=True)
 
     def is_expired(self):
         return timezone.now() > self.expires_at
@@ -193,11 +250,12 @@ class PendingEmailChange(models.Model):
 
     new_email = models.EmailField(unique=True)
     token = models.UUIDField(default=uuid.uuid4, unique=True)
-    created_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(default=default_email_change_expires_at, db_index=True)  # 1日有効
     is_verified = models.BooleanField(default=False)
 
     def is_expired(self):
-        return (timezone.now() - self.created_at).days >= 1  # 1日有効
+        return timezone.now() >= self.expires_at
 
 
 # ======================================================
@@ -207,8 +265,8 @@ class PreRegistration(models.Model):
     id = models.AutoField(primary_key=True)
     email = models.EmailField(unique=True)
     token = models.UUIDField(default=uuid.uuid4, unique=True)
-    created_at = models.DateTimeField(default=timezone.now)
-    expires_at = models.DateTimeField(default=default_expires_at)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(default=default_expires_at, db_index=True)
 
     is_used = models.BooleanField(default=False)
 
@@ -224,4 +282,22 @@ class Device(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.device_id} ({self.user.email})"
\ No newline at end of file
+        return f"{self.device_id} ({self.user.email})"
+
+# ======================================================
+# 採番（利用者ID・管理者ID・ヘルプ記事ID・問い合わせID 共通）
+# ======================================================
+class IdSequence(models.Model):
+    """
+    名前ごとの採番カウンタ（最後に払い出した番号）
+    払い出しは accounts.sequences から SELECT ... FOR UPDATE で行う
+    """
+    name = models.CharField(max_length=20, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "id_sequence"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
@@ -0,0 +1,76 @@
+# accounts/purge.py
+
+"""
+期限切れの認証用データ（VerificationToken / PreRegistration / PendingEmailChange）の削除
+
+expires_at の索引で期限切れの行を少しずつ取り出し、バッチごとに短いトランザクションで
+削除する（ロックを長時間保持しないように）。期限切れの仮登録・メール変更を残すと、
+email / new_email の一意制約で同じアドレスの再登録を妨げるため、日次で実行する。
+"""
+
+import time
+
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import PendingEmailChange, PreRegistration, VerificationToken
+
+
+PURGE_BATCH_SIZE = 500
+
+# 削除順（トークン → 仮登録（残りのトークンは CASCADE）→ メール変更）
+PURGE_MODELS = (
+    ("verification_token", VerificationToken),
+    ("pre_registration", PreRegistration),
+    ("pending_email_change", PendingEmailChange),
+)
+
+
+def report_expired(now=None):
+    """
+    削除対象の件数と最も古い期限（ドライラン用）
+
+    Returns:
+        dict: {名前: {'rows': 件数, 'oldest': 最も古い expires_at}}
+    """
+    now = now or timezone.now()
+    return {
+        name: model.objects.filter(expires_at__lte=now).aggregate(rows=Count("pk"), oldest=Min("expires_at"))
+        for name, model in PURGE_MODELS
+    }
+
+
+def purge_expired_verifications(batch_size=PURGE_BATCH_SIZE, pause=0.0, now=None):
+    """
+    期限切れの行をバッチごとに削除する
+
+    Args:
+        batch_size: 1トランザクションで削除する行数
+        pause: バッチ間の待ち時間 [秒]（レプリケーション遅延・ロック競合の緩和）
+
+    Returns:
+        dict: {名前: 削除件数}（CASCADE で消えた行は含まない）
+    """
+    now = now or timezone.now()
+    result = {}
+
+    for name, model in PURGE_MODELS:
+        result[name] = 0
+        while True:
+            with transaction.atomic():
+                pks = list(
+                    model.objects.filter(expires_at__lte=now)
+                    .order_by("expires_at")
+                    .values_list("pk", flat=True)[:batch_size]
+                )
+                if pks:
+                    model.objects.filter(pk__in=pks).delete()
+            result[name] += len(pks)
+
+            if len(pks) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+    return result
@@ -0,0 +1,133 @@
+# accounts/sequences.py
+
+"""
+ID の採番（NU00001 / NA00001 / A001 / I00001 形式の連番）
+
+名前ごとのカウンタ行（id_sequence）を SELECT ... FOR UPDATE でロックして番号を払い出す。
+block_size > 1 の場合は一度にまとめて予約し、残りをプロセス内で使うため、
+ほとんどの採番はDBにアクセスしない（プロセスの再起動で未使用分は欠番になり、
+プロセスごとに別の範囲から払い出すため作成順とも一致しない）。
+利用者に見えるID（利用者・管理者・問い合わせ・ヘルプ記事）は欠番を出さないよう block_size=1 で払い出す。
+
+予約した番号をプロセス内で使い回すのは、予約したトランザクションがコミットされてから。
+呼び出し元のトランザクションがロールバックされた場合は予約ごと取り消され、
+他のプロセスに同じ番号が払い出されても重複しない。
+"""
+
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import IdSequence
+
+
+_blocks = {}  # {name: [next, end)}（このプロセスで使える予約済みの番号）
+_blocks_pid = None
+_lock = threading.Lock()
+
+
+def _local_blocks():
+    """fork 後の子プロセスが親の予約を使わないよう、プロセスごとに作り直す"""
+    global _blocks, _blocks_pid
+    if _blocks_pid != os.getpid():
+        _blocks = {}
+        _blocks_pid = os.getpid()
+    return _blocks
+
+
+def _publish(name, start, end):
+    with _lock:
+        blocks = _local_blocks()
+        if name not in blocks:
+            blocks[name] = [start, end]
+
+
+def _take_local(name):
+    with _lock:
+        block = _local_blocks().get(name)
+        if block is None:
+            return None
+        value = block[0]
+        block[0] += 1
+        if block[0] >= block[1]:
+            del _blocks[name]
+        return value
+
+
+def reserve(name, count, initial=None):
+    """
+    番号を count 個まとめて予約する（一括登録用。欠番は出ない）
+
+    Args:
+        name: カウンタ名
+        count: 予約する個数
+        initial: カウンタ行がない場合に既存データの最大番号を返す関数（初回のみ呼ばれる）
+
+    Returns:
+        range: 予約した番号
+    """
+    with transaction.atomic():
+        row = IdSequence.objects.select_for_update().filter(name=name).first()
+        if row is None:
+            try:
+                with transaction.atomic():
+                    row = IdSequence.objects.create(name=name, last_value=initial() if initial else 0)
+            except IntegrityError:
+                # 同時に作成された場合はそちらをロックして使う
+                row = IdSequence.objects.select_for_update().get(name=name)
+
+        start = row.last_value + 1
+        row.last_value += count
+        row.save(update_fields=["last_value", "updated_at"])
+
+    return range(start, start + count)
+
+
+def next_value(name, initial=None, block_size=None):
+    """
+    次の番号を1つ払い出す
+
+    Args:
+        name: カウンタ名
+        initial: カウンタ行がない場合に既存データの最大番号を返す関数
+        block_size: 一度に予約する個数（省略時は ID_SEQUENCE_BLOCK_SIZE）
+
+    Returns:
+        int: 番号
+    """
+    value = _take_local(name)
+    if value is not None:
+        return value
+
+    if block_size is None:
+        block_size = settings.ID_SEQUENCE_BLOCK_SIZE
+
+    values = reserve(name, block_size, initial)
+    if len(values) > 1:
+        transaction.on_commit(lambda: _publish(name, values[1], values.stop))
+    return values[0]
+
+
+def format_id(prefix, number, max_length):
+    """
+    prefix に番号を0埋めで続けたIDを返す（全体で max_length 文字。NU00012 など）
+
+    Raises:
+        ValueError: 番号が max_length に収まらない場合
+    """
+    width = max_length - len(prefix)
+    if number >= 10 ** width:
+        raise ValueError(f"{prefix} の番号が上限（{10 ** width - 1}）に達しました")
+    return f"{prefix}{number:0{width}d}"
+
+
+def max_suffix(ids, prefix):
+    """'NU00012' のようなIDの一覧から、prefix に続く番号の最大値を返す（初期値の計算用）"""
+    numbers = [
+        int(value[len(prefix):])
+        for value in ids
+        if value and value.startswith(prefix) and value[len(prefix):].isdigit()
+    ]
+    return max(numbers, default=0)
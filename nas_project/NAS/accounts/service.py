@@ -10,7 +10,7 @@ from accounts.repositories import UserRepository, VerificationTokenRepository
 from mail.services import MailService
 from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
-from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.tokens import RefreshToken
 from django.conf import settings
 
 
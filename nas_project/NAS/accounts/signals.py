@@ -0,0 +1,31 @@
+# accounts/signals.py
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .backends import invalidate_user
+from .models import User, AdminUser
+from .tokens import REVOKED, account_saved, publish_token_version
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """プロフィール・パスワードの変更や削除でセッション復元用のキャッシュを破棄"""
+    invalidate_user("user", instance.pk)
+
+
+@receiver(post_save, sender=User)
+def publish_user_token_version(sender, instance, **kwargs):
+    """無効化・有効化をJWTのトークンバージョンに反映（パスワード変更は User.revoke_tokens が反映）"""
+    account_saved(instance)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    publish_token_version(instance.pk, REVOKED)
+
+
+@receiver(post_save, sender=AdminUser)
+@receiver(post_delete, sender=AdminUser)
+def invalidate_cached_admin(sender, instance, **kwargs):
+    invalidate_user("admin", instance.pk)
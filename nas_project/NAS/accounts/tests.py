@@ -1,3 +1,379 @@
+from datetime import timedelta
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import backends, blacklist, sequences
+from .checks import check_token_version_cache
+from .models import AdminUser, IdSequence, PendingEmailChange, PreRegistration, User, VerificationToken
+from .purge import purge_expired_verifications
+
+
+PASSWORD = "pw12345!x"
+
+
+# ==========================================================
+# ID の採番
+# ==========================================================
+class IdSequenceTests(TestCase):
+
+    def test_reserve_returns_consecutive_ranges(self):
+        first = sequences.reserve("test-reserve", 3)
+        second = sequences.reserve("test-reserve", 2)
+
+        self.assertEqual(list(first), [1, 2, 3])
+        self.assertEqual(list(second), [4, 5])
+        self.assertEqual(IdSequence.objects.get(name="test-reserve").last_value, 5)
+
+    def test_initial_is_used_only_when_row_is_missing(self):
+        self.assertEqual(sequences.next_value("test-initial", initial=lambda: 41, block_size=1), 42)
+        self.assertEqual(sequences.next_value("test-initial", initial=lambda: 99, block_size=1), 43)
+
+    def test_block_is_used_locally_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sequences.next_value("test-block", block_size=5), 1)
+
+        # 予約済みの残り（2〜5）はDBにアクセスせずに払い出す
+        with self.assertNumQueries(0):
+            values = [sequences.next_value("test-block", block_size=5) for _ in range(4)]
+        self.assertEqual(values, [2, 3, 4, 5])
+        self.assertEqual(sequences.next_value("test-block", block_size=1), 6)
+
+    def test_block_is_not_used_before_commit(self):
+        # コミット前（ロールバックされうる）の予約はプロセス内で使い回さない
+        self.assertEqual(sequences.next_value("test-rollback", block_size=5), 1)
+        self.assertEqual(sequences.next_value("test-rollback", block_size=5), 6)
+
+    def test_user_ids_are_sequential(self):
+        users = []
+        for i in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                users.append(User.objects.create_user(email=f"seq{i}@example.com", password=PASSWORD, gender="男性"))
+        numbers = [int(user.user_id[2:]) for user in users]
+
+        self.assertTrue(all(user.user_id.startswith("NU") for user in users))
+        self.assertEqual(numbers, list(range(numbers[0], numbers[0] + 3)))
+
+    def test_user_ids_have_no_gaps_across_restarts(self):
+        first = User.objects.create_user(email="gap0@example.com", password=PASSWORD, gender="男性")
+        # プロセスの再起動（予約済みの番号の破棄）
+        sequences._blocks.clear()
+        second = User.objects.create_user(email="gap1@example.com", password=PASSWORD, gender="男性")
+
+        self.assertEqual(int(second.user_id[2:]), int(first.user_id[2:]) + 1)
+
+    def test_format_id_fits_the_field(self):
+        self.assertEqual(sequences.format_id("NU", 12, 7), "NU00012")
+        self.assertEqual(sequences.format_id("A", 999, 4), "A999")
+        with self.assertRaises(ValueError):
+            sequences.format_id("NU", 100000, 7)
+
+    def test_max_suffix(self):
+        self.assertEqual(sequences.max_suffix(["NU00003", "NU00012", "NA00099", None, "NUabc"], "NU"), 12)
+        self.assertEqual(sequences.max_suffix([], "NU"), 0)
+
+
+# ==========================================================
+# ログイン・トークンの失効
+# ==========================================================
+class LoginAndRevocationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="login@example.com", password=PASSWORD, gender="男性")
+        self.client = APIClient()
+
+    def _weaken_hash(self):
+        """反復回数の少ない（ログイン時に作り直しが必要な）ハッシュにする"""
+        hasher = PBKDF2PasswordHasher()
+        weak = hasher.encode(PASSWORD, hasher.salt(), iterations=1000)
+        User.objects.filter(pk=self.user.pk).update(password=weak)
+        return weak
+
+    def _login(self):
+        response = self.client.post(
+            reverse("api:user-login"), {"email": "login@example.com", "password": PASSWORD}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data["tokens"]
+
+    def _get_with(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client.get(reverse("api:health_data_list"))
+
+    def test_hash_upgrade_on_login_keeps_token_version(self):
+        version = User.objects.get(pk=self.user.pk).token_version
+        weak = self._weaken_hash()
+
+        tokens = self._login()
+
+        row = User.objects.get(pk=self.user.pk)
+        self.assertNotEqual(row.password, weak)
+        self.assertEqual(row.token_version, version)
+        self.assertEqual(self._get_with(tokens["access"]).status_code, 200)
+
+    def test_backend_hash_upgrade_does_not_reset_revocation(self):
+        self.user.revoke_tokens()
+        revoked = User.objects.get(pk=self.user.pk).token_version
+        self._weaken_hash()
+
+        account = authenticate(None, email="login@example.com", password=PASSWORD)
+
+        self.assertEqual(account.pk, self.user.pk)
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_version, revoked)
+
+    def test_password_change_revokes_issued_tokens(self):
+        tokens = self._login()
+        self.assertEqual(self._get_with(tokens["access"]).status_code, 200)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password("changed!!1")
+        user.save()
+
+        self.assertEqual(self._get_with(tokens["access"]).status_code, 401)
+
+    def test_revoke_tokens_bumps_version_in_db(self):
+        tokens = self._login()
+        stale = User.objects.get(pk=self.user.pk)
+
+        self.user.revoke_tokens()
+        # 古いインスタンスの保存でトークンバージョンが戻らない
+        stale.height = 170
+        stale.save()
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_version, self.user.token_version)
+        self.assertEqual(self._get_with(tokens["access"]).status_code, 401)
+
+    def test_full_save_does_not_write_token_version(self):
+        self.user.revoke_tokens()
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.revoke_tokens()
+
+        stale.token_version = 0
+        stale.save()
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_version, self.user.token_version)
+
+    def test_process_local_cache_is_warned(self):
+        local = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        with self.settings(CACHES={"default": local}):
+            self.assertEqual([w.id for w in check_token_version_cache(None)], ["accounts.W001"])
+
+        shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": "/tmp/nas-test-cache"}
+        with self.settings(CACHES={"default": shared}):
+            self.assertEqual(check_token_version_cache(None), [])
+
+    def test_inactive_user_is_rejected(self):
+        tokens = self._login()
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self._get_with(tokens["access"]).status_code, 401)
+
+
+# ==========================================================
+# 認証バックエンド（ログイン・セッション復元）
+# ==========================================================
+class BackendTests(TestCase):
+
+    def setUp(self):
+        backends._user_cache.clear()
+
+    def test_superuser_matches_raw_email_as_admin(self):
+        su = User.objects.create_superuser(email="Boss@example.com", password=PASSWORD, gender="男性")
+
+        account = authenticate(None, email="Boss@example.com", password=PASSWORD)
+
+        self.assertEqual(account.pk, su.pk)
+        self.assertEqual(account._user_type, "admin")
+
+    def test_raw_email_is_not_matched_for_regular_users(self):
+        User.objects.create_user(email="Mixed@example.com", password=PASSWORD, gender="男性")
+
+        self.assertIsNone(authenticate(None, email="Mixed@example.com", password=PASSWORD))
+
+    def test_admin_and_user_lookups(self):
+        admin = AdminUser.objects.create_user(email="admin@example.com", password=PASSWORD)
+        user = User.objects.create_user(email="member@example.com", password=PASSWORD, gender="男性")
+
+        # User → AdminUser の順に email の一意インデックスで引く
+        with self.assertNumQueries(2):
+            account = authenticate(None, email=" Admin@Example.com ", password=PASSWORD)
+        self.assertEqual((account.pk, account._user_type), (admin.pk, "admin"))
+
+        account = authenticate(None, email="member@example.com", password=PASSWORD)
+        self.assertEqual((account.pk, account._user_type), (user.pk, "user"))
+        self.assertIsNone(authenticate(None, email="member@example.com", password="wrong"))
+
+    def test_get_user_is_cached_until_saved(self):
+        user = User.objects.create_user(email="session@example.com", password=PASSWORD, gender="男性")
+        backend = backends.UserOrAdminBackend()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(user.pk).pk, user.pk)
+        with self.assertNumQueries(0):
+            cached = backend.get_user(user.pk)
+        # キャッシュからはリクエストごとに別のインスタンスを返す
+        self.assertIsNot(cached, backend.get_user(user.pk))
+
+        user.height = 180
+        user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(user.pk).height, 180)
+
+
+# ==========================================================
+# リフレッシュトークンのブラックリスト・期限切れの削除
+# ==========================================================
+class BlacklistTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="refresh@example.com", password=PASSWORD, gender="男性")
+        self.client = APIClient()
+
+    def _refresh(self, refresh):
+        return self.client.post(reverse("api:token-refresh"), {"refresh": refresh}, format="json")
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        tokens = self.client.post(
+            reverse("api:user-login"), {"email": "refresh@example.com", "password": PASSWORD}, format="json"
+        ).data["tokens"]
+
+        rotated = self._refresh(tokens["refresh"])
+        self.assertEqual(rotated.status_code, 200)
+        self.assertEqual(self._refresh(tokens["refresh"]).status_code, 401)
+        self.assertEqual(self._refresh(rotated.data["refresh"]).status_code, 200)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = blacklist.BloomFilter(100)
+        values = [f"jti-{i}" for i in range(100)]
+        for value in values:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(f"other-{i}" in bloom for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+    def test_add_many_matches_add(self):
+        values = [f"jti-{i}" for i in range(500)]
+        one_by_one = blacklist.BloomFilter(500)
+        for value in values:
+            one_by_one.add(value)
+        at_once = blacklist.BloomFilter(500)
+        at_once.add_many(values)
+
+        self.assertTrue((one_by_one.bits == at_once.bits).all())
+        self.assertEqual(at_once.count, 500)
+
+    def _blacklist(self, jti):
+        now = timezone.now()
+        token = OutstandingToken.objects.create(
+            user=self.user, jti=jti, token="x", created_at=now, expires_at=now + timedelta(days=1),
+        )
+        return BlacklistedToken.objects.create(token=token)
+
+    def test_filter_is_refreshed_incrementally(self):
+        self._blacklist("old")
+        self.addCleanup(setattr, blacklist, "_filter", None)
+        blacklist._filter = None
+
+        with self.settings(AUTH_TOKEN_BLACKLIST_FILTER_TTL=60):
+            self.assertTrue(blacklist.might_be_blacklisted("old"))
+            built = blacklist._current_filter()
+            self._blacklist("new")
+            self.assertFalse(blacklist.might_be_blacklisted("new"))
+
+            # 期限が来たら新しい id の行だけを読んで同じフィルタに追加する
+            blacklist._refreshed_at -= 60
+            self.assertTrue(blacklist.might_be_blacklisted("new"))
+            self.assertIs(blacklist._current_filter(), built)
+            self.assertEqual(built.count, 2)
+
+    def test_refresh_in_progress_does_not_block(self):
+        self._blacklist("old")
+        self.addCleanup(setattr, blacklist, "_filter", None)
+        blacklist._filter = None
+
+        with self.settings(AUTH_TOKEN_BLACKLIST_FILTER_TTL=60):
+            built = blacklist._current_filter()
+            blacklist._refreshed_at -= 60
+            # 他のスレッドが更新中の間は、DBを読まずに今のフィルタで照合する
+            with blacklist._lock, self.assertNumQueries(0):
+                self.assertIs(blacklist._current_filter(), built)
+
+    def test_purge_removes_only_expired_tokens(self):
+        now = timezone.now()
+        expired = [
+            OutstandingToken.objects.create(
+                user=self.user, jti=f"expired-{i}", token="x", created_at=now - timedelta(days=40),
+                expires_at=now - timedelta(days=10),
+            )
+            for i in range(3)
+        ]
+        active = OutstandingToken.objects.create(
+            user=self.user, jti="active", token="x", created_at=now, expires_at=now + timedelta(days=30),
+        )
+        BlacklistedToken.objects.create(token=expired[0])
+        BlacklistedToken.objects.create(token=active)
+
+        self.assertEqual(blacklist.purge_expired(chunk_size=2, dry_run=True), {"outstanding": 3, "blacklisted": 1})
+        self.assertEqual(OutstandingToken.objects.count(), 4)
+
+        self.assertEqual(blacklist.purge_expired(chunk_size=2), {"outstanding": 3, "blacklisted": 1})
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat=True)), ["active"])
+        self.assertTrue(BlacklistedToken.objects.filter(token=active).exists())
+
+
+# ==========================================================
+# 期限切れの認証用データの削除
+# ==========================================================
+class VerificationPurgeTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="verify@example.com", password=PASSWORD, gender="男性")
+
+    def test_purge_deletes_expired_rows_in_batches(self):
+        now = timezone.now()
+        past = now - timedelta(hours=1)
+        future = now + timedelta(hours=1)
+
+        for _ in range(3):
+            VerificationToken.objects.create(user=self.user, token_type="PASSWORD_RESET", expires_at=past)
+        kept_token = VerificationToken.objects.create(user=self.user, token_type="PASSWORD_RESET", expires_at=future)
+
+        expired_registration = PreRegistration.objects.create(email="old@example.com", expires_at=past)
+        # 期限内のトークンでも、期限切れの仮登録と一緒に CASCADE で消える
+        VerificationToken.objects.create(
+            pre_registration=expired_registration, token_type="REGISTRATION", expires_at=future
+        )
+        kept_registration = PreRegistration.objects.create(email="new@example.com", expires_at=future)
+
+        content_type = ContentType.objects.get_for_model(User)
+        PendingEmailChange.objects.create(
+            content_type=content_type, object_id=self.user.pk, new_email="gone@example.com", expires_at=past
+        )
+        kept_change = PendingEmailChange.objects.create(
+            content_type=content_type, object_id=self.user.pk, new_email="kept@example.com", expires_at=future
+        )
+
+        result = purge_expired_verifications(batch_size=2, now=now)
+
+        self.assertEqual(result, {"verification_token": 3, "pre_registration": 1, "pending_email_change": 1})
+        self.assertEqual(list(VerificationToken.objects.all()), [kept_token])
+        self.assertEqual(list(PreRegistration.objects.all()), [kept_registration])
+        self.assertEqual(list(PendingEmailChange.objects.all()), [kept_change])
+
+    def test_expired_pre_registration_frees_the_email(self):
+        PreRegistration.objects.create(email="again@example.com", expires_at=timezone.now() - timedelta(days=1))
+
+        purge_expired_verifications()
 
-# Create your tests here.
+        PreRegistration.objects.create(email="again@example.com")
+        self.assertEqual(PreRegistration.objects.filter(email="again@example.com").count(), 1)
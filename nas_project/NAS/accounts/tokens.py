@@ -0,0 +1,160 @@
+# accounts/tokens.py
+
+"""
+JWT のトークンバージョン（発行済みトークンの一括失効）
+
+アクセストークン・リフレッシュトークンには user_id に加えて is_active と
+トークンバージョン（tv）を入れて発行する。User.token_version を進めると、それより前に
+発行したトークンはすべて無効になる（パスワード変更時は User.save から自動で進む）。
+バージョンはDB上で F('token_version') + 1 として進め、インスタンスからは書き戻さない。
+
+認証のたびにDBを引かないよう、現在のバージョンは共有キャッシュ
+（AUTH_TOKEN_VERSION_CACHE）に置く。キャッシュにない場合だけDBから読む。
+無効化・削除されたユーザーは REVOKED として保持する。
+キャッシュがプロセスごと（LocMem など）の場合は他プロセスでの失効が届かないため、
+キャッシュを使わずに毎回DBから読む。
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt import tokens as jwt_tokens
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from . import blacklist as token_blacklist
+from .models import User
+
+
+TOKEN_VERSION_CLAIM = "tv"
+IS_ACTIVE_CLAIM = "is_active"
+REVOKED = -1
+
+# プロセス内にしか値を持たないキャッシュ（失効を他のプロセスと共有できない）
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def _cache():
+    """共有キャッシュ。プロセス内のキャッシュしか設定されていなければ None"""
+    cache = caches[settings.AUTH_TOKEN_VERSION_CACHE]
+    if isinstance(cache, PROCESS_LOCAL_CACHES):
+        return None
+    return cache
+
+
+def _key(user_id):
+    return f"auth:token_version:{user_id}"
+
+
+def _load(user_id):
+    version = User.objects.filter(pk=user_id, is_active=True).values_list(
+        "token_version", flat=True
+    ).first()
+    return REVOKED if version is None else version
+
+
+def get_token_version(user_id):
+    """
+    現在のトークンバージョンを返す（無効化・削除されたユーザーは REVOKED）
+    """
+    cache = _cache()
+    if cache is None:
+        return _load(user_id)
+
+    version = cache.get(_key(user_id))
+    if version is not None:
+        return version
+
+    version = _load(user_id)
+    # 同時に反映された新しい値を古い値で上書きしないよう add で入れる
+    cache.add(_key(user_id), version, settings.AUTH_TOKEN_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def publish_token_version(user_id, version):
+    """DBで確定したバージョン（または REVOKED）をコミット後にキャッシュへ反映"""
+    cache = _cache()
+    if cache is None:
+        return
+    key = _key(user_id)
+    transaction.on_commit(
+        lambda: cache.set(key, version, settings.AUTH_TOKEN_VERSION_CACHE_TIMEOUT)
+    )
+
+
+def account_saved(user):
+    """
+    ユーザーの保存を反映（無効化されたら REVOKED、再び有効化されたら破棄してDBから読み直す）
+    バージョン自体は revoke_tokens() だけが進めるため、ここでは書き込まない
+    """
+    cache = _cache()
+    if cache is None or "is_active" in user.get_deferred_fields():
+        return
+    if not user.is_active:
+        publish_token_version(user.pk, REVOKED)
+        return
+
+    key = _key(user.pk)
+
+    def reactivate():
+        if cache.get(key) == REVOKED:
+            cache.delete(key)
+
+    transaction.on_commit(reactivate)
+
+
+def is_current(token):
+    """トークンのバージョンが現在のものか（tv を持たない旧形式のトークンは照合しない）"""
+    if TOKEN_VERSION_CLAIM not in token:
+        return True
+    return token[TOKEN_VERSION_CLAIM] == get_token_version(token[api_settings.USER_ID_CLAIM])
+
+
+# ==========================================================
+# トークン・シリアライザー
+# ==========================================================
+class RefreshToken(jwt_tokens.RefreshToken):
+    """
+    is_active とトークンバージョンを入れて発行するリフレッシュトークン（アクセストークンにも引き継がれる）
+
+    ブラックリストの照合はプロセス内の Bloom フィルタで行い、該当しうる場合だけDBを引く。
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[IS_ACTIVE_CLAIM] = user.is_active
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+    def check_blacklist(self):
+        if token_blacklist.might_be_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        """
+        ブラックリストに登録する。既に登録済みなら TokenError
+        （フィルタに未反映の使用済みトークンによるローテーションをここで止める）
+        """
+        blacklisted, created = super().blacklist()
+        if not created:
+            raise TokenError("Token is blacklisted")
+        token_blacklist.remember_blacklisted(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted, created
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """失効したバージョンのリフレッシュトークンでは再発行しない"""
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        if not is_current(self.token_class(attrs["refresh"])):
+            raise InvalidToken("トークンは失効しています")
+        return super().validate(attrs)
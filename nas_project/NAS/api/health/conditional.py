@@ -0,0 +1,78 @@
+from datetime import datetime, time
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from health.services import HealthCounterService, JST
+
+
+class NotModified(Exception):
+    """条件付きGETでデータが変わっていない場合に送出（ハンドラーを実行せずに304を返す）"""
+
+
+class DataVersionConditionalMixin:
+    """
+    ユーザーのデータバージョンから ETag / Last-Modified を付け、
+    If-None-Match / If-Modified-Since が一致すれば集計を実行せずに 304 を返す
+
+    depends_on_date: 「今週」「直近7日」など今日の日付で結果が変わるビューは True
+    """
+    depends_on_date = False
+    # initial() で読んだデータバージョン（ハンドラーでキャッシュの照合に使う）
+    data_version = None
+
+    def _validators(self, request):
+        version, modified_at = HealthCounterService.get_version(request.user.pk)
+        self.data_version = version
+        etag = f"{request.user.pk}-{version}"
+
+        if self.depends_on_date:
+            today = timezone.now().astimezone(JST).date()
+            etag = f"{etag}-{today.isoformat()}"
+            day_start = datetime.combine(today, time.min, tzinfo=JST)
+            modified_at = max(modified_at, day_start) if modified_at else day_start
+
+        return quote_etag(etag), modified_at
+
+    def _not_modified(self, request, etag, modified_at):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            # 弱いETagも同じ値として扱う（RFC 9110 の弱い比較）
+            return '*' in etags or etag in [tag.removeprefix('W/') for tag in etags]
+
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return (
+            if_modified_since is not None
+            and modified_at is not None
+            and int(modified_at.timestamp()) <= if_modified_since
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        self._conditional = None
+        if request.method in ('GET', 'HEAD'):
+            etag, modified_at = self._validators(request)
+            self._conditional = (etag, modified_at)
+            if self._not_modified(request, etag, modified_at):
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        conditional = getattr(self, '_conditional', None)
+        if conditional and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            etag, modified_at = conditional
+            response['ETag'] = etag
+            if modified_at is not None:
+                response['Last-Modified'] = http_date(modified_at.timestamp())
+            # ユーザーごとのデータなので共有キャッシュには置かず、毎回再検証させる
+            response['Cache-Control'] = 'private, no-cache'
+
+        return response
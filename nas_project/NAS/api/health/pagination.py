@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class HealthDataCursorPagination(CursorPagination):
+    """身体データ一覧のカーソルページング（(user, measured_at) インデックスを利用）"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('-measured_at', '-id')
+
+
+class SleepDataCursorPagination(CursorPagination):
+    """睡眠データ一覧のカーソルページング（(user, date) インデックスを利用）"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-date'
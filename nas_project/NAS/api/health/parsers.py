@@ -0,0 +1,12 @@
+from rest_framework.parsers import BaseParser
+
+
+class HealthSampleBinaryParser(BaseParser):
+    """
+    身体データのバイナリ一括登録（application/octet-stream）
+    本文をそのまま bytes で返し、デコードは HealthDataService.decode_binary_samples で行う
+    """
+    media_type = 'application/octet-stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream.read()
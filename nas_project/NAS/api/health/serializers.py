@@ -1,35 +1,61 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import serializers
-from health.models import HealthData, SleepData
+from health.models import HealthData, SleepData, HealthAnomaly
+from health.services import (
+    BODY_TEMP_MIN, BODY_TEMP_MAX, HEART_RATE_MIN, HEART_RATE_MAX, MOTION_MIN, MOTION_MAX,
+    WINDOW_GRANULARITIES,
+)
 
 
 class HealthDataSerializer(serializers.ModelSerializer):
     """身体データのシリアライザー"""
     user_id = serializers.CharField(source='user.user_id', read_only=True)
+    # DBは0.01℃単位の整数だが、APIでは従来どおり "36.50" 形式で入出力する
+    body = serializers.DecimalField(max_digits=4, decimal_places=2)
     
     class Meta:
         model = HealthData
-        fields = ['id', 'user', 'user_id', 'measured_at', 'body', 'heart_rate']
+        fields = ['id', 'user', 'user_id', 'measured_at', 'body', 'heart_rate', 'motion', 'device_id']
         read_only_fields = ['id', 'user', 'user_id']
 
+    def validate_measured_at(self, value):
+        """更新時に同じ測定日時の別データと重複しないかチェック"""
+        if self.instance is not None and HealthData.objects.filter(
+            user_id=self.instance.user_id, measured_at=value
+        ).exclude(pk=self.instance.pk).exists():
+            raise serializers.ValidationError("同じ測定日時のデータが既に登録されています")
+        return value
+
 
 class HealthDataCreateSerializer(serializers.ModelSerializer):
     """身体データ登録用シリアライザー"""
+    body = serializers.DecimalField(max_digits=4, decimal_places=2)
+
     class Meta:
         model = HealthData
-        fields = ['measured_at', 'body', 'heart_rate']
+        fields = ['measured_at', 'body', 'heart_rate', 'motion', 'device_id']
         
     def validate_body(self, value):
         """体温の範囲チェック"""
-        if value < 30.0 or value > 45.0:
+        if value < BODY_TEMP_MIN or value > BODY_TEMP_MAX:
             raise serializers.ValidationError("体温は30.0〜45.0の範囲で入力してください")
         return value
     
     def validate_heart_rate(self, value):
         """心拍数の範囲チェック"""
-        if value < 30 or value > 250:
+        if value < HEART_RATE_MIN or value > HEART_RATE_MAX:
             raise serializers.ValidationError("心拍数は30〜250の範囲で入力してください")
         return value
 
+    def validate_motion(self, value):
+        """動きの範囲チェック"""
+        if value is not None and (value < MOTION_MIN or value > MOTION_MAX):
+            raise serializers.ValidationError("動きは0〜20の範囲で入力してください")
+        return value
+
 
 class SleepDataSerializer(serializers.ModelSerializer):
     """睡眠データのシリアライザー"""
@@ -69,6 +95,52 @@ class WeeklySleepDataSerializer(serializers.Serializer):
     period_label = serializers.CharField()
 
 
+class HealthWindowQuerySerializer(serializers.Serializer):
+    """複数期間グラフAPIのクエリパラメータ"""
+    granularity = serializers.ChoiceField(choices=WINDOW_GRANULARITIES, required=False, default='week')
+    count = serializers.IntegerField(required=False, default=1, min_value=1, max_value=53)
+    offset = serializers.IntegerField(required=False, default=0, min_value=0, max_value=520)
+
+
+class HealthWindowSerializer(serializers.Serializer):
+    """複数期間グラフAPIの1期間分"""
+    periods_ago = serializers.IntegerField()
+    start = serializers.DateField()
+    end = serializers.DateField()
+    period_label = serializers.CharField()
+    labels = serializers.ListField(child=serializers.CharField())
+    heart_rate = serializers.ListField(child=serializers.IntegerField(allow_null=True))
+    temperature = serializers.ListField(child=serializers.FloatField(allow_null=True))
+    sleep_hours = serializers.ListField(child=serializers.FloatField(allow_null=True))
+
+
+class HealthPercentileQuerySerializer(serializers.Serializer):
+    """心拍数パーセンタイルAPIのクエリパラメータ"""
+    granularity = serializers.ChoiceField(choices=WINDOW_GRANULARITIES, required=False, default='week')
+    offset = serializers.IntegerField(required=False, default=0, min_value=0, max_value=520)
+
+
+class HealthDailyPercentileSerializer(serializers.Serializer):
+    """心拍数パーセンタイルの1日分"""
+    date = serializers.DateField()
+    count = serializers.IntegerField()
+    p50 = serializers.IntegerField(allow_null=True)
+    p95 = serializers.IntegerField(allow_null=True)
+
+
+class HealthPercentileSerializer(serializers.Serializer):
+    """期間の心拍数パーセンタイル（日別ヒストグラムの合算）"""
+    start = serializers.DateField()
+    end = serializers.DateField()
+    period_label = serializers.CharField()
+    count = serializers.IntegerField()
+    mean = serializers.FloatField(allow_null=True)
+    min = serializers.IntegerField(allow_null=True)
+    max = serializers.IntegerField(allow_null=True)
+    percentiles = serializers.DictField(child=serializers.IntegerField(allow_null=True))
+    daily = HealthDailyPercentileSerializer(many=True)
+
+
 class HealthSummarySerializer(serializers.Serializer):
     """ヘルスデータサマリー用シリアライザー"""
     latest_body_temp = serializers.FloatField(allow_null=True)
@@ -77,4 +149,106 @@ class HealthSummarySerializer(serializers.Serializer):
     avg_body_temp_week = serializers.FloatField(allow_null=True)
     avg_heart_rate_week = serializers.IntegerField(allow_null=True)  # ✅ IntegerFieldに変更
     avg_sleep_hours_week = serializers.FloatField(allow_null=True)
-    total_records = serializers.IntegerField()
\ No newline at end of file
+    total_records = serializers.IntegerField()
+
+
+class HealthBaselineSerializer(serializers.Serializer):
+    """心拍数・体温の基準値（平均・標準偏差・EWMA）"""
+    count = serializers.IntegerField()
+    heart_rate_mean = serializers.FloatField(allow_null=True)
+    heart_rate_std = serializers.FloatField(allow_null=True)
+    heart_rate_ewma = serializers.FloatField(allow_null=True)
+    body_mean = serializers.FloatField(allow_null=True)
+    body_std = serializers.FloatField(allow_null=True)
+    body_ewma = serializers.FloatField(allow_null=True)
+    last_measured_at = serializers.DateTimeField(allow_null=True)
+
+
+class HealthAnomalySerializer(serializers.ModelSerializer):
+    """登録時に検出した異常値"""
+    class Meta:
+        model = HealthAnomaly
+        fields = ['id', 'measured_at', 'metric', 'value', 'baseline', 'std', 'z_score']
+        read_only_fields = fields
+
+
+class HealthRangeQuerySerializer(serializers.Serializer):
+    """
+    期間指定のクエリパラメータ（共通）
+    start / end は "2026-01-01"（JSTの日付、end はその日を含む）または ISO 8601 日時
+    """
+    start = serializers.CharField(required=False)
+    end = serializers.CharField(required=False)
+
+    @staticmethod
+    def _parse(value, is_end):
+        jst = ZoneInfo('Asia/Tokyo')
+
+        try:
+            # 日付のみの場合は JST のその日の0時（end は翌日0時）
+            day = parse_date(value)
+            if day is not None:
+                if is_end:
+                    day += timedelta(days=1)
+                return timezone.make_aware(datetime.combine(day, time.min), jst)
+
+            parsed = parse_datetime(value)
+        except (ValueError, OverflowError):
+            # 形式は正しいが存在しない日付（2026-02-30 など）
+            parsed = None
+        if parsed is None:
+            raise serializers.ValidationError("日付または日時の形式が正しくありません")
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, jst)
+
+    def validate_start(self, value):
+        return self._parse(value, is_end=False)
+
+    def validate_end(self, value):
+        return self._parse(value, is_end=True)
+
+    def validate(self, attrs):
+        start = attrs.get('start')
+        end = attrs.get('end')
+        if start and end and start >= end:
+            raise serializers.ValidationError("start は end より前を指定してください")
+        return attrs
+
+
+class HealthSeriesQuerySerializer(HealthRangeQuerySerializer):
+    """時系列API（間引き）のクエリパラメータ。期間の省略時は直近30日"""
+    points = serializers.IntegerField(required=False, default=300, min_value=3, max_value=2000)
+    mode = serializers.ChoiceField(choices=['minmax', 'lttb'], required=False, default='minmax')
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        end = attrs.get('end') or timezone.now()
+        start = attrs.get('start') or end - timedelta(days=30)
+        if start >= end:
+            raise serializers.ValidationError("start は end より前を指定してください")
+        attrs['start'] = start
+        attrs['end'] = end
+        return attrs
+
+
+class HealthExportQuerySerializer(HealthRangeQuerySerializer):
+    """エクスポートAPIのクエリパラメータ。期間の省略時は全期間"""
+    format = serializers.ChoiceField(choices=['csv', 'ndjson'], required=False, default='csv')
+    gzip = serializers.BooleanField(required=False, default=False)
+
+
+class HealthListQuerySerializer(serializers.Serializer):
+    """身体データ一覧の絞り込み（since 以上 until 未満、形式は HealthRangeQuerySerializer と同じ）"""
+    since = serializers.CharField(required=False)
+    until = serializers.CharField(required=False)
+
+    def validate_since(self, value):
+        return HealthRangeQuerySerializer._parse(value, is_end=False)
+
+    def validate_until(self, value):
+        return HealthRangeQuerySerializer._parse(value, is_end=True)
+
+
+class SleepListQuerySerializer(serializers.Serializer):
+    """睡眠データ一覧の絞り込み（since〜until の日付、両端を含む）"""
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
@@ -1,17 +1,25 @@
 from django.urls import path
 from .views import (
     HealthDataListCreateView,
+    HealthDataBatchCreateView,
     HealthDataDetailView,
     SleepDataListCreateView,
     SleepDataDetailView,
     WeeklyHealthDataView,
     WeeklySleepDataView,
+    HealthWindowsView,
     HealthSummaryView,
+    HealthPercentileView,
+    HealthBaselineView,
+    HealthAnomalyListView,
+    HealthSeriesView,
+    HealthDataExportView,
 )
 
 urlpatterns = [
     # 身体データ
     path('data/', HealthDataListCreateView.as_view(), name='health_data_list'),
+    path('data/batch/', HealthDataBatchCreateView.as_view(), name='health_data_batch'),
     path('data/<int:pk>/', HealthDataDetailView.as_view(), name='health_data_detail'),
     
     # 睡眠データ
@@ -22,6 +30,20 @@ urlpatterns = [
     path('weekly/body/', WeeklyHealthDataView.as_view(), name='weekly_health'),
     path('weekly/sleep/', WeeklySleepDataView.as_view(), name='weekly_sleep'),
     
+    # 複数期間のグラフデータ
+    path('windows/', HealthWindowsView.as_view(), name='health_windows'),
+    
+    # 長期間グラフ用の時系列
+    path('series/', HealthSeriesView.as_view(), name='health_series'),
+    
+    # エクスポート
+    path('export/', HealthDataExportView.as_view(), name='health_export'),
+    
     # サマリー
     path('summary/', HealthSummaryView.as_view(), name='health_summary'),
+    path('percentiles/', HealthPercentileView.as_view(), name='health_percentiles'),
+    
+    # 基準値・異常値
+    path('baseline/', HealthBaselineView.as_view(), name='health_baseline'),
+    path('anomalies/', HealthAnomalyListView.as_view(), name='health_anomalies'),
 ]
\ No newline at end of file
@@ -1,11 +1,27 @@
-from datetime import date, timedelta, datetime
+import csv
+import io
+import json
+import zlib
+from datetime import date, timedelta
 from zoneinfo import ZoneInfo
-from django.db.models import Avg
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import generics, permissions, status
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from health.models import HealthData, SleepData
+from health import write_behind
+from health.models import HealthData, SleepData, HealthAnomaly
+from health.services import (
+    HealthDataService,
+    HealthSummaryService,
+    HealthWindowService,
+    HealthVitalsService,
+    HealthPercentileService,
+    BATCH_MAX_SAMPLES,
+    BINARY_SAMPLE_DTYPE,
+)
 from .serializers import (
     HealthDataSerializer,
     HealthDataCreateSerializer,
@@ -14,26 +30,175 @@ from .serializers import (
     WeeklyHealthDataSerializer,
     WeeklySleepDataSerializer,
     HealthSummarySerializer,
+    HealthPercentileQuerySerializer,
+    HealthPercentileSerializer,
+    HealthBaselineSerializer,
+    HealthAnomalySerializer,
+    HealthWindowQuerySerializer,
+    HealthWindowSerializer,
+    HealthSeriesQuerySerializer,
+    HealthExportQuerySerializer,
+    HealthListQuerySerializer,
+    SleepListQuerySerializer,
 )
+from .pagination import HealthDataCursorPagination, SleepDataCursorPagination
+from .parsers import HealthSampleBinaryParser
+from .conditional import DataVersionConditionalMixin
+
+
+def _ingest_batch(user, rows, rejects, device_id=None):
+    """
+    検証済みの行を一括登録し、一括登録APIの共通レスポンスを返す
+    write-behind が有効ならスプールに積んで 202 を返す（重複は登録時にスキップされる）
+    """
+    if rows and write_behind.enqueue(user, rows, device_id=device_id):
+        return Response({
+            'accepted': len(rows),
+            'rejected': len(rejects),
+            'errors': rejects,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    created, duplicates = (
+        HealthDataService.bulk_create_health_data(user, rows, device_id=device_id)
+        if rows else (0, 0)
+    )
+
+    if created:
+        response_status = status.HTTP_201_CREATED
+    elif duplicates:
+        response_status = status.HTTP_200_OK
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+
+    return Response({
+        'created': created,
+        'duplicates': duplicates,
+        'rejected': len(rejects),
+        'errors': rejects,
+    }, status=response_status)
 
 
 # ==========================================================
 # 身体データ一覧・登録
 # ==========================================================
-class HealthDataListCreateView(generics.ListCreateAPIView):
-    """身体データの一覧取得・登録"""
+class HealthDataListCreateView(DataVersionConditionalMixin, generics.ListCreateAPIView):
+    """
+    身体データの一覧取得・登録
+    一覧: ?since=2026-01-01&until=2026-01-31&page_size=100&cursor=...
+    登録: JSON で1件、または application/octet-stream で固定長レコードを一括
+          （レコード形式は health.services.BINARY_SAMPLE_DTYPE、デバイスIDは X-Device-ID ヘッダー）
+    """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HealthDataCursorPagination
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, HealthSampleBinaryParser]
     
     def get_queryset(self):
-        return HealthData.objects.filter(user=self.request.user).order_by('-measured_at')
+        queryset = HealthData.objects.filter(user=self.request.user)
+
+        if self.request.method == 'GET':
+            params = HealthListQuerySerializer(data=self.request.query_params)
+            params.is_valid(raise_exception=True)
+            if params.validated_data.get('since'):
+                queryset = queryset.filter(measured_at__gte=params.validated_data['since'])
+            if params.validated_data.get('until'):
+                queryset = queryset.filter(measured_at__lt=params.validated_data['until'])
+
+        return queryset.select_related('user')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return HealthDataCreateSerializer
         return HealthDataSerializer
     
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+    def create(self, request, *args, **kwargs):
+        """同じ測定日時のデータが登録済みなら新規作成せず既存データを返す（再送対策）"""
+        if isinstance(request.data, bytes):
+            return self.create_binary(request)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        row = (data.get('measured_at') or timezone.now(), data['body'], data['heart_rate'], data.get('motion'))
+        if write_behind.enqueue(request.user, [row], device_id=data.get('device_id')):
+            return Response(
+                dict(serializer.data, measured_at=row[0], queued=True),
+                status=status.HTTP_202_ACCEPTED
+            )
+
+        instance, created = HealthDataService.create_health_data(request.user, data)
+
+        return Response(
+            dict(HealthDataCreateSerializer(instance).data, duplicate=not created),
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def create_binary(self, request):
+        """固定長バイナリレコードの一括登録（レスポンスは一括登録APIと同じ）"""
+        payload = request.data
+        device_id = request.headers.get('X-Device-ID') or None
+
+        if device_id is not None and len(device_id) > 50:
+            return Response(
+                {'error': 'device_id は50文字以内の文字列で指定してください'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not payload:
+            return Response(
+                {'error': '1件以上のデータを送信してください'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if len(payload) > BATCH_MAX_SAMPLES * BINARY_SAMPLE_DTYPE.itemsize:
+            return Response(
+                {'error': f'一度に登録できるのは{BATCH_MAX_SAMPLES}件までです'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            rows, rejects = HealthDataService.decode_binary_samples(payload)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return _ingest_batch(request.user, rows, rejects, device_id=device_id)
+
+
+# ==========================================================
+# 身体データ一括登録（ウェアラブルの分単位サンプル）
+# ==========================================================
+class HealthDataBatchCreateView(APIView):
+    """
+    身体データの一括登録API
+    Body: [{measured_at, body, heart_rate}, ...] または {"device_id": "...", "samples": [...]}
+    登録済みの測定日時は重複としてスキップするため、同じバッチを再送しても安全
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        samples = request.data if isinstance(request.data, list) else request.data.get('samples')
+        device_id = None if isinstance(request.data, list) else request.data.get('device_id')
+
+        if device_id is not None and (not isinstance(device_id, str) or len(device_id) > 50):
+            return Response(
+                {'error': 'device_id は50文字以内の文字列で指定してください'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not isinstance(samples, list) or not samples:
+            return Response(
+                {'error': 'samples に1件以上のデータを指定してください'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if len(samples) > BATCH_MAX_SAMPLES:
+            return Response(
+                {'error': f'一度に登録できるのは{BATCH_MAX_SAMPLES}件までです'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows, rejects = HealthDataService.validate_samples(samples)
+        return _ingest_batch(request.user, rows, rejects, device_id=device_id)
 
 
 # ==========================================================
@@ -51,12 +216,26 @@ class HealthDataDetailView(generics.RetrieveUpdateDestroyAPIView):
 # ==========================================================
 # 睡眠データ一覧・登録
 # ==========================================================
-class SleepDataListCreateView(generics.ListCreateAPIView):
-    """睡眠データの一覧取得・登録"""
+class SleepDataListCreateView(DataVersionConditionalMixin, generics.ListCreateAPIView):
+    """
+    睡眠データの一覧取得・登録
+    一覧: ?since=2026-01-01&until=2026-01-31&page_size=100&cursor=...
+    """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SleepDataCursorPagination
     
     def get_queryset(self):
-        return SleepData.objects.filter(user=self.request.user).order_by('-date')
+        queryset = SleepData.objects.filter(user=self.request.user)
+
+        if self.request.method == 'GET':
+            params = SleepListQuerySerializer(data=self.request.query_params)
+            params.is_valid(raise_exception=True)
+            if params.validated_data.get('since'):
+                queryset = queryset.filter(date__gte=params.validated_data['since'])
+            if params.validated_data.get('until'):
+                queryset = queryset.filter(date__lte=params.validated_data['until'])
+
+        return queryset.select_related('user')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -78,6 +257,10 @@ class SleepDataDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return SleepData.objects.filter(user=self.request.user)
 
+    def perform_update(self, serializer):
+        # 利用者が修正した夜は、再判定で睡眠と判定されなくても削除しない
+        serializer.save(detected=False)
+
 
 # ==========================================================
 # ✅ ヘルパー関数: 日本時間ベースで週の範囲を取得
@@ -106,49 +289,21 @@ def get_week_range_jst(weeks_ago=0):
 # ==========================================================
 # 週間身体データ取得
 # ==========================================================
-class WeeklyHealthDataView(APIView):
+class WeeklyHealthDataView(DataVersionConditionalMixin, APIView):
     """週間身体データ取得API"""
     permission_classes = [permissions.IsAuthenticated]
+    depends_on_date = True  # ✅ 今日の日付で期間が変わる
 
     def get(self, request):
         user = request.user
         weeks_ago = int(request.GET.get("weeks_ago", 0))
 
-        jst = ZoneInfo('Asia/Tokyo')
         start_of_week, end_of_week, date_list = get_week_range_jst(weeks_ago)
 
         labels = ["日", "月", "火", "水", "木", "金", "土"]
-        heart_rate = []
-        temperature = []
-
-        # ✅ 事前フィルタを廃止し、各曜日ごとにJSTで直接クエリ
-        # 理由：事前フィルタはUTC日付基準になり、JST深夜帯（23:00 UTC = 翌08:00 JST）の
-        #       データが別の曜日に分類されてしまうため
-        for day in date_list:
-            day_start = timezone.make_aware(
-                datetime.combine(day, datetime.min.time()), jst
-            )
-            day_end = timezone.make_aware(
-                datetime.combine(day, datetime.max.time()), jst
-            )
-
-            day_data = HealthData.objects.filter(
-                user=user,
-                measured_at__gte=day_start,
-                measured_at__lte=day_end
-            )
 
-            if day_data.exists():
-                avg = day_data.aggregate(
-                    avg_hr=Avg('heart_rate'),
-                    avg_temp=Avg('body')
-                )
-                heart_rate.append(round(avg['avg_hr']) if avg['avg_hr'] else None)
-                # ✅ float()でDecimal型エラーを防ぐ
-                temperature.append(round(float(avg['avg_temp']), 1) if avg['avg_temp'] else None)
-            else:
-                heart_rate.append(None)
-                temperature.append(None)
+        # ✅ 日本時間の日付でGROUP BYし、1クエリで7日分を集計
+        heart_rate, temperature = HealthDataService.get_daily_averages(user, date_list)
 
         period_label = f"{start_of_week.month}/{start_of_week.day} ~ {end_of_week.month}/{end_of_week.day}"
 
@@ -166,9 +321,10 @@ class WeeklyHealthDataView(APIView):
 # ==========================================================
 # 週間睡眠データ取得
 # ==========================================================
-class WeeklySleepDataView(APIView):
+class WeeklySleepDataView(DataVersionConditionalMixin, APIView):
     """週間睡眠データ取得API"""
     permission_classes = [permissions.IsAuthenticated]
+    depends_on_date = True  # ✅ 今日の日付で期間が変わる
 
     def get(self, request):
         user = request.user
@@ -207,52 +363,208 @@ class WeeklySleepDataView(APIView):
 
 
 # ==========================================================
-# ヘルスデータサマリー
+# 複数期間のグラフデータ（日・週・月・年 × N期間）
 # ==========================================================
-class HealthSummaryView(APIView):
-    """ヘルスデータのサマリー情報取得"""
+class HealthWindowsView(DataVersionConditionalMixin, APIView):
+    """
+    複数期間グラフデータ取得API（身体・睡眠をまとめて返す）
+    Query: ?granularity=day|week|month|year&count=12&offset=0
+    """
     permission_classes = [permissions.IsAuthenticated]
+    depends_on_date = True  # ✅ 今日の日付で期間が変わる
 
     def get(self, request):
-        user = request.user
+        serializer = HealthWindowQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        windows = HealthWindowService.get_windows(
+            request.user,
+            params['granularity'],
+            params['count'],
+            params['offset'],
+        )
+        return Response({
+            'granularity': params['granularity'],
+            'windows': HealthWindowSerializer(windows, many=True).data,
+        })
 
-        latest_health = HealthData.objects.filter(user=user).order_by('-measured_at').first()
-        latest_sleep = SleepData.objects.filter(user=user).order_by('-date').first()
 
-        jst = ZoneInfo('Asia/Tokyo')
-        today_jst = timezone.now().astimezone(jst).date()
-        week_ago = today_jst - timedelta(days=7)
+# ==========================================================
+# 長期間グラフ用の時系列（サーバー側で間引き）
+# ==========================================================
+class HealthSeriesView(APIView):
+    """
+    間引き済み時系列取得API
+    Query: ?start=2026-01-01&end=2026-12-31&points=300&mode=minmax|lttb
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-        week_ago_start = timezone.make_aware(
-            datetime.combine(week_ago, datetime.min.time()), jst
+    def get(self, request):
+        serializer = HealthSeriesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        data = HealthDataService.get_downsampled_series(
+            request.user,
+            params['start'],
+            params['end'],
+            params['points'],
+            params['mode'],
         )
+        return Response(data)
 
-        week_health_avg = HealthData.objects.filter(
-            user=user,
-            measured_at__gte=week_ago_start
-        ).aggregate(
-            avg_temp=Avg('body'),
-            avg_hr=Avg('heart_rate')
-        )
 
-        week_sleep_avg = SleepData.objects.filter(
-            user=user,
-            date__gte=week_ago
-        ).aggregate(
-            avg_sleep=Avg('sleep_hours')
+# ==========================================================
+# 身体データの全履歴エクスポート（ストリーミング）
+# ==========================================================
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """?format= をエクスポート形式として使うため、レンダラーの選択には使わない"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def _export_stream(chunks, export_format):
+    """チャンクごとに CSV / NDJSON のバイト列を生成"""
+    jst = ZoneInfo('Asia/Tokyo')
+
+    if export_format == 'csv':
+        yield "measured_at,body,heart_rate\n".encode('utf-8')
+
+    for rows in chunks:
+        buffer = io.StringIO()
+        if export_format == 'csv':
+            writer = csv.writer(buffer, lineterminator='\n')
+            for measured_at, body, heart_rate in rows:
+                writer.writerow([measured_at.astimezone(jst).isoformat(), f"{body:.2f}", heart_rate])
+        else:
+            for measured_at, body, heart_rate in rows:
+                buffer.write(json.dumps({
+                    "measured_at": measured_at.astimezone(jst).isoformat(),
+                    "body": body,
+                    "heart_rate": heart_rate,
+                }))
+                buffer.write('\n')
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _gzip_stream(stream):
+    """バイト列のストリームを gzip 形式で逐次圧縮"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for data in stream:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class HealthDataExportView(APIView):
+    """
+    身体データのエクスポートAPI
+    Query: ?format=csv|ndjson&start=2025-01-01&end=2025-12-31&gzip=1
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    content_negotiation_class = ExportContentNegotiation
+
+    def get(self, request):
+        serializer = HealthExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        export_format = params['format']
+
+        # ✅ チャンク単位で読み込み・書き出しするため、件数によらずメモリ使用量は一定
+        chunks = HealthDataService.iter_export_chunks(
+            request.user,
+            start=params.get('start'),
+            end=params.get('end'),
         )
+        stream = _export_stream(chunks, export_format)
 
-        total_records = HealthData.objects.filter(user=user).count()
+        filename = f"health_data_{request.user.pk}.{export_format}"
+        if export_format == 'csv':
+            content_type = 'text/csv; charset=utf-8'
+        else:
+            content_type = 'application/x-ndjson; charset=utf-8'
 
-        data = {
-            "latest_body_temp": float(latest_health.body) if latest_health else None,
-            "latest_heart_rate": int(latest_health.heart_rate) if latest_health else None,
-            "latest_sleep_hours": float(latest_sleep.sleep_hours) if latest_sleep else None,
-            "avg_body_temp_week": round(float(week_health_avg['avg_temp']), 1) if week_health_avg['avg_temp'] else None,
-            "avg_heart_rate_week": round(week_health_avg['avg_hr']) if week_health_avg['avg_hr'] else None,
-            "avg_sleep_hours_week": round(float(week_sleep_avg['avg_sleep']), 1) if week_sleep_avg['avg_sleep'] else None,
-            "total_records": total_records
-        }
+        if params['gzip']:
+            stream = _gzip_stream(stream)
+            filename += '.gz'
+            content_type = 'application/gzip'
+
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+# ==========================================================
+# ヘルスデータサマリー
+# ==========================================================
+class HealthSummaryView(DataVersionConditionalMixin, APIView):
+    """ヘルスデータのサマリー情報取得"""
+    permission_classes = [permissions.IsAuthenticated]
+    depends_on_date = True  # ✅ 今日の日付で期間が変わる
+
+    def get(self, request):
+        # ✅ ユーザー別キャッシュから取得（書き込み時に差分更新されるため通常はDBアクセスなし）
+        # 条件付きGETで読んだデータバージョンと一致するエントリだけを使う
+        data = HealthSummaryService.get_summary(request.user, version=self.data_version)
 
         serializer = HealthSummarySerializer(data)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+class HealthPercentileView(DataVersionConditionalMixin, APIView):
+    """
+    心拍数のパーセンタイル（中央値・p95 など）取得API
+    Query: ?granularity=day|week|month|year&offset=0
+    日別ヒストグラムを足し合わせるため、生データは読まない
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    depends_on_date = True  # ✅ 今日の日付で期間が変わる
+
+    def get(self, request):
+        params = HealthPercentileQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        data = HealthPercentileService.get_percentiles(
+            request.user,
+            granularity=params.validated_data['granularity'],
+            offset=params.validated_data['offset'],
+        )
+
+        serializer = HealthPercentileSerializer(data)
+        return Response(serializer.data)
+
+
+# ==========================================================
+# 基準値・異常値
+# ==========================================================
+class HealthBaselineView(DataVersionConditionalMixin, APIView):
+    """心拍数・体温の基準値取得API（登録時に更新される1行を読むだけ）"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        data = HealthVitalsService.get_baseline(request.user)
+
+        serializer = HealthBaselineSerializer(data)
+        return Response(serializer.data)
+
+
+class HealthAnomalyListView(DataVersionConditionalMixin, generics.ListAPIView):
+    """
+    異常値の一覧取得API（新しい順）
+    Query: ?metric=heart_rate|body&page_size=100&cursor=...
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = HealthAnomalySerializer
+    pagination_class = HealthDataCursorPagination
+
+    def get_queryset(self):
+        queryset = HealthAnomaly.objects.filter(user=self.request.user)
+
+        metric = self.request.query_params.get('metric')
+        if metric:
+            queryset = queryset.filter(metric=metric)
+
+        return queryset
\ No newline at end of file
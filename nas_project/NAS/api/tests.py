@@ -1,3 +1,319 @@
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from health.models import HealthData
+from health.services import BINARY_SAMPLE_DTYPE, JST, HealthDataService
+
+
+class HealthAPITestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.HEALTH_SUMMARY_CACHE].clear()
+        self.user = User.objects.create_user(email="api@example.com", password="pw12345!x", gender="男性")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now().replace(second=0, microsecond=0)
+
+    def _samples(self, count, offset=0):
+        return [
+            {
+                "measured_at": (self.now - timedelta(minutes=offset + i)).isoformat(),
+                "body": 36.5,
+                "heart_rate": 60 + i % 30,
+            }
+            for i in range(count)
+        ]
+
+
+# ==========================================================
+# 一括登録
+# ==========================================================
+class HealthDataBatchTests(HealthAPITestCase):
+
+    def test_batch_reports_created_duplicates_and_rejects(self):
+        url = reverse("api:health_data_batch")
+        samples = self._samples(5) + [{"measured_at": self.now.isoformat(), "body": 50, "heart_rate": 60}]
+
+        response = self.client.post(url, samples, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["created"], response.data["duplicates"], response.data["rejected"]), (5, 0, 1))
+        self.assertEqual(response.data["errors"][0]["index"], 5)
+
+        response = self.client.post(url, self._samples(8), format="json")
+        self.assertEqual((response.data["created"], response.data["duplicates"]), (3, 5))
+        self.assertEqual(HealthData.objects.filter(user=self.user).count(), 8)
+
+    def test_batch_rejects_nonexistent_date_per_row(self):
+        samples = self._samples(2) + [{"measured_at": "2026-02-30T00:00:00", "body": 36.5, "heart_rate": 60}]
+
+        response = self.client.post(reverse("api:health_data_batch"), samples, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["created"], response.data["rejected"]), (2, 1))
+        self.assertEqual(response.data["errors"][0]["index"], 2)
+        self.assertIn("measured_at", response.data["errors"][0]["errors"])
+
+    def test_batch_with_only_duplicates_returns_200(self):
+        url = reverse("api:health_data_batch")
+        self.client.post(url, self._samples(3), format="json")
+
+        response = self.client.post(url, self._samples(3), format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["duplicates"], 3)
+
+
+# ==========================================================
+# バイナリ一括登録（固定長レコード）
+# ==========================================================
+class HealthDataBinaryTests(HealthAPITestCase):
+
+    def _payload(self, records):
+        return np.array(records, dtype=BINARY_SAMPLE_DTYPE).tobytes()
+
+    def _post(self, payload, **headers):
+        return self.client.generic(
+            "POST", reverse("api:health_data_list"), payload, content_type="application/octet-stream", **headers
+        )
+
+    def test_records_are_decoded_and_validated_per_row(self):
+        epoch = int(self.now.timestamp())
+        payload = self._payload([
+            (epoch, 62, 3652, 0xFFFF),
+            (epoch - 60, 64, 3650, 35),
+            (epoch - 120, 20, 3650, 0),   # 心拍数が範囲外
+            (1000, 60, 3650, 0),          # 時刻未同期
+        ])
+
+        response = self._post(payload, HTTP_X_DEVICE_ID="watch-1")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["created"], response.data["rejected"]), (2, 2))
+        self.assertEqual([e["index"] for e in response.data["errors"]], [2, 3])
+        self.assertIn("heart_rate", response.data["errors"][0]["errors"])
+        self.assertIn("measured_at", response.data["errors"][1]["errors"])
+
+        latest, previous = HealthData.objects.filter(user=self.user).order_by("-measured_at")
+        self.assertEqual((latest.measured_at, latest.body, latest.heart_rate, latest.motion), (self.now, 36.52, 62, None))
+        self.assertEqual(previous.motion, Decimal("0.35"))
+
+    def test_truncated_payload_returns_400(self):
+        payload = self._payload([(int(self.now.timestamp()), 60, 3650, 0)])
+
+        self.assertEqual(self._post(payload[:-1]).status_code, 400)
+        self.assertEqual(self._post(b"").status_code, 400)
+        self.assertFalse(HealthData.objects.filter(user=self.user).exists())
+
+
+# ==========================================================
+# 条件付きGET（ETag / Last-Modified）
+# ==========================================================
+class ConditionalGetTests(HealthAPITestCase):
+
+    def _get(self, name, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(reverse(name), **headers)
+
+    def test_unchanged_data_returns_304(self):
+        self.client.post(reverse("api:health_data_batch"), self._samples(3), format="json")
+        first = self._get("api:health_summary")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("ETag", first)
+        self.assertIn("Last-Modified", first)
+
+        second = self._get("api:health_summary", first["ETag"])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+        weak = self._get("api:health_summary", f"W/{first['ETag']}")
+        self.assertEqual(weak.status_code, 304)
+
+    def test_write_changes_etag(self):
+        etag = self._get("api:health_data_list")["ETag"]
+
+        self.client.post(reverse("api:health_data_batch"), self._samples(2), format="json")
+
+        response = self._get("api:health_data_list", etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_summary_after_write_is_not_stale(self):
+        self.client.post(reverse("api:health_data_batch"), self._samples(3), format="json")
+        etag = self._get("api:health_summary")["ETag"]
+
+        self.client.post(reverse("api:health_data_batch"), self._samples(2, offset=100), format="json")
+
+        response = self._get("api:health_summary", etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total_records"], 5)
+
+    def test_rebuild_commands_change_etag(self):
+        self.client.post(reverse("api:health_data_batch"), self._samples(3), format="json")
+
+        for command in ("rebuild_health_rollups", "rebuild_health_vitals"):
+            etag = self._get("api:health_summary")["ETag"]
+            call_command(command, stdout=StringIO())
+            self.assertEqual(self._get("api:health_summary", etag).status_code, 200, command)
+
+    def test_etag_is_per_user(self):
+        etag = self._get("api:health_summary")["ETag"]
+        other = User.objects.create_user(email="other@example.com", password="pw12345!x", gender="男性")
+        self.client.force_authenticate(other)
+
+        self.assertEqual(self._get("api:health_summary", etag).status_code, 200)
+
+
+# ==========================================================
+# 長期間グラフ用の時系列（間引き）
+# ==========================================================
+class HealthSeriesTests(HealthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.post(reverse("api:health_data_batch"), self._samples(600), format="json")
+
+    def _series(self, **params):
+        params.setdefault("start", (self.now - timedelta(hours=12)).isoformat())
+        params.setdefault("end", (self.now + timedelta(minutes=1)).isoformat())
+        return self.client.get(reverse("api:health_series"), params)
+
+    def test_minmax_keeps_extremes_within_points(self):
+        response = self._series(points=20)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data["mode"], "minmax")
+        self.assertLessEqual(len(data["time"]), 20)
+        self.assertEqual(sum(data["count"]), 600)
+        self.assertEqual(min(data["heart_rate_min"]), 60)
+        self.assertEqual(max(data["heart_rate_max"]), 89)
+        self.assertTrue(all(v == 36.5 for v in data["body_mean"]))
+
+    def test_lttb_returns_at_most_points(self):
+        response = self._series(points=30, mode="lttb")
+
+        self.assertEqual(response.status_code, 200)
+        heart_rate = response.data["heart_rate"]
+        self.assertLessEqual(len(heart_rate["time"]), 30)
+        self.assertEqual(len(heart_rate["time"]), len(heart_rate["value"]))
+        self.assertEqual(heart_rate["time"], sorted(heart_rate["time"]))
+
+    def test_malformed_range_returns_400(self):
+        for params in ({"start": "2026-02-30"}, {"end": "2026-13-01T00:00:00"}, {"start": "yesterday"}):
+            self.assertEqual(self._series(**params).status_code, 400, params)
+
+
+# ==========================================================
+# エクスポート
+# ==========================================================
+class HealthExportTests(HealthAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.post(reverse("api:health_data_batch"), self._samples(30), format="json")
+
+    def _export(self, **params):
+        response = self.client.get(reverse("api:health_export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_streams_all_rows_oldest_first(self):
+        rows = list(HealthData.objects.filter(user=self.user).order_by("measured_at"))
+
+        response, body = self._export()
+
+        self.assertIn("attachment;", response["Content-Disposition"])
+        lines = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+        self.assertEqual(lines[0], ["measured_at", "body", "heart_rate"])
+        self.assertEqual(len(lines), 31)
+        self.assertEqual(
+            [(parse_datetime(at), float(b), int(hr)) for at, b, hr in lines[1:]],
+            [(row.measured_at, row.body, row.heart_rate) for row in rows],
+        )
+
+    def test_chunks_do_not_skip_rows_at_boundaries(self):
+        expected = list(
+            HealthData.objects.filter(user=self.user).order_by("measured_at").values_list("measured_at", flat=True)
+        )
+
+        chunks = list(HealthDataService.iter_export_chunks(self.user, chunk_size=7))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [7, 7, 7, 7, 2])
+        self.assertEqual([measured_at for chunk in chunks for measured_at, _, _ in chunk], expected)
+
+    def test_ndjson_gzip_and_range(self):
+        start = self.now - timedelta(minutes=9)
+        response, body = self._export(format="ndjson", gzip="1", start=start.isoformat())
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        records = [json.loads(line) for line in gzip.decompress(body).decode("utf-8").splitlines()]
+        self.assertEqual(len(records), 10)
+        self.assertEqual(records[0], {"measured_at": start.astimezone(JST).isoformat(), "body": 36.5, "heart_rate": 69})
+
+    def test_malformed_range_returns_400(self):
+        for params in ({"start": "2026-02-30"}, {"end": "2026-02-30T10:00:00"}):
+            response = self.client.get(reverse("api:health_export"), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+# ==========================================================
+# 一覧（カーソルページング・期間の絞り込み）
+# ==========================================================
+class HealthDataListTests(HealthAPITestCase):
+
+    def _ids(self, response):
+        return [row["id"] for row in response.data["results"]]
+
+    def test_cursor_pages_are_stable_across_new_writes(self):
+        self.client.post(reverse("api:health_data_batch"), self._samples(25, offset=10), format="json")
+        expected = list(
+            HealthData.objects.filter(user=self.user).order_by("-measured_at", "-id").values_list("id", flat=True)
+        )
+
+        first = self.client.get(reverse("api:health_data_list"), {"page_size": 10})
+        # 1ページ目の取得後に新しいデータが増えても、続きのページがずれない
+        self.client.post(reverse("api:health_data_batch"), self._samples(5), format="json")
+
+        ids = self._ids(first)
+        url = first.data["next"]
+        while url:
+            response = self.client.get(url)
+            ids += self._ids(response)
+            url = response.data["next"]
+
+        self.assertEqual(ids, expected)
+
+    def test_filters_by_since_and_until(self):
+        self.client.post(reverse("api:health_data_batch"), self._samples(10), format="json")
+        since = self.now - timedelta(minutes=4)
+
+        response = self.client.get(
+            reverse("api:health_data_list"), {"since": since.isoformat(), "until": self.now.isoformat()}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 4)
 
-# Create your tests here.
+    def test_malformed_filter_returns_400(self):
+        for params in ({"since": "2026-02-30"}, {"until": "2026-02-30T00:00:00"}, {"since": "abc"}):
+            response = self.client.get(reverse("api:health_data_list"), params)
+            self.assertEqual(response.status_code, 400, params)
@@ -0,0 +1,259 @@
+# health/benchmark.py
+
+"""
+ヘルスデータ系エンドポイントのベンチマーク
+
+合成データを投入し、各エンドポイントをテストクライアント経由で繰り返し呼び出して
+クエリ数と応答時間（p50 / p95）を測る。結果はコミット済みのベースライン
+（benchmark_baseline.json）と比較し、悪化していれば報告する。
+
+実行は benchmark_health コマンドから（テスト用DBを作成して投入・測定・削除する）。
+"""
+
+import gc
+import json
+import math
+import os
+import random
+import time as time_module
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from .models import HealthData, SleepData
+from .services import (
+    HealthCounterService,
+    HealthRollupService,
+    HealthVitalsService,
+    SleepDataService,
+)
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# 投入するデータ量（users 人 × days 日分を interval 分間隔で）
+SCENARIOS = {
+    "smoke": {"users": 1, "days": 14, "interval": 5},     # CI向けの小さな規模
+    "year": {"users": 1, "days": 365, "interval": 1},     # 1人 × 1年分の分単位データ
+    "fleet": {"users": 1000, "days": 30, "interval": 1},  # 1,000人 × 1か月分の分単位データ
+}
+
+SEED_BATCH_SIZE = 5000
+
+# 応答時間の増加がこの差 [ミリ秒] 未満なら誤差として扱う（数ms の処理のぶれ対策）
+LATENCY_NOISE_FLOOR_MS = 5.0
+
+
+def _endpoints():
+    """
+    測定対象 [(名前, URL, サマリーキャッシュを毎回消すか), ...]
+    """
+    return [
+        ("health_summary", reverse("api:health_summary"), True),
+        ("health_summary_cached", reverse("api:health_summary"), False),
+        ("health_percentiles", reverse("api:health_percentiles") + "?granularity=month", False),
+        ("weekly_body", reverse("api:weekly_health"), False),
+        ("weekly_sleep", reverse("api:weekly_sleep"), False),
+        ("body_data_json", reverse("health:body_data_json"), False),
+        ("health_windows", reverse("api:health_windows") + "?granularity=week&count=4", False),
+        ("health_data_list", reverse("api:health_data_list") + "?page_size=100", False),
+        ("sleep_data_list", reverse("api:sleep_data_list") + "?page_size=100", False),
+    ]
+
+
+# ==========================================================
+# 合成データの投入
+# ==========================================================
+def _samples(user, start, days, interval, rng):
+    """1人分の分単位サンプル（日内変動 + ノイズ）を HealthData として順に生成"""
+    steps = days * 24 * 60 // interval
+    for i in range(steps):
+        measured_at = start + timedelta(minutes=i * interval)
+        minute_of_day = (measured_at.hour * 60 + measured_at.minute + 9 * 60) % 1440
+        phase = math.sin(2 * math.pi * minute_of_day / 1440)
+        local_date, local_minute = HealthData.local_fields(measured_at)
+        yield HealthData(
+            user=user,
+            measured_at=measured_at,
+            body=Decimal(f"{36.5 + 0.3 * phase + rng.gauss(0, 0.1):.2f}"),
+            heart_rate=max(40, min(180, int(68 + 8 * phase + rng.gauss(0, 4)))),
+            motion=Decimal(f"{abs(rng.gauss(0.5, 0.4)):.2f}"),
+            local_date=local_date,
+            local_minute=local_minute,
+        )
+
+
+def seed(users, days, interval, seed_value=0, stdout=None):
+    """
+    合成データを投入する（集計テーブル・件数カウンタ・基準値も作り直す）
+
+    Returns:
+        User: 測定に使うユーザー（1人目）
+    """
+    rng = random.Random(seed_value)
+    end = timezone.now().replace(second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    today = timezone.localdate()
+
+    accounts = [
+        User.objects.create_user(email=f"bench{i:05d}@example.com", gender="男性")
+        for i in range(users)
+    ]
+
+    for number, user in enumerate(accounts, 1):
+        batch = []
+        for obj in _samples(user, start, days, interval, rng):
+            batch.append(obj)
+            if len(batch) >= SEED_BATCH_SIZE:
+                HealthData.objects.bulk_create(batch)
+                batch = []
+        HealthData.objects.bulk_create(batch)
+
+        SleepData.objects.bulk_create([
+            SleepData(
+                user=user,
+                date=today - timedelta(days=d),
+                sleep_hours=Decimal(f"{max(3.0, rng.gauss(6.8, 1.0)):.2f}"),
+                sleep_quality=rng.choice(["excellent", "good", "poor", "insufficient"]),
+            )
+            for d in range(days)
+        ])
+
+        # bulk_create はシグナルを発火しないため派生テーブルをまとめて作り直す
+        HealthRollupService.rebuild_for_user(user)
+        HealthCounterService.reconcile(user.pk)
+        HealthVitalsService.rebuild(user.pk)
+        HealthCounterService.touch(user.pk)
+
+        if stdout and (number % 50 == 0 or number == len(accounts)):
+            stdout.write(f"  投入: {number}/{len(accounts)}人")
+
+    return accounts[0]
+
+
+# ==========================================================
+# 測定
+# ==========================================================
+def _measure(func, iterations, warmup, before=None):
+    """
+    func を繰り返し実行して応答時間とクエリ数を測る
+
+    Returns:
+        dict: {'queries', 'p50_ms', 'p95_ms'}（クエリ数は最後の1回分）
+    """
+    timings = []
+    queries = 0
+    # GC の停止が測定に混ざらないよう、測定中は止めておく
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(warmup + iterations):
+            if before:
+                before()
+            reset_queries()
+            with CaptureQueriesContext(connection) as ctx:
+                started = time_module.perf_counter()
+                func()
+                elapsed = (time_module.perf_counter() - started) * 1000
+            if i >= warmup:
+                timings.append(elapsed)
+                queries = len(ctx)
+    finally:
+        gc.enable()
+
+    return {
+        "queries": queries,
+        "p50_ms": round(float(np.percentile(timings, 50)), 2),
+        "p95_ms": round(float(np.percentile(timings, 95)), 2),
+    }
+
+
+def run(user, iterations=20, warmup=2):
+    """
+    各エンドポイントとサービスを測定する
+
+    Returns:
+        dict: {名前: {'queries', 'p50_ms', 'p95_ms'}}
+    """
+    client = Client()
+    client.force_login(user)
+    summary_cache = caches[settings.HEALTH_SUMMARY_CACHE]
+
+    results = {}
+    for name, url, cold in _endpoints():
+        def request(url=url):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} が {response.status_code} を返しました")
+            if response.streaming:
+                # ストリーミングのレスポンスは最後まで生成させて測る
+                b"".join(response.streaming_content)
+
+        results[name] = _measure(
+            request, iterations, warmup, before=summary_cache.clear if cold else None
+        )
+
+    results["sleep_statistics"] = _measure(
+        lambda: SleepDataService.get_sleep_statistics(user), iterations, warmup
+    )
+    return results
+
+
+# ==========================================================
+# ベースラインとの比較
+# ==========================================================
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(scenario, results, path=BASELINE_PATH):
+    baseline = load_baseline(path)
+    baseline[scenario] = results
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, tolerance=1.0):
+    """
+    ベースラインと比べて悪化した項目を返す
+
+    Args:
+        results: run() の結果
+        baseline: 同じシナリオのベースライン
+        tolerance: p50 の許容増加率（1.0 なら 2 倍まで）
+
+    Returns:
+        list[str]: 悪化の内容（なければ空）
+    """
+    regressions = []
+    for name, current in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+
+        if current["queries"] > expected["queries"]:
+            regressions.append(
+                f"{name}: クエリ数 {expected['queries']} → {current['queries']}"
+            )
+
+        # p95 は共有環境だと外れ値に引きずられるため、判定は p50 で行う
+        limit = max(expected["p50_ms"] * (1 + tolerance), expected["p50_ms"] + LATENCY_NOISE_FLOOR_MS)
+        if current["p50_ms"] > limit:
+            regressions.append(
+                f"{name}: p50 {expected['p50_ms']}ms → {current['p50_ms']}ms（上限 {limit:.2f}ms）"
+            )
+
+    return regressions
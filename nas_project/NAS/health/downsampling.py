@@ -0,0 +1,154 @@
+# health/downsampling.py
+
+"""
+長期間グラフ用の時系列ダウンサンプリング
+
+どちらの関数も (x, v1, v2, ...) のタプルを x 昇順で1件ずつ受け取り、
+全件をメモリに載せずに1パスで処理する。x は epoch 秒などの数値。
+"""
+
+
+def minmax_buckets(rows, start, end, points, columns):
+    """
+    期間を points 個の等幅バケットに分け、列ごとの最小・最大・平均を求める
+
+    Args:
+        rows: (x, v1, v2, ...) のイテラブル（x 昇順）
+        start, end: 期間（x と同じ単位）
+        points: バケット数
+        columns: 値の列数
+
+    Returns:
+        list[dict]: [{'x': バケット開始, 'count': int,
+                      'values': [(min, max, mean), ...]}, ...]
+                    データのないバケットは含まない
+    """
+    width = (end - start) / points
+    buckets = []
+    current_idx = None
+    count = 0
+    mins = maxs = sums = None
+
+    def flush():
+        buckets.append({
+            "x": start + current_idx * width,
+            "count": count,
+            "values": [(mins[c], maxs[c], sums[c] / count) for c in range(columns)],
+        })
+
+    for row in rows:
+        idx = min(max(int((row[0] - start) / width), 0), points - 1)
+        if idx != current_idx:
+            if current_idx is not None:
+                flush()
+            current_idx = idx
+            count = 0
+            mins = list(row[1:])
+            maxs = list(row[1:])
+            sums = [0.0] * columns
+
+        count += 1
+        for c in range(columns):
+            value = row[c + 1]
+            if value < mins[c]:
+                mins[c] = value
+            if value > maxs[c]:
+                maxs[c] = value
+            sums[c] += value
+
+    if current_idx is not None:
+        flush()
+
+    return buckets
+
+
+def lttb(rows, start, end, threshold, columns):
+    """
+    Largest-Triangle-Three-Buckets による間引き（列ごとに代表点を選ぶ）
+
+    件数が事前に分からないため、バケットは件数ではなく時間で等分する。
+    保持するのは「現在のバケット」と「次のバケット」の2つだけ。
+
+    Args:
+        rows: (x, v1, v2, ...) のイテラブル（x 昇順）
+        start, end: 期間（x と同じ単位）
+        threshold: 列ごとの最大点数（3以上）
+        columns: 値の列数
+
+    Returns:
+        list[list[tuple]]: 列ごとの [(x, value), ...]
+    """
+    if threshold < 3:
+        raise ValueError("threshold は3以上を指定してください")
+
+    iterator = iter(rows)
+    first = next(iterator, None)
+    if first is None:
+        return [[] for _ in range(columns)]
+
+    inner = threshold - 2
+    width = (end - start) / inner
+    selected = [(first[0], first[c + 1]) for c in range(columns)]
+    result = [[point] for point in selected]
+
+    state = {"current_idx": None, "current": [], "next_idx": None, "next": []}
+
+    def average(bucket):
+        n = len(bucket)
+        mean_x = sum(row[0] for row in bucket) / n
+        return [(mean_x, sum(row[c + 1] for row in bucket) / n) for c in range(columns)]
+
+    def finalize(bucket, anchors):
+        for c in range(columns):
+            ax, ay = selected[c]
+            cx, cy = anchors[c]
+            best = None
+            best_area = -1.0
+            for row in bucket:
+                x, y = row[0], row[c + 1]
+                area = abs((ax - cx) * (y - ay) - (ax - x) * (cy - ay))
+                if area > best_area:
+                    best_area = area
+                    best = (x, y)
+            result[c].append(best)
+            selected[c] = best
+
+    def add(row):
+        idx = min(max(int((row[0] - start) / width), 0), inner - 1)
+        if state["current_idx"] is None:
+            state["current_idx"] = idx
+            state["current"] = [row]
+        elif idx == state["current_idx"]:
+            state["current"].append(row)
+        elif state["next_idx"] is None:
+            state["next_idx"] = idx
+            state["next"] = [row]
+        elif idx == state["next_idx"]:
+            state["next"].append(row)
+        else:
+            finalize(state["current"], average(state["next"]))
+            state["current_idx"], state["current"] = state["next_idx"], state["next"]
+            state["next_idx"], state["next"] = idx, [row]
+
+    # 最後の1件は必ず残すため、1件遅れでバケットに入れる
+    pending = None
+    for row in iterator:
+        if pending is not None:
+            add(pending)
+        pending = row
+
+    if pending is None:
+        return result
+
+    last = [(pending[0], pending[c + 1]) for c in range(columns)]
+    if state["current"]:
+        if state["next"]:
+            finalize(state["current"], average(state["next"]))
+            finalize(state["next"], last)
+        else:
+            finalize(state["current"], last)
+
+    for c in range(columns):
+        result[c].append(last[c])
+
+    return result
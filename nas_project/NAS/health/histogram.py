@@ -0,0 +1,72 @@
+# health/histogram.py
+
+"""
+心拍数の固定幅ヒストグラム（1bpm 刻み、30〜250bpm の 221 バケット）
+
+1日分の度数を uint32 のリトルエンディアン配列としてバイナリで保存する（884バイト）。
+バケットが固定なので、週・月・年のヒストグラムは日ごとの配列を要素ごとに足すだけで作れ、
+心拍数は整数のため、そこから求めるパーセンタイルは生データを並べ替えた場合と一致する。
+"""
+
+import numpy as np
+
+
+HR_MIN = 30
+HR_MAX = 250
+BUCKETS = HR_MAX - HR_MIN + 1
+DTYPE = np.dtype("<u4")
+
+
+def empty():
+    return np.zeros(BUCKETS, dtype=np.int64)
+
+
+def from_values(heart_rates):
+    """心拍数の配列から度数の配列を作る（範囲外は両端のバケットに入れる）"""
+    values = np.clip(np.asarray(heart_rates, dtype=np.int64), HR_MIN, HR_MAX) - HR_MIN
+    return np.bincount(values, minlength=BUCKETS).astype(np.int64)
+
+
+def from_counts(pairs):
+    """[(心拍数, 件数), ...]（GROUP BY の結果）から度数の配列を作る"""
+    counts = empty()
+    for heart_rate, total in pairs:
+        counts[min(max(int(heart_rate), HR_MIN), HR_MAX) - HR_MIN] += total
+    return counts
+
+
+def pack(counts):
+    return np.asarray(counts).astype(DTYPE).tobytes()
+
+
+def unpack(blob):
+    if not blob:
+        return empty()
+    return np.frombuffer(bytes(blob), dtype=DTYPE).astype(np.int64)
+
+
+def percentiles(counts, qs):
+    """
+    度数の配列からパーセンタイルを求める（nearest-rank 法）
+
+    Args:
+        counts: 度数の配列
+        qs: 求めるパーセンタイル [0〜100, ...]
+
+    Returns:
+        list: qs と同じ順の心拍数 (int)。データがなければ None のリスト
+    """
+    cumulative = np.cumsum(counts)
+    total = int(cumulative[-1])
+    if total == 0:
+        return [None] * len(qs)
+
+    ranks = np.maximum(np.ceil(np.asarray(qs, dtype=np.float64) / 100 * total), 1)
+    return [int(index) + HR_MIN for index in np.searchsorted(cumulative, ranks)]
+
+
+def mean(counts):
+    total = int(np.sum(counts))
+    if total == 0:
+        return None
+    return float(np.dot(counts, np.arange(HR_MIN, HR_MAX + 1))) / total
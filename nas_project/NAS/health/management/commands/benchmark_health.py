@@ -0,0 +1,93 @@
+# health/management/commands/benchmark_health.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from health import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'テスト用DBに合成データを投入し、ヘルスデータ系エンドポイントのクエリ数と'
+        '応答時間（p50/p95）を測定してベースラインと比較する。悪化していれば失敗する'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            choices=sorted(benchmark.SCENARIOS),
+            default='smoke',
+            help='データ量のプリセット（smoke: 1人×14日, year: 1人×1年, fleet: 1,000人×1か月）'
+        )
+        parser.add_argument('--users', type=int, help='ユーザー数（プリセットを上書き）')
+        parser.add_argument('--days', type=int, help='日数（プリセットを上書き）')
+        parser.add_argument('--interval', type=int, help='サンプル間隔[分]（プリセットを上書き）')
+        parser.add_argument('--iterations', type=int, default=20, help='1エンドポイントあたりの測定回数')
+        parser.add_argument('--warmup', type=int, default=2, help='測定前に捨てる回数')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=1.0,
+            help='p50 の許容増加率（1.0 ならベースラインの2倍まで。クエリ数は増えた時点で失敗）'
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            default=benchmark.BASELINE_PATH,
+            help='ベースラインのJSONファイル'
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='比較せずに今回の結果でベースラインを更新する'
+        )
+
+    def handle(self, *args, **options):
+        volume = dict(benchmark.SCENARIOS[options['scenario']])
+        overridden = False
+        for key in ('users', 'days', 'interval'):
+            if options[key] is not None:
+                volume[key] = options[key]
+                overridden = True
+        # 規模を変えた場合はプリセットのベースラインとは比べられない
+        scenario = 'custom' if overridden else options['scenario']
+
+        self.stdout.write(
+            f'シナリオ: {scenario}（{volume["users"]}人 × {volume["days"]}日、{volume["interval"]}分間隔）'
+        )
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            user = benchmark.seed(**volume, stdout=self.stdout)
+            results = benchmark.run(user, iterations=options['iterations'], warmup=options['warmup'])
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        self.stdout.write(f'{"endpoint":<24}{"queries":>8}{"p50[ms]":>10}{"p95[ms]":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<24}{result["queries"]:>8}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+            )
+
+        if options['update_baseline']:
+            if scenario == 'custom':
+                raise CommandError('--users/--days/--interval を指定した結果はベースラインにできません')
+            benchmark.save_baseline(scenario, results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'ベースラインを更新しました: {options["baseline"]}'))
+            return
+
+        baseline = benchmark.load_baseline(options['baseline']).get(scenario)
+        if not baseline:
+            self.stdout.write(self.style.WARNING(f'シナリオ {scenario} のベースラインがないため比較しません'))
+            return
+
+        regressions = benchmark.compare(results, baseline, options['tolerance'])
+        if regressions:
+            for line in regressions:
+                self.stderr.write(f'  - {line}')
+            raise CommandError(f'ベースラインより悪化しました: {len(regressions)}件')
+
+        self.stdout.write(self.style.SUCCESS('ベースラインの範囲内です'))
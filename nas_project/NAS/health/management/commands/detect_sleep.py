@@ -0,0 +1,87 @@
+# health/management/commands/detect_sleep.py
+
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from health.services import JST, SLEEP_DETECTION_BATCH_USERS, SleepDetectionService
+
+
+class Command(BaseCommand):
+    help = (
+        '保存済みの心拍数・動きのデータから夜ごとの睡眠を判定し、'
+        'SleepData と睡眠区間を作成・上書きする'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='判定する最後の起床日 YYYY-MM-DD（省略時は今日）'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='--date から何日分さかのぼって判定するか（デフォルト: 1）'
+        )
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='対象のユーザーID（省略時は期間内に動きのデータがある全ユーザー）'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SLEEP_DETECTION_BATCH_USERS,
+            help=f'1回にまとめて判定するユーザー数（デフォルト: {SLEEP_DETECTION_BATCH_USERS}）'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='保存せず、判定結果を表示するだけ'
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            end_date = parse_date(options['date'])
+            if end_date is None:
+                raise CommandError('--date は YYYY-MM-DD 形式で指定してください')
+        else:
+            end_date = timezone.now().astimezone(JST).date()
+
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days と --batch-size は1以上を指定してください')
+        start_date = end_date - timedelta(days=options['days'] - 1)
+
+        if options['user']:
+            user_ids = [options['user']]
+        else:
+            user_ids = SleepDetectionService.users_with_motion(start_date, end_date)
+
+        self.stdout.write(f'対象: {start_date} 〜 {end_date} / {len(user_ids)}ユーザー')
+
+        nights = periods = removed = 0
+        batch_size = options['batch_size']
+        for offset in range(0, len(user_ids), batch_size):
+            result = SleepDetectionService.detect(
+                user_ids[offset:offset + batch_size], start_date, end_date,
+                dry_run=options['dry_run'],
+            )
+            nights += result['nights']
+            periods += result['periods']
+            removed += result['removed']
+
+            if options['dry_run']:
+                for user_id, day, hours in result['results']:
+                    self.stdout.write(f'  - {user_id} {day}: {hours}時間')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'【ドライラン】判定: {nights}晩 / 睡眠区間: {periods}件 / 削除: {removed}晩'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'完了: {nights}晩の睡眠データと{periods}件の睡眠区間を保存し、'
+                f'睡眠と判定されなくなった{removed}晩を削除しました'
+            ))
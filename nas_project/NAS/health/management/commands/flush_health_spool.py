@@ -0,0 +1,41 @@
+# health/management/commands/flush_health_spool.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from health import write_behind
+
+
+class Command(BaseCommand):
+    help = (
+        '終了したプロセスが残した身体データのスプール（write-behind）をDBへ登録して削除する。'
+        '稼働中のプロセスのスプールには触れない'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--spool-dir',
+            type=str,
+            help='スプールのディレクトリ（省略時は HEALTH_WRITE_BEHIND_SPOOL_DIR）'
+        )
+        parser.add_argument(
+            '--quarantine',
+            action='store_true',
+            help='登録に失敗して隔離したレコードを登録し直す（原因を取り除いた後に実行）'
+        )
+
+    def handle(self, *args, **options):
+        spool_dir = options['spool_dir'] or settings.HEALTH_WRITE_BEHIND_SPOOL_DIR
+
+        if options['quarantine']:
+            replayed, created, remaining = write_behind.replay_quarantine(spool_dir)
+            style = self.style.WARNING if remaining else self.style.SUCCESS
+            self.stdout.write(style(
+                f'完了: 隔離した{replayed}セグメントから{created}件を登録しました（残り{remaining}セグメント）'
+            ))
+            return
+
+        directories, created = write_behind.recover_orphans(spool_dir)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'完了: {directories}プロセス分のスプールから{created}件を登録しました'
+        ))
@@ -0,0 +1,80 @@
+# health/management/commands/maintain_health_storage.py
+
+from django.core.management.base import BaseCommand, CommandError
+from health import partitioning
+from health.services import HealthRetentionService
+
+
+class Command(BaseCommand):
+    help = (
+        'healthdata の月別パーティション（MySQL）を先の月まで作成し、'
+        '保持期間を過ぎた生データを削除（または退避）する。cron で日次実行を想定'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--enable-partitioning',
+            action='store_true',
+            help='healthdata を月別パーティションに変換する（MySQLのみ・初回のみ）'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            help='何か月先までパーティションを作成するか（省略時は HEALTH_PARTITION_MONTHS_AHEAD）'
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            help='生データの保持日数（省略時は HEALTH_RAW_RETENTION_DAYS、0 は無期限）'
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            default=None,
+            help='期限切れの生データを healthdata_archive へ退避してから削除する'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='実際には変更せず、作成・削除の対象を表示するだけ'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if options['enable_partitioning']:
+            if dry_run:
+                raise CommandError('--enable-partitioning は --dry-run と併用できません')
+            try:
+                created = HealthRetentionService.enable_partitioning(options['months_ahead'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f'パーティション化しました: {partitioning.partition_name(*created[0])}'
+                f' 〜 {partitioning.partition_name(*created[-1])}'
+            ))
+
+        months = HealthRetentionService.ensure_partitions(options['months_ahead'], dry_run=dry_run)
+        for month in months:
+            self.stdout.write(f'  + {partitioning.partition_name(*month)}')
+
+        result = HealthRetentionService.expire(
+            days=options['retention_days'],
+            archive=options['archive'],
+            dry_run=dry_run,
+        )
+        if result['cutoff'] is None:
+            self.stdout.write('保持期間が無期限のため、生データは削除しません')
+        for name in result['partitions']:
+            self.stdout.write(f'  - {name}')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(
+                f'【ドライラン】作成対象: {len(months)}パーティション / '
+                f'削除対象: {result["rows"]}件（{result["users"]}ユーザー）'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'完了: {len(months)}パーティションを作成、'
+                f'{result["rows"]}件（{result["users"]}ユーザー）の生データを削除しました'
+            ))
@@ -0,0 +1,35 @@
+# health/management/commands/rebuild_health_rollups.py
+
+from django.core.management.base import BaseCommand
+from accounts.models import User
+from health.services import HealthRollupService
+
+
+class Command(BaseCommand):
+    help = 'HealthData から日別・時間別集計テーブルを作り直す（バックフィル）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='対象のユーザーID（省略時は全ユーザー）'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all().order_by('user_id')
+        if options['user']:
+            users = users.filter(user_id=options['user'])
+
+        total_daily = 0
+        total_hourly = 0
+
+        for user in users.iterator():
+            daily, hourly = HealthRollupService.rebuild_for_user(user)
+            total_daily += daily
+            total_hourly += hourly
+            if daily:
+                self.stdout.write(f'  - {user.user_id}: 日別 {daily}件 / 時間別 {hourly}件')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'集計完了: 日別 {total_daily}件, 時間別 {total_hourly}件')
+        )
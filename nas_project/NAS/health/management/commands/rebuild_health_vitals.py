@@ -0,0 +1,35 @@
+# health/management/commands/rebuild_health_vitals.py
+
+from django.core.management.base import BaseCommand
+from accounts.models import User
+from health.services import HealthVitalsService
+
+
+class Command(BaseCommand):
+    help = 'HealthData の全履歴から心拍数・体温の基準値と異常値を作り直す（バックフィル）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='対象のユーザーID（省略時は全ユーザー）'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all().order_by('user_id')
+        if options['user']:
+            users = users.filter(user_id=options['user'])
+
+        total_samples = 0
+        total_anomalies = 0
+
+        for user_id in users.values_list('user_id', flat=True).iterator():
+            samples, anomalies = HealthVitalsService.rebuild(user_id)
+            total_samples += samples
+            total_anomalies += anomalies
+            if samples:
+                self.stdout.write(f'  - {user_id}: {samples}件 / 異常値 {anomalies}件')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'作り直し完了: {total_samples}件, 異常値 {total_anomalies}件')
+        )
@@ -0,0 +1,46 @@
+# health/management/commands/reconcile_health_counters.py
+
+from django.core.management.base import BaseCommand
+from accounts.models import User
+from health.models import HealthData, HealthDataCounter
+from health.services import HealthCounterService
+
+
+class Command(BaseCommand):
+    help = 'ユーザーごとの HealthData 件数カウンタを実件数と照合して修正'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='対象のユーザーID（省略時は全ユーザー）'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='実際には修正せず、ずれているユーザーを表示するだけ'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all().order_by('user_id')
+        if options['user']:
+            users = users.filter(user_id=options['user'])
+
+        fixed = 0
+        for user_id in users.values_list('user_id', flat=True).iterator():
+            if options['dry_run']:
+                stored = HealthDataCounter.objects.filter(user_id=user_id).values_list(
+                    'health_records', flat=True
+                ).first()
+                actual = HealthData.objects.filter(user_id=user_id).count()
+            else:
+                stored, actual = HealthCounterService.reconcile(user_id)
+
+            if stored != actual and not (stored is None and actual == 0):
+                fixed += 1
+                self.stdout.write(f'  - {user_id}: {stored} → {actual}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'【ドライラン】ずれのあるユーザー: {fixed}件'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'照合完了: {fixed}件のカウンタを修正しました'))
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0002_alter_healthdata_options_alter_sleepdata_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('body_sum', models.FloatField(default=0, help_text='体温の合計')),
+                ('body_min', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('body_max', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('heart_rate_sum', models.BigIntegerField(default=0, help_text='心拍数の合計')),
+                ('heart_rate_min', models.IntegerField()),
+                ('heart_rate_max', models.IntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField(help_text='日付 (JST)')),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, related_name='health_daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '健康データ日別集計',
+                'verbose_name_plural': '健康データ日別集計',
+                'db_table': 'health_daily_rollup',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='uniq_health_daily_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HealthHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('body_sum', models.FloatField(default=0, help_text='体温の合計')),
+                ('body_min', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('body_max', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('heart_rate_sum', models.BigIntegerField(default=0, help_text='心拍数の合計')),
+                ('heart_rate_min', models.IntegerField()),
+                ('heart_rate_max', models.IntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField(help_text='日付 (JST)')),
+                ('hour', models.PositiveSmallIntegerField(help_text='時 (JST, 0〜23)')),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, related_name='health_hourly_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '健康データ時間別集計',
+                'verbose_name_plural': '健康データ時間別集計',
+                'db_table': 'health_hourly_rollup',
+                'ordering': ['-date', '-hour'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'hour'), name='uniq_health_hourly_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    """既存データの件数でカウンタを初期化"""
+    HealthData = apps.get_model('health', 'HealthData')
+    HealthDataCounter = apps.get_model('health', 'HealthDataCounter')
+
+    counts = HealthData.objects.order_by().values('user_id').annotate(total=Count('id'))
+    HealthDataCounter.objects.bulk_create(
+        [HealthDataCounter(user_id=row['user_id'], health_records=row['total']) for row in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_adminuser_email_verified_user_email_verified'),
+        ('health', '0003_healthdailyrollup_healthhourlyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthDataCounter',
+            fields=[
+                ('user', models.OneToOneField(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='health_data_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('health_records', models.BigIntegerField(default=0, help_text='HealthData の件数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '健康データ件数',
+                'verbose_name_plural': '健康データ件数',
+                'db_table': 'health_data_counter',
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
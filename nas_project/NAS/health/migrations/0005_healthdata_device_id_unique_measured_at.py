@@ -0,0 +1,53 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    一意制約の追加前に (user, measured_at) の重複を削除（最初に登録された行を残す）
+    件数カウンタも合わせて減らす。集計テーブルは rebuild_health_rollups で再構築すること
+    """
+    HealthData = apps.get_model('health', 'HealthData')
+    HealthDataCounter = apps.get_model('health', 'HealthDataCounter')
+
+    duplicates = (
+        HealthData.objects.order_by()
+        .values('user_id', 'measured_at')
+        .annotate(total=Count('id'), keep_id=Min('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates.iterator():
+        deleted, _ = HealthData.objects.filter(
+            user_id=row['user_id'], measured_at=row['measured_at'], id__gt=row['keep_id']
+        ).delete()
+        HealthDataCounter.objects.filter(user_id=row['user_id']).update(
+            health_records=F('health_records') - deleted
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0004_healthdatacounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='healthdata',
+            name='device_id',
+            field=models.CharField(blank=True, help_text='送信元デバイスID', max_length=50, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='healthdata',
+            constraint=models.UniqueConstraint(fields=('user', 'measured_at'), name='uniq_healthdata_user_measured_at'),
+        ),
+        migrations.RemoveIndex(
+            model_name='healthdata',
+            name='healthdata_user_id_bc5d21_idx',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0005_healthdata_device_id_unique_measured_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthDataArchive',
+            fields=[
+                ('id', models.BigIntegerField(help_text='元の HealthData の ID', primary_key=True, serialize=False)),
+                ('measured_at', models.DateTimeField()),
+                ('body', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('heart_rate', models.IntegerField()),
+                ('device_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_column='user_id', db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='health_data_archive', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '健康データ（アーカイブ）',
+                'verbose_name_plural': '健康データ（アーカイブ）',
+                'db_table': 'healthdata_archive',
+                'indexes': [models.Index(fields=['user', 'measured_at'], name='healthdata__user_id_d7ee43_idx')],
+            },
+        ),
+    ]
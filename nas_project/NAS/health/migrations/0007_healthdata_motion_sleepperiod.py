@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0006_healthdataarchive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthdata',
+            name='motion',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='動きの大きさ (0〜20)', max_digits=4, null=True),
+        ),
+        migrations.CreateModel(
+            name='SleepPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('minutes', models.PositiveIntegerField(help_text='区間の長さ (分)')),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, related_name='sleep_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '睡眠区間',
+                'verbose_name_plural': '睡眠区間',
+                'db_table': 'sleep_period',
+                'ordering': ['user', 'start'],
+                'indexes': [models.Index(fields=['user', 'date'], name='sleep_perio_user_id_987ea8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:31
+
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.db import migrations, models
+
+JST = ZoneInfo('Asia/Tokyo')
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_local_fields(apps, schema_editor):
+    """既存データの local_date / local_minute を measured_at から計算"""
+    HealthData = apps.get_model('health', 'HealthData')
+
+    last_id = 0
+    while True:
+        rows = list(
+            HealthData.objects.filter(id__gt=last_id).order_by('id').only('id', 'measured_at')[:BACKFILL_CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        for row in rows:
+            local = row.measured_at.astimezone(JST)
+            row.local_date = local.date()
+            row.local_minute = local.hour * 60 + local.minute
+        HealthData.objects.bulk_update(rows, ['local_date', 'local_minute'])
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0007_healthdata_motion_sleepperiod'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthdata',
+            name='local_date',
+            field=models.DateField(help_text='測定日（日本時間）', null=True),
+        ),
+        migrations.AddField(
+            model_name='healthdata',
+            name='local_minute',
+            field=models.PositiveSmallIntegerField(help_text='測定時刻（日本時間の0時からの分 0〜1439）', null=True),
+        ),
+        migrations.RunPython(backfill_local_fields, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='healthdata',
+            name='local_date',
+            field=models.DateField(help_text='測定日（日本時間）'),
+        ),
+        migrations.AlterField(
+            model_name='healthdata',
+            name='local_minute',
+            field=models.PositiveSmallIntegerField(help_text='測定時刻（日本時間の0時からの分 0〜1439）'),
+        ),
+        migrations.AddIndex(
+            model_name='healthdata',
+            index=models.Index(fields=['user', 'local_date', 'local_minute'], name='healthdata_user_id_f2beb1_idx'),
+        ),
+    ]
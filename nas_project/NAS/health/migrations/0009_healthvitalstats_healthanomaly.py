@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_adminuser_email_verified_user_email_verified'),
+        ('health', '0008_healthdata_local_date_local_minute'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthVitalStats',
+            fields=[
+                ('user', models.OneToOneField(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='health_vital_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.BigIntegerField(default=0, help_text='反映済みのサンプル数')),
+                ('heart_rate_mean', models.FloatField(default=0.0)),
+                ('heart_rate_m2', models.FloatField(default=0.0)),
+                ('heart_rate_ewma', models.FloatField(blank=True, null=True)),
+                ('body_mean', models.FloatField(default=0.0)),
+                ('body_m2', models.FloatField(default=0.0)),
+                ('body_ewma', models.FloatField(blank=True, null=True)),
+                ('last_measured_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '健康データ基準値',
+                'verbose_name_plural': '健康データ基準値',
+                'db_table': 'health_vital_stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='HealthAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measured_at', models.DateTimeField()),
+                ('metric', models.CharField(choices=[('heart_rate', '心拍数'), ('body', '体温')], max_length=20)),
+                ('value', models.FloatField(help_text='測定値')),
+                ('baseline', models.FloatField(help_text='判定時の平均')),
+                ('std', models.FloatField(help_text='判定時の標準偏差')),
+                ('z_score', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, related_name='health_anomalies', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '健康データの異常値',
+                'verbose_name_plural': '健康データの異常値',
+                'db_table': 'health_anomaly',
+                'ordering': ['-measured_at'],
+                'indexes': [models.Index(fields=['user', 'measured_at'], name='health_anom_user_id_18cfa5_idx')],
+            },
+        ),
+    ]
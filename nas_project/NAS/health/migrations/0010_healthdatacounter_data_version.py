@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0009_healthvitalstats_healthanomaly'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthdatacounter',
+            name='data_modified_at',
+            field=models.DateTimeField(blank=True, help_text='健康・睡眠データの最終更新日時', null=True),
+        ),
+        migrations.AddField(
+            model_name='healthdatacounter',
+            name='data_version',
+            field=models.BigIntegerField(default=0, help_text='健康・睡眠データの更新ごとに増える値'),
+        ),
+    ]
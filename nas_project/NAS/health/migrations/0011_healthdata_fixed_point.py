@@ -0,0 +1,102 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:12
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, Max, Min
+from django.db.models.functions import Round
+import health.models
+
+CONVERT_CHUNK_SIZE = 5000
+MODELS = ('healthdata', 'healthdataarchive')
+
+
+def _convert(apps, model_name, **update):
+    """id の範囲ごとに UPDATE する（大きなテーブルで1つの長いトランザクションにしない）"""
+    Model = apps.get_model('health', model_name)
+    bounds = Model.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+
+    for start in range(bounds['low'], bounds['high'] + 1, CONVERT_CHUNK_SIZE):
+        Model.objects.filter(id__gte=start, id__lt=start + CONVERT_CHUNK_SIZE).update(**update)
+
+
+def to_centi(apps, schema_editor):
+    """体温（℃の DECIMAL）を 0.01℃ 単位の整数へ"""
+    for model_name in MODELS:
+        _convert(apps, model_name, body_centi=Round(F('body') * 100))
+
+
+def from_centi(apps, schema_editor):
+    for model_name in MODELS:
+        _convert(apps, model_name, body=ExpressionWrapper(
+            F('body_centi') / 100.0, output_field=models.DecimalField(max_digits=4, decimal_places=2)
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0010_healthdatacounter_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthdata',
+            name='body_centi',
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='healthdata',
+            name='body',
+            field=models.DecimalField(decimal_places=2, max_digits=4, null=True),
+        ),
+        migrations.AddField(
+            model_name='healthdataarchive',
+            name='body_centi',
+            field=models.SmallIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='healthdataarchive',
+            name='body',
+            field=models.DecimalField(decimal_places=2, max_digits=4, null=True),
+        ),
+        migrations.RunPython(to_centi, from_centi),
+        migrations.RemoveField(
+            model_name='healthdata',
+            name='body',
+        ),
+        migrations.RenameField(
+            model_name='healthdata',
+            old_name='body_centi',
+            new_name='body',
+        ),
+        migrations.AlterField(
+            model_name='healthdata',
+            name='body',
+            field=health.models.CentiDegreeField(help_text='体温 (℃)'),
+        ),
+        migrations.AlterField(
+            model_name='healthdata',
+            name='heart_rate',
+            field=models.PositiveSmallIntegerField(help_text='心拍数 (bpm)'),
+        ),
+        migrations.RemoveField(
+            model_name='healthdataarchive',
+            name='body',
+        ),
+        migrations.RenameField(
+            model_name='healthdataarchive',
+            old_name='body_centi',
+            new_name='body',
+        ),
+        migrations.AlterField(
+            model_name='healthdataarchive',
+            name='body',
+            field=health.models.CentiDegreeField(),
+        ),
+        migrations.AlterField(
+            model_name='healthdataarchive',
+            name='heart_rate',
+            field=models.PositiveSmallIntegerField(),
+        ),
+    ]
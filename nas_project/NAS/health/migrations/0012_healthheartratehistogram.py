@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0011_healthdata_fixed_point'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthHeartRateHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='日付 (JST)')),
+                ('count', models.PositiveIntegerField(default=0, help_text='サンプル数')),
+                ('counts', models.BinaryField(help_text='1bpmごとの度数 (uint32 リトルエンディアン)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, related_name='heart_rate_histograms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '心拍数日別ヒストグラム',
+                'verbose_name_plural': '心拍数日別ヒストグラム',
+                'db_table': 'health_hr_histogram',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='uniq_health_hr_histogram')],
+            },
+        ),
+    ]
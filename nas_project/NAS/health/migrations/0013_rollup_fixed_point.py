@@ -0,0 +1,99 @@
+# Generated by Django 5.1.2 on 2026-10-17 09:40
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, Max, Min
+from django.db.models.functions import Round
+import health.models
+
+CONVERT_CHUNK_SIZE = 5000
+MODELS = ('healthdailyrollup', 'healthhourlyrollup')
+
+
+def _convert(apps, model_name, **update):
+    """id の範囲ごとに UPDATE する（大きなテーブルで1つの長いトランザクションにしない）"""
+    Model = apps.get_model('health', model_name)
+    bounds = Model.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+
+    for start in range(bounds['low'], bounds['high'] + 1, CONVERT_CHUNK_SIZE):
+        Model.objects.filter(id__gte=start, id__lt=start + CONVERT_CHUNK_SIZE).update(**update)
+
+
+def to_centi(apps, schema_editor):
+    """集計の最小・最大体温（℃の DECIMAL）を HealthData.body と同じ 0.01℃ 単位の整数へ"""
+    for model_name in MODELS:
+        _convert(
+            apps, model_name,
+            body_min_centi=Round(F('body_min') * 100),
+            body_max_centi=Round(F('body_max') * 100),
+        )
+
+
+def from_centi(apps, schema_editor):
+    decimal = models.DecimalField(max_digits=4, decimal_places=2)
+    for model_name in MODELS:
+        _convert(
+            apps, model_name,
+            body_min=ExpressionWrapper(F('body_min_centi') / 100.0, output_field=decimal),
+            body_max=ExpressionWrapper(F('body_max_centi') / 100.0, output_field=decimal),
+        )
+
+
+def _swap(model_name):
+    """一時列を追加し、変換後に元の列と入れ替える操作"""
+    before = []
+    after = []
+    for name in ('body_min', 'body_max'):
+        before += [
+            migrations.AddField(
+                model_name=model_name,
+                name=f'{name}_centi',
+                field=models.SmallIntegerField(null=True),
+            ),
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=models.DecimalField(decimal_places=2, max_digits=4, null=True),
+            ),
+        ]
+        after += [
+            migrations.RemoveField(
+                model_name=model_name,
+                name=name,
+            ),
+            migrations.RenameField(
+                model_name=model_name,
+                old_name=f'{name}_centi',
+                new_name=name,
+            ),
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=health.models.CentiDegreeField(),
+            ),
+        ]
+    for name in ('heart_rate_min', 'heart_rate_max'):
+        after.append(
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=models.PositiveSmallIntegerField(),
+            ),
+        )
+    return before, after
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0012_healthheartratehistogram'),
+    ]
+
+    operations = [
+        *_swap('healthdailyrollup')[0],
+        *_swap('healthhourlyrollup')[0],
+        migrations.RunPython(to_centi, from_centi),
+        *_swap('healthdailyrollup')[1],
+        *_swap('healthhourlyrollup')[1],
+    ]
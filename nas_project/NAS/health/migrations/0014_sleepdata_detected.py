@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0013_rollup_fixed_point'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sleepdata',
+            name='detected',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,9 +1,64 @@
 # healthdata/models.py (改善版)
 
-from django.db import models
+from zoneinfo import ZoneInfo
+from django import forms
+from django.db import models, transaction
+from django.db.models import lookups
 from django.conf import settings
+from django.utils import timezone
 from accounts.models import User
 
+JST = ZoneInfo('Asia/Tokyo')
+
+
+class CentiDegreeField(models.SmallIntegerField):
+    """
+    体温を 0.01℃ 単位の整数（SMALLINT）で保存するフィールド
+    Python 側では ℃ の float として扱うため、filter(body__gte=37.5) や
+    Sum / Min / Max の集計もそのまま ℃ で読み書きできる
+    （Avg は出力が FloatField になるため output_field=CentiDegreeField() を指定すること）
+    """
+    description = "温度（0.01℃単位の整数で保存）"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return float(value) / 100
+
+    def to_python(self, value):
+        if value is None or isinstance(value, float):
+            return value
+        try:
+            return round(float(value), 2)
+        except (TypeError, ValueError):
+            return super().to_python(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        return round(float(value) * 100)
+
+    def formfield(self, **kwargs):
+        return super(models.IntegerField, self).formfield(**{
+            'form_class': forms.DecimalField,
+            'max_digits': 4,
+            'decimal_places': 2,
+            **kwargs,
+        })
+
+
+# IntegerField の比較は float の右辺を切り上げ・範囲外を整数のまま判定するため、
+# ℃ を 0.01℃ 単位に変換してから比較する標準の lookup に戻す（body__gte=37.5 が 38℃ 以上にならないように）
+for lookup in (
+    lookups.Exact,
+    lookups.GreaterThan,
+    lookups.GreaterThanOrEqual,
+    lookups.LessThan,
+    lookups.LessThanOrEqual,
+):
+    CentiDegreeField.register_lookup(lookup)
+
+
 class HealthData(models.Model):
     user = models.ForeignKey(
         User, 
@@ -14,22 +69,43 @@ class HealthData(models.Model):
     measured_at = models.DateTimeField(
         db_index=True  # ✅ 検索高速化
     )
-    body = models.DecimalField(
-        max_digits=4, 
-        decimal_places=2,
+    body = CentiDegreeField(  # ✅ DecimalField → 0.01℃単位の SMALLINT（読み書きは℃のまま）
         help_text="体温 (℃)"
     )
-    heart_rate = models.IntegerField(  # ✅ DecimalField → IntegerField
+    heart_rate = models.PositiveSmallIntegerField(  # ✅ IntegerField → SMALLINT UNSIGNED
         help_text="心拍数 (bpm)"
     )
+    motion = models.DecimalField(  # ✅ 1分間の最大の動き（ESP32 の加速度差分 0〜20）
+        max_digits=4,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="動きの大きさ (0〜20)"
+    )
+    device_id = models.CharField(  # ✅ 送信元デバイス（任意）
+        max_length=50,
+        null=True,
+        blank=True,
+        help_text="送信元デバイスID"
+    )
+    local_date = models.DateField(  # ✅ 日本時間の日付（日単位の集計用に保存時に計算）
+        help_text="測定日（日本時間）"
+    )
+    local_minute = models.PositiveSmallIntegerField(  # ✅ 日本時間の0時からの分
+        help_text="測定時刻（日本時間の0時からの分 0〜1439）"
+    )
     created_at = models.DateTimeField(auto_now_add=True)  # ✅ 作成日時を記録
 
     class Meta:
         db_table = 'healthdata'
         ordering = ['-measured_at']  # ✅ デフォルトで新しい順
+        constraints = [
+            # ✅ 再送による重複を防ぐ（(user, measured_at) の複合インデックスを兼ねる）
+            models.UniqueConstraint(fields=['user', 'measured_at'], name='uniq_healthdata_user_measured_at'),
+        ]
         indexes = [
-            models.Index(fields=['user', 'measured_at']),  # ✅ 複合インデックス
             models.Index(fields=['measured_at']),
+            models.Index(fields=['user', 'local_date', 'local_minute']),  # ✅ 日・時間単位の範囲検索
         ]
         verbose_name = '健康データ'
         verbose_name_plural = '健康データ'
@@ -37,6 +113,28 @@ class HealthData(models.Model):
     def __str__(self):
         return f"{self.user.user_id} - {self.measured_at.strftime('%Y-%m-%d %H:%M')}"
 
+    @staticmethod
+    def local_fields(measured_at):
+        """
+        測定日時から日本時間の (local_date, local_minute) を計算
+        （bulk_create は save() を通らないため、一括登録ではこれを直接使う）
+        """
+        if timezone.is_naive(measured_at):
+            measured_at = timezone.make_aware(measured_at, timezone.get_current_timezone())
+        local = measured_at.astimezone(JST)
+        return local.date(), local.hour * 60 + local.minute
+
+    def save(self, *args, **kwargs):
+        measured_at = self._meta.get_field('measured_at').to_python(self.measured_at)
+        if measured_at is not None:
+            self.local_date, self.local_minute = self.local_fields(measured_at)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'measured_at' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'local_date', 'local_minute'}
+        # シグナル（ユーザー単位のロック → 書き込み → 集計・件数の更新）を1つのトランザクションで実行
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class SleepData(models.Model):
     QUALITY_CHOICES = [
@@ -67,6 +165,8 @@ class SleepData(models.Model):
         null=True,
         blank=True
     )
+    # ✅ サーバー側の睡眠判定（detect_sleep）で作成した行か（再判定で該当しなくなれば削除される）
+    detected = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)  # ✅ 作成日時を記録
 
     class Meta:
@@ -80,4 +180,263 @@ class SleepData(models.Model):
         verbose_name_plural = '睡眠データ'
 
     def __str__(self):
-        return f"{self.user.user_id} - {self.date} ({self.sleep_hours}h)"
\ No newline at end of file
+        return f"{self.user.user_id} - {self.date} ({self.sleep_hours}h)"
+
+
+class SleepPeriod(models.Model):
+    """サーバー側の睡眠判定で検出した睡眠区間（date は起床した日＝SleepData.date）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_column='user_id',
+        related_name='sleep_periods'
+    )
+    date = models.DateField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    minutes = models.PositiveIntegerField(help_text="区間の長さ (分)")
+
+    class Meta:
+        db_table = 'sleep_period'
+        ordering = ['user', 'start']
+        indexes = [
+            models.Index(fields=['user', 'date']),
+        ]
+        verbose_name = '睡眠区間'
+        verbose_name_plural = '睡眠区間'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.start:%Y-%m-%d %H:%M}〜{self.end:%H:%M}"
+
+
+class HealthRollupBase(models.Model):
+    """HealthData 集計テーブルの共通フィールド（件数・合計・最小・最大）"""
+    count = models.PositiveIntegerField(default=0)
+    body_sum = models.FloatField(default=0, help_text="体温の合計")
+    body_min = CentiDegreeField()  # ✅ HealthData.body と同じ 0.01℃単位の SMALLINT
+    body_max = CentiDegreeField()
+    heart_rate_sum = models.BigIntegerField(default=0, help_text="心拍数の合計")
+    heart_rate_min = models.PositiveSmallIntegerField()
+    heart_rate_max = models.PositiveSmallIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def avg_body(self):
+        return self.body_sum / self.count if self.count else None
+
+    @property
+    def avg_heart_rate(self):
+        return self.heart_rate_sum / self.count if self.count else None
+
+
+class HealthDailyRollup(HealthRollupBase):
+    """HealthData の日別集計（日本時間の日付単位）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_column='user_id',
+        related_name='health_daily_rollups'
+    )
+    date = models.DateField(help_text="日付 (JST)")
+
+    class Meta:
+        db_table = 'health_daily_rollup'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='uniq_health_daily_rollup'),
+        ]
+        verbose_name = '健康データ日別集計'
+        verbose_name_plural = '健康データ日別集計'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date} ({self.count}件)"
+
+
+class HealthHourlyRollup(HealthRollupBase):
+    """HealthData の時間別集計（日本時間の日付 + 時）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_column='user_id',
+        related_name='health_hourly_rollups'
+    )
+    date = models.DateField(help_text="日付 (JST)")
+    hour = models.PositiveSmallIntegerField(help_text="時 (JST, 0〜23)")
+
+    class Meta:
+        db_table = 'health_hourly_rollup'
+        ordering = ['-date', '-hour']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'hour'], name='uniq_health_hourly_rollup'),
+        ]
+        verbose_name = '健康データ時間別集計'
+        verbose_name_plural = '健康データ時間別集計'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date} {self.hour:02d}時 ({self.count}件)"
+
+
+class HealthHeartRateHistogram(models.Model):
+    """
+    心拍数の日別ヒストグラム（日本時間の日付単位）
+    counts は 30〜250bpm を1bpm刻みにした度数の配列（health.histogram 参照）
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_column='user_id',
+        related_name='heart_rate_histograms'
+    )
+    date = models.DateField(help_text="日付 (JST)")
+    count = models.PositiveIntegerField(default=0, help_text="サンプル数")
+    counts = models.BinaryField(help_text="1bpmごとの度数 (uint32 リトルエンディアン)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'health_hr_histogram'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='uniq_health_hr_histogram'),
+        ]
+        verbose_name = '心拍数日別ヒストグラム'
+        verbose_name_plural = '心拍数日別ヒストグラム'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date} ({self.count}件)"
+
+
+class HealthDataCounter(models.Model):
+    """
+    ユーザーごとの HealthData 件数（COUNT(*) を避けるための非正規化カウンタ）と
+    HealthData / SleepData の書き込みごとに進むデータバージョン（ETag 用）
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='user_id',
+        related_name='health_data_counter'
+    )
+    health_records = models.BigIntegerField(default=0, help_text="HealthData の件数")
+    data_version = models.BigIntegerField(default=0, help_text="健康・睡眠データの更新ごとに増える値")
+    data_modified_at = models.DateTimeField(null=True, blank=True, help_text="健康・睡眠データの最終更新日時")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'health_data_counter'
+        verbose_name = '健康データ件数'
+        verbose_name_plural = '健康データ件数'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.health_records}件"
+
+
+class HealthDataArchive(models.Model):
+    """保持期間を過ぎた HealthData の退避先（HEALTH_RETENTION_ARCHIVE が有効な場合）"""
+    id = models.BigIntegerField(primary_key=True, help_text="元の HealthData の ID")
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_column='user_id',
+        db_constraint=False,  # ✅ パーティション化・大量投入の妨げにならないよう制約は張らない
+        related_name='health_data_archive'
+    )
+    measured_at = models.DateTimeField()
+    body = CentiDegreeField()
+    heart_rate = models.PositiveSmallIntegerField()
+    device_id = models.CharField(max_length=50, null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'healthdata_archive'
+        indexes = [
+            models.Index(fields=['user', 'measured_at']),
+        ]
+        verbose_name = '健康データ（アーカイブ）'
+        verbose_name_plural = '健康データ（アーカイブ）'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.measured_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class HealthVitalStats(models.Model):
+    """
+    ユーザーごとの心拍数・体温の基準値
+    Welford 法の平均・分散（m2 は偏差平方和）と EWMA を登録のたびに O(1) で更新する
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='user_id',
+        related_name='health_vital_stats'
+    )
+    count = models.BigIntegerField(default=0, help_text="反映済みのサンプル数")
+    heart_rate_mean = models.FloatField(default=0.0)
+    heart_rate_m2 = models.FloatField(default=0.0)
+    heart_rate_ewma = models.FloatField(null=True, blank=True)
+    body_mean = models.FloatField(default=0.0)
+    body_m2 = models.FloatField(default=0.0)
+    body_ewma = models.FloatField(null=True, blank=True)
+    last_measured_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'health_vital_stats'
+        verbose_name = '健康データ基準値'
+        verbose_name_plural = '健康データ基準値'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.count}件"
+
+    def std(self, metric):
+        """標本標準偏差（2件未満なら None）"""
+        if self.count < 2:
+            return None
+        return (getattr(self, f"{metric}_m2") / (self.count - 1)) ** 0.5
+
+    @property
+    def heart_rate_std(self):
+        return self.std("heart_rate")
+
+    @property
+    def body_std(self):
+        return self.std("body")
+
+
+class HealthAnomaly(models.Model):
+    """登録時に基準値から大きく外れていた測定値"""
+    METRIC_CHOICES = [
+        ('heart_rate', '心拍数'),
+        ('body', '体温'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_column='user_id',
+        related_name='health_anomalies'
+    )
+    measured_at = models.DateTimeField()
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    value = models.FloatField(help_text="測定値")
+    baseline = models.FloatField(help_text="判定時の平均")
+    std = models.FloatField(help_text="判定時の標準偏差")
+    z_score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'health_anomaly'
+        ordering = ['-measured_at']
+        indexes = [
+            models.Index(fields=['user', 'measured_at']),
+        ]
+        verbose_name = '健康データの異常値'
+        verbose_name_plural = '健康データの異常値'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.get_metric_display()} {self.value} ({self.measured_at:%Y-%m-%d %H:%M})"
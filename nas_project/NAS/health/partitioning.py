@@ -0,0 +1,157 @@
+# health/partitioning.py
+
+"""
+healthdata テーブルの月別 RANGE パーティション管理（MySQLのみ）
+
+パーティション pYYYYMM には日本時間の YYYY年MM月 の測定データが入る。
+DBの DATETIME はUTCで保存されるため、境界は日本時間の月初0時をUTCに直した値になる。
+最後のパーティション pfuture (MAXVALUE) は未作成の月の受け皿で、通常は空にしておく。
+
+MySQL の制約により、パーティション化の際に
+  - user_id の外部キー制約を外す（削除時の連鎖は Django 側で行われる）
+  - 主キーを (id, measured_at) にする
+必要がある。
+"""
+
+from datetime import datetime, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from .models import HealthData
+
+
+JST = ZoneInfo('Asia/Tokyo')
+
+FUTURE_PARTITION = "pfuture"
+
+
+def _table():
+    return HealthData._meta.db_table
+
+
+def is_supported(connection):
+    return connection.vendor == "mysql"
+
+
+def month_start(year, month):
+    """日本時間の月初0時（aware）"""
+    return datetime(year, month, 1, tzinfo=JST)
+
+
+def add_months(year, month, months):
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def partition_name(year, month):
+    return f"p{year:04d}{month:02d}"
+
+
+def _parse_name(name):
+    return int(name[1:5]), int(name[5:7])
+
+
+def _bound_literal(year, month):
+    """(year, month) の翌月初（日本時間）をUTCの DATETIME 文字列にする"""
+    next_year, next_month = add_months(year, month, 1)
+    utc = month_start(next_year, next_month).astimezone(dt_timezone.utc)
+    return utc.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _definition(year, month):
+    return (
+        f"PARTITION {partition_name(year, month)} "
+        f"VALUES LESS THAN ('{_bound_literal(year, month)}')"
+    )
+
+
+def list_partitions(connection):
+    """
+    月別パーティションの一覧（pfuture を除く）
+
+    Returns:
+        list[tuple]: [(year, month), ...] 古い順。パーティション化されていなければ空
+    """
+    if not is_supported(connection):
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION",
+            [_table()],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    return [_parse_name(name) for name in names if name != FUTURE_PARTITION]
+
+
+def is_partitioned(connection):
+    return bool(list_partitions(connection))
+
+
+def enable(connection, first_month, last_month):
+    """
+    既存の healthdata テーブルを月別パーティションに変換する（1回だけ実行）
+    テーブル全体を作り直すため、メンテナンス時間帯に実行すること
+
+    Args:
+        first_month: 最初のパーティション (year, month)
+        last_month: 事前に作成する最後のパーティション (year, month)
+    """
+    table = _table()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+            "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [table],
+        )
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE `{table}` DROP FOREIGN KEY `{constraint}`")
+
+        cursor.execute(
+            f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `measured_at`)"
+        )
+
+        definitions = []
+        year, month = first_month
+        while (year, month) <= last_month:
+            definitions.append(_definition(year, month))
+            year, month = add_months(year, month, 1)
+        definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+
+        cursor.execute(
+            f"ALTER TABLE `{table}` PARTITION BY RANGE COLUMNS(`measured_at`) "
+            f"({', '.join(definitions)})"
+        )
+
+
+def add_partitions(connection, months):
+    """
+    pfuture を分割して月別パーティションを追加する
+
+    Args:
+        months: [(year, month), ...] 既存の最後の月より後の月（昇順）
+    """
+    if not months:
+        return
+
+    definitions = [_definition(year, month) for year, month in months]
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE `{_table()}` REORGANIZE PARTITION {FUTURE_PARTITION} "
+            f"INTO ({', '.join(definitions)})"
+        )
+
+
+def drop_partitions(connection, months):
+    """月別パーティションを削除する（中の行も消える。シグナルは発火しない）"""
+    if not months:
+        return
+
+    names = ", ".join(partition_name(year, month) for year, month in months)
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE `{_table()}` DROP PARTITION {names}")
@@ -1,10 +1,84 @@
 # healthdata/services/health_service.py
 
-from datetime import timedelta
+import math
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from zoneinfo import ZoneInfo
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
 from django.utils import timezone
-from django.db import models
-from django.db.models import Avg, Min, Max
-from .models import HealthData, SleepData
+from django.utils.dateparse import parse_datetime
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Avg, Count, Min, Max, Sum, F, Q, Value
+from django.db.models.functions import Floor, Greatest, Least, TruncMonth
+from .models import (
+    CentiDegreeField,
+    HealthData,
+    SleepData,
+    SleepPeriod,
+    HealthDailyRollup,
+    HealthHourlyRollup,
+    HealthHeartRateHistogram,
+    HealthDataCounter,
+    HealthDataArchive,
+    HealthVitalStats,
+    HealthAnomaly,
+)
+from . import histogram, partitioning
+from .downsampling import lttb, minmax_buckets
+from .sleep_detection import segment as segment_sleep
+
+
+# 体温・心拍数の許容範囲（HealthDataCreateSerializer と共通）
+BODY_TEMP_MIN = Decimal("30.0")
+BODY_TEMP_MAX = Decimal("45.0")
+HEART_RATE_MIN = 30
+HEART_RATE_MAX = 250
+MOTION_MIN = Decimal("0")
+MOTION_MAX = Decimal("20")
+
+# 一括登録の上限件数と1トランザクションあたりの件数
+BATCH_MAX_SAMPLES = 20000
+BATCH_CHUNK_SIZE = 1000
+
+# バイナリ一括登録の1レコード（リトルエンディアン・9バイト固定長）
+#   uint32 測定日時(epoch秒) / uint8 心拍数 / int16 体温(0.01℃単位) / uint16 動き(0.01単位)
+BINARY_SAMPLE_DTYPE = np.dtype([
+    ("epoch", "<u4"),
+    ("heart_rate", "u1"),
+    ("body", "<i2"),
+    ("motion", "<u2"),
+])
+BINARY_MOTION_MISSING = 0xFFFF  # 動きを計測していない場合の値
+BINARY_MIN_EPOCH = 1577836800   # 2020-01-01 より前は時刻未同期のデバイスとして弾く
+
+# 時系列API・エクスポートでDBから1回に読み込む件数
+SERIES_CHUNK_SIZE = 2000
+EXPORT_CHUNK_SIZE = 5000
+
+# サーバー側の睡眠判定（SensorDataManager.calculateSleep と同じ条件）
+SLEEP_DAY_BOUNDARY_HOUR = 12      # 夜の区切り（日本時間12時〜翌12時を翌日の睡眠とする）
+SLEEP_HEART_RATE_MIN = 50
+SLEEP_HEART_RATE_MAX = 70
+SLEEP_MOTION_MAX = 0.7
+SLEEP_MAX_GAP_SECONDS = 180       # サンプルがこれ以上途切れたら区間を分ける
+SLEEP_MIN_PERIOD_MINUTES = 10     # これより短い区間はノイズとして捨てる
+SLEEP_MIN_COVERAGE_MINUTES = 180  # 1晩のサンプルがこれ未満なら判定しない
+SLEEP_GOOD_HOURS = 6
+SLEEP_DETECTION_BATCH_USERS = 100
+
+# 基準値（平均・分散・EWMA）と異常値の判定
+VITALS_EWMA_ALPHA = 0.05
+VITALS_MIN_SAMPLES = 60           # これより少ない間は判定しない
+VITALS_ZSCORE_THRESHOLD = 4.0
+VITALS_MIN_STD = {"heart_rate": 2.0, "body": 0.1}  # 値がほぼ一定でも過敏にならないよう下限を設ける
+
+# 複数期間グラフAPIの期間の単位
+WINDOW_GRANULARITIES = ("day", "week", "month", "year")
+WEEKDAY_LABELS = ["日", "月", "火", "水", "木", "金", "土"]
+
+JST = ZoneInfo('Asia/Tokyo')
 
 
 class HealthDataService:
@@ -13,22 +87,263 @@ class HealthDataService:
     @staticmethod
     def create_health_data(user, data):
         """
-        新しい健康データを登録
+        新しい健康データを登録（同じ測定日時のデータがあれば登録しない）
         
         Args:
             user: Userインスタンス
             data: {
                 'measured_at': datetime,
                 'body': float,
-                'heart_rate': int
+                'heart_rate': int,
+                'motion': float (optional),
+                'device_id': str (optional)
             }
+
+        Returns:
+            tuple: (HealthData, created)
         """
-        return HealthData.objects.create(
-            user=user,
-            measured_at=data.get("measured_at", timezone.now()),
-            body=data.get("body"),
-            heart_rate=data.get("heart_rate"),
-        )
+        with transaction.atomic():
+            # 一括登録と同じロックで、存在確認から登録までを直列化する
+            HealthCounterService.lock(user.pk)
+            return HealthData.objects.get_or_create(
+                user=user,
+                measured_at=data.get("measured_at", timezone.now()),
+                defaults={
+                    "body": data.get("body"),
+                    "heart_rate": data.get("heart_rate"),
+                    "motion": data.get("motion"),
+                    "device_id": data.get("device_id"),
+                },
+            )
+
+    @staticmethod
+    def validate_samples(samples):
+        """
+        一括登録用のサンプル配列をまとめて検証する
+        （シリアライザーを1件ずつ生成せず、同じ範囲チェックを一括で適用）
+
+        Args:
+            samples: [{'measured_at': str, 'body': float, 'heart_rate': int, 'motion': float}, ...]
+                     motion は省略可
+
+        Returns:
+            tuple: (rows, rejects)
+                rows: [(measured_at, body, heart_rate, motion), ...] 登録可能な行
+                rejects: [{'index': int, 'errors': {field: [message]}}, ...]
+        """
+        current_tz = timezone.get_current_timezone()
+        rows = []
+        rejects = []
+
+        for index, sample in enumerate(samples):
+            if not isinstance(sample, dict):
+                rejects.append({
+                    "index": index,
+                    "errors": {"non_field_errors": ["オブジェクト形式で送信してください"]},
+                })
+                continue
+
+            errors = {}
+
+            # 測定日時
+            raw_measured_at = sample.get("measured_at")
+            try:
+                measured_at = parse_datetime(raw_measured_at) if isinstance(raw_measured_at, str) else None
+            except ValueError:
+                # 形式は正しいが存在しない日時（2026-02-30 など）
+                measured_at = None
+            if measured_at is None:
+                errors["measured_at"] = ["日時の形式が正しくありません"]
+            elif timezone.is_naive(measured_at):
+                measured_at = timezone.make_aware(measured_at, current_tz)
+
+            # 体温
+            try:
+                body = Decimal(str(sample.get("body"))).quantize(Decimal("0.01"))
+                if body < BODY_TEMP_MIN or body > BODY_TEMP_MAX:
+                    errors["body"] = ["体温は30.0〜45.0の範囲で入力してください"]
+            except (InvalidOperation, ValueError):
+                errors["body"] = ["体温の値が正しくありません"]
+
+            # 心拍数
+            heart_rate = sample.get("heart_rate")
+            if isinstance(heart_rate, bool) or not isinstance(heart_rate, (int, float, str)):
+                errors["heart_rate"] = ["心拍数の値が正しくありません"]
+            else:
+                try:
+                    value = Decimal(str(heart_rate))
+                    if value != value.to_integral_value():
+                        raise ValueError
+                    heart_rate = int(value)
+                    if heart_rate < HEART_RATE_MIN or heart_rate > HEART_RATE_MAX:
+                        errors["heart_rate"] = ["心拍数は30〜250の範囲で入力してください"]
+                except (InvalidOperation, ValueError):
+                    errors["heart_rate"] = ["心拍数の値が正しくありません"]
+
+            # 動き（任意）
+            motion = sample.get("motion")
+            if motion is not None:
+                try:
+                    if isinstance(motion, bool):
+                        raise ValueError
+                    motion = Decimal(str(motion)).quantize(Decimal("0.01"))
+                    if motion < MOTION_MIN or motion > MOTION_MAX:
+                        errors["motion"] = ["動きは0〜20の範囲で入力してください"]
+                except (InvalidOperation, ValueError):
+                    errors["motion"] = ["動きの値が正しくありません"]
+
+            if errors:
+                rejects.append({"index": index, "errors": errors})
+            else:
+                rows.append((measured_at, body, heart_rate, motion))
+
+        return rows, rejects
+
+    @staticmethod
+    def decode_binary_samples(payload):
+        """
+        バイナリ一括登録の本文をデコードして検証する（NumPy で一括処理）
+        validate_samples() と同じ形式で結果を返す
+
+        Args:
+            payload: BINARY_SAMPLE_DTYPE のレコードを連結した bytes
+
+        Returns:
+            tuple: (rows, rejects)
+
+        Raises:
+            ValueError: 本文の長さがレコード長の倍数でない場合
+        """
+        if len(payload) % BINARY_SAMPLE_DTYPE.itemsize:
+            raise ValueError(f"本文の長さが{BINARY_SAMPLE_DTYPE.itemsize}バイトの倍数ではありません")
+
+        records = np.frombuffer(payload, dtype=BINARY_SAMPLE_DTYPE)
+        epoch = records["epoch"]
+        heart_rate = records["heart_rate"]
+        body = records["body"]
+        motion = records["motion"]
+
+        bad_time = epoch < BINARY_MIN_EPOCH
+        bad_heart_rate = (heart_rate < HEART_RATE_MIN) | (heart_rate > HEART_RATE_MAX)
+        bad_body = (body < int(BODY_TEMP_MIN * 100)) | (body > int(BODY_TEMP_MAX * 100))
+        bad_motion = (motion != BINARY_MOTION_MISSING) & (motion > int(MOTION_MAX * 100))
+        invalid = bad_time | bad_heart_rate | bad_body | bad_motion
+
+        rejects = []
+        for index in np.flatnonzero(invalid).tolist():
+            errors = {}
+            if bad_time[index]:
+                errors["measured_at"] = ["日時の形式が正しくありません"]
+            if bad_body[index]:
+                errors["body"] = ["体温は30.0〜45.0の範囲で入力してください"]
+            if bad_heart_rate[index]:
+                errors["heart_rate"] = ["心拍数は30〜250の範囲で入力してください"]
+            if bad_motion[index]:
+                errors["motion"] = ["動きは0〜20の範囲で入力してください"]
+            rejects.append({"index": index, "errors": errors})
+
+        valid = ~invalid
+        rows = [
+            (
+                datetime.fromtimestamp(seconds, tz=dt_timezone.utc),
+                Decimal(centi_body).scaleb(-2),
+                bpm,
+                None if centi_motion == BINARY_MOTION_MISSING else Decimal(centi_motion).scaleb(-2),
+            )
+            for seconds, bpm, centi_body, centi_motion in zip(
+                epoch[valid].tolist(), heart_rate[valid].tolist(),
+                body[valid].tolist(), motion[valid].tolist()
+            )
+        ]
+        return rows, rejects
+
+    @staticmethod
+    def bulk_create_health_data(user, rows, device_id=None, chunk_size=BATCH_CHUNK_SIZE):
+        """
+        検証済みの行を bulk_create でまとめて登録
+        （chunk_size 件ごとに1トランザクション、登録済みの測定日時はスキップ）
+
+        Args:
+            user: Userインスタンス
+            rows: validate_samples() が返した [(measured_at, body, heart_rate, motion), ...]
+            device_id: 送信元デバイスID（任意）
+            chunk_size: 1トランザクションあたりの件数
+
+        Returns:
+            tuple: (登録件数, 重複としてスキップした件数)
+        """
+        created = 0
+        duplicates = 0
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+
+            with transaction.atomic():
+                # 同じユーザーの取り込みを直列化し、重複判定と集計の更新を一致させる
+                HealthCounterService.lock(user.pk)
+
+                existing = set(
+                    HealthData.objects.filter(
+                        user=user,
+                        measured_at__in=[row[0] for row in chunk]
+                    ).values_list("measured_at", flat=True)
+                )
+                new_rows = []
+                for row in chunk:
+                    if row[0] not in existing:
+                        existing.add(row[0])
+                        new_rows.append(row)
+
+                new_rows = HealthDataService._insert_rows(user, new_rows, device_id)
+
+                # bulk_create はシグナルを発火しないため集計・件数・キャッシュを直接更新
+                if new_rows:
+                    HealthRollupService.apply_samples(user.pk, new_rows)
+                    version = HealthCounterService.increment(user.pk, len(new_rows))
+                    HealthSummaryService.health_added(user.pk, version, new_rows)
+                    HealthVitalsService.observe(user.pk, new_rows)
+
+            created += len(new_rows)
+            duplicates += len(chunk) - len(new_rows)
+
+        return created, duplicates
+
+    @staticmethod
+    def _insert_rows(user, rows, device_id):
+        """
+        行をまとめて INSERT し、実際に登録した行を返す
+        （ロック外の経路で同じ測定日時が先に登録されていた場合は1件ずつ登録し直し、重複をスキップ）
+        """
+        def instance(row):
+            measured_at, body, heart_rate, motion = row
+            local_date, local_minute = HealthData.local_fields(measured_at)
+            return HealthData(
+                user=user,
+                measured_at=measured_at,
+                body=body,
+                heart_rate=heart_rate,
+                motion=motion,
+                device_id=device_id,
+                local_date=local_date,
+                local_minute=local_minute,
+            )
+
+        try:
+            with transaction.atomic():
+                HealthData.objects.bulk_create([instance(row) for row in rows])
+            return rows
+        except IntegrityError:
+            pass
+
+        inserted = []
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    HealthData.objects.bulk_create([instance(row)])
+                inserted.append(row)
+            except IntegrityError:
+                continue
+        return inserted
 
     @staticmethod
     def get_recent_data(user, hours=24):
@@ -55,22 +370,121 @@ class HealthDataService:
         
         Args:
             user: Userインスタンス
-            start_date: datetime or str "2026-01-01"
-            end_date: datetime or str "2026-01-31"
+            start_date: date or str "2026-01-01"（日本時間の日付）
+            end_date: date or str "2026-01-31"
             
         Returns:
             QuerySet[HealthData]
         """
         return HealthData.objects.filter(
             user=user,
-            measured_at__date__gte=start_date,
-            measured_at__date__lte=end_date
+            local_date__gte=start_date,
+            local_date__lte=end_date
         ).order_by("measured_at")
 
+    @staticmethod
+    def get_downsampled_series(user, start, end, points, mode="minmax"):
+        """
+        長期間グラフ用に間引いた時系列を取得
+        values_list のタプルを iterator() で流し、モデルを生成せずに1パスで処理する
+
+        Args:
+            user: Userインスタンス
+            start: aware datetime（この時刻を含む）
+            end: aware datetime（この時刻を含まない）
+            points: 返す最大点数
+            mode: 'minmax'（バケットごとの最小・最大・平均）or 'lttb'（代表点）
+
+        Returns:
+            dict: 列ごとの配列。件数は期間の長さによらず points 以下
+        """
+        rows = (
+            (measured_at.timestamp(), float(body), float(heart_rate))
+            for measured_at, body, heart_rate in HealthData.objects.filter(
+                user=user,
+                measured_at__gte=start,
+                measured_at__lt=end
+            ).order_by("measured_at").values_list(
+                "measured_at", "body", "heart_rate"
+            ).iterator(chunk_size=SERIES_CHUNK_SIZE)
+        )
+
+        def to_time(x):
+            return datetime.fromtimestamp(x, JST).isoformat(timespec="seconds")
+
+        if mode == "lttb":
+            body, heart_rate = lttb(rows, start.timestamp(), end.timestamp(), points, 2)
+            return {
+                "mode": "lttb",
+                "body": {
+                    "time": [to_time(x) for x, _ in body],
+                    "value": [round(v, 2) for _, v in body],
+                },
+                "heart_rate": {
+                    "time": [to_time(x) for x, _ in heart_rate],
+                    "value": [round(v) for _, v in heart_rate],
+                },
+            }
+
+        buckets = minmax_buckets(rows, start.timestamp(), end.timestamp(), points, 2)
+        return {
+            "mode": "minmax",
+            "time": [to_time(b["x"]) for b in buckets],
+            "count": [b["count"] for b in buckets],
+            "body_min": [round(b["values"][0][0], 2) for b in buckets],
+            "body_max": [round(b["values"][0][1], 2) for b in buckets],
+            "body_mean": [round(b["values"][0][2], 2) for b in buckets],
+            "heart_rate_min": [round(b["values"][1][0]) for b in buckets],
+            "heart_rate_max": [round(b["values"][1][1]) for b in buckets],
+            "heart_rate_mean": [round(b["values"][1][2], 1) for b in buckets],
+        }
+
+    @staticmethod
+    def iter_export_chunks(user, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        エクスポート用に全履歴を古い順にチャンク単位で返す
+
+        MySQL のドライバは iterator() でも結果全体をメモリに読み込むため、
+        (measured_at, id) のキーセットで chunk_size 件ずつ別クエリに分けて読む。
+
+        Args:
+            user: Userインスタンス
+            start: aware datetime（この時刻を含む）or None
+            end: aware datetime（この時刻を含まない）or None
+            chunk_size: 1クエリあたりの件数
+
+        Yields:
+            list[tuple]: [(measured_at, body, heart_rate), ...]
+        """
+        qs = HealthData.objects.filter(user=user)
+        if start:
+            qs = qs.filter(measured_at__gte=start)
+        if end:
+            qs = qs.filter(measured_at__lt=end)
+        qs = qs.order_by("measured_at", "id")
+
+        last = None
+        while True:
+            page = qs
+            if last is not None:
+                page = page.filter(
+                    Q(measured_at__gt=last[0]) | Q(measured_at=last[0], id__gt=last[1])
+                )
+            rows = list(page.values_list("measured_at", "id", "body", "heart_rate")[:chunk_size])
+            if not rows:
+                return
+
+            last = rows[-1][:2]
+            yield [(measured_at, body, heart_rate) for measured_at, _, body, heart_rate in rows]
+
+            if len(rows) < chunk_size:
+                return
+
     @staticmethod
     def get_average_data(user, days=7):
         """
         一定期間の平均値を計算
+        （現在時刻から days 日前までの全行。正時以降は時間別集計、先頭の端数は生データから集計）
         
         Args:
             user: Userインスタンス
@@ -88,25 +502,54 @@ class HealthDataService:
             }
         """
         since = timezone.now() - timedelta(days=days)
-        qs = HealthData.objects.filter(user=user, measured_at__gte=since)
+        since_date, since_hour = HealthRollupService.local_bucket(since)
+        next_hour = since.astimezone(JST).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
 
-        if not qs.exists():
-            return None
+        # 時間別集計テーブルから一度に集計（since を含む時間帯は途中からになるため除く）
+        stats = HealthHourlyRollup.objects.filter(user=user).filter(
+            Q(date__gt=since_date) | Q(date=since_date, hour__gt=since_hour)
+        ).aggregate(
+            count=Sum("count"),
+            body_sum=Sum("body_sum"),
+            hr_sum=Sum("heart_rate_sum"),
+            min_body=Min("body_min"),
+            max_body=Max("body_max"),
+            min_hr=Min("heart_rate_min"),
+            max_hr=Max("heart_rate_max"),
+        )
 
-        # 一度に集計
-        stats = qs.aggregate(
-            avg_body=Avg("body"),
-            avg_hr=Avg("heart_rate"),
+        # since から次の正時までは生データ（最大1時間分）を集計して合算
+        head = HealthData.objects.filter(
+            user=user, measured_at__gte=since, measured_at__lt=next_hour
+        ).aggregate(
+            count=Count("id"),
+            body_sum=Sum("body"),
+            hr_sum=Sum("heart_rate"),
             min_body=Min("body"),
             max_body=Max("body"),
             min_hr=Min("heart_rate"),
             max_hr=Max("heart_rate"),
-            count=models.Count("id"),
         )
+        if head["count"]:
+            if not stats["count"]:
+                stats = head
+            else:
+                stats = {
+                    "count": stats["count"] + head["count"],
+                    "body_sum": stats["body_sum"] + head["body_sum"],
+                    "hr_sum": stats["hr_sum"] + head["hr_sum"],
+                    "min_body": min(stats["min_body"], head["min_body"]),
+                    "max_body": max(stats["max_body"], head["max_body"]),
+                    "min_hr": min(stats["min_hr"], head["min_hr"]),
+                    "max_hr": max(stats["max_hr"], head["max_hr"]),
+                }
+
+        if not stats["count"]:
+            return None
 
         return {
-            "average_body": round(stats["avg_body"], 1) if stats["avg_body"] else None,
-            "average_heart_rate": round(stats["avg_hr"]) if stats["avg_hr"] else None,
+            "average_body": round(stats["body_sum"] / stats["count"], 1),
+            "average_heart_rate": round(stats["hr_sum"] / stats["count"]),
             "min_body": stats["min_body"],
             "max_body": stats["max_body"],
             "min_heart_rate": stats["min_hr"],
@@ -114,22 +557,1331 @@ class HealthDataService:
             "data_count": stats["count"],
         }
 
+    @staticmethod
+    def get_period_averages(user, start_date):
+        """
+        指定日（JST）以降の平均値を日別集計テーブルから取得
+
+        Args:
+            user: Userインスタンス
+            start_date: datetime.date
+
+        Returns:
+            tuple: (avg_body, avg_heart_rate) データがなければ (None, None)
+        """
+        stats = HealthDailyRollup.objects.filter(
+            user=user,
+            date__gte=start_date
+        ).aggregate(
+            count=Sum("count"),
+            body_sum=Sum("body_sum"),
+            hr_sum=Sum("heart_rate_sum"),
+        )
+
+        if not stats["count"]:
+            return None, None
+
+        return stats["body_sum"] / stats["count"], stats["hr_sum"] / stats["count"]
+
+    @staticmethod
+    def get_daily_averages(user, date_list):
+        """
+        日ごとの平均値を日別集計テーブルから1クエリで取得（日本時間の日付単位）
+
+        Args:
+            user: Userインスタンス
+            date_list: 連続した datetime.date のリスト（週表示なら7日分）
+
+        Returns:
+            tuple: (heart_rate, temperature)
+                date_list と同じ長さのリスト。データのない日は None
+        """
+        rollups = HealthDailyRollup.objects.filter(
+            user=user,
+            date__range=[date_list[0], date_list[-1]]
+        )
+        averages = {rollup.date: rollup for rollup in rollups}
+
+        heart_rate = []
+        temperature = []
+        for day in date_list:
+            rollup = averages.get(day)
+            heart_rate.append(round(rollup.avg_heart_rate) if rollup and rollup.count else None)
+            temperature.append(round(rollup.avg_body, 1) if rollup and rollup.count else None)
+
+        return heart_rate, temperature
+
     @staticmethod
     def get_hourly_data(user, date):
         """
-        特定日の時間別データを取得（24時間分）
+        特定日の時間別集計を取得（24時間分）
         
         Args:
             user: Userインスタンス
             date: datetime.date or str "2026-01-30"
             
         Returns:
-            QuerySet[HealthData]
+            QuerySet[HealthHourlyRollup]
         """
-        return HealthData.objects.filter(
+        return HealthHourlyRollup.objects.filter(
             user=user,
-            measured_at__date=date
-        ).order_by("measured_at")
+            date=date
+        ).order_by("hour")
+
+
+class HealthWindowService:
+    """
+    日・週・月・年単位で複数期間分のグラフデータをまとめて取得
+    全期間を1つの範囲として指標ごとに1クエリで読み込み、Python 側で期間に振り分ける
+      day: 1時間ごと（時間別集計） / week・month: 1日ごと（日別集計） / year: 1か月ごと
+    """
+
+    @staticmethod
+    def window_range(granularity, today, periods_ago):
+        """
+        期間の範囲（日本時間の日付、両端を含む）
+
+        Returns:
+            tuple: (start_date, end_date)
+        """
+        if granularity == "day":
+            start = today - timedelta(days=periods_ago)
+            return start, start
+        if granularity == "week":
+            this_sunday = today - timedelta(days=(today.weekday() + 1) % 7)
+            start = this_sunday - timedelta(weeks=periods_ago)
+            return start, start + timedelta(days=6)
+        if granularity == "month":
+            index = today.year * 12 + today.month - 1 - periods_ago
+            start = today.replace(year=index // 12, month=index % 12 + 1, day=1)
+            next_index = index + 1
+            end = start.replace(year=next_index // 12, month=next_index % 12 + 1) - timedelta(days=1)
+            return start, end
+        if granularity == "year":
+            year = today.year - periods_ago
+            return today.replace(year=year, month=1, day=1), today.replace(year=year, month=12, day=31)
+        raise ValueError(f"不明な期間の単位です: {granularity}")
+
+    @staticmethod
+    def _points(granularity, start, end):
+        """期間内の点のキーとラベル"""
+        if granularity == "day":
+            return [(start, hour) for hour in range(24)], [f"{hour}時" for hour in range(24)]
+        if granularity == "year":
+            months = [start.replace(month=month) for month in range(1, 13)]
+            return months, [f"{month.month}月" for month in months]
+
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        if granularity == "week":
+            return days, [WEEKDAY_LABELS[(day.weekday() + 1) % 7] for day in days]
+        return days, [f"{day.day}日" for day in days]
+
+    @staticmethod
+    def _period_label(granularity, start, end):
+        if granularity == "day":
+            return f"{start.month}/{start.day}"
+        if granularity == "week":
+            return f"{start.month}/{start.day} ~ {end.month}/{end.day}"
+        if granularity == "month":
+            return f"{start.year}年{start.month}月"
+        return f"{start.year}年"
+
+    @staticmethod
+    def get_windows(user, granularity, count, offset=0):
+        """
+        offset 期間前から count 期間分のグラフデータを取得（新しい期間から順に）
+
+        Args:
+            user: Userインスタンス
+            granularity: 'day' | 'week' | 'month' | 'year'
+            count: 期間の数
+            offset: 何期間前から始めるか（0=今日・今週・今月・今年）
+
+        Returns:
+            list[dict]: [{'periods_ago', 'start', 'end', 'period_label', 'labels',
+                          'heart_rate', 'temperature', 'sleep_hours'}, ...]
+        """
+        today = timezone.now().astimezone(JST).date()
+        ranges = [
+            (periods_ago, *HealthWindowService.window_range(granularity, today, periods_ago))
+            for periods_ago in range(offset, offset + count)
+        ]
+        range_start = ranges[-1][1]
+        range_end = ranges[0][2]
+
+        # 身体データ: キー -> (件数, 体温合計, 心拍数合計)
+        body = {}
+        if granularity == "day":
+            for day, hour, total, body_sum, hr_sum in HealthHourlyRollup.objects.filter(
+                user=user, date__range=[range_start, range_end]
+            ).values_list("date", "hour", "count", "body_sum", "heart_rate_sum"):
+                body[(day, hour)] = (total, body_sum, hr_sum)
+        elif granularity == "year":
+            for row in HealthDailyRollup.objects.filter(
+                user=user, date__range=[range_start, range_end]
+            ).annotate(month=TruncMonth("date")).values("month").annotate(
+                total=Sum("count"), body_total=Sum("body_sum"), hr_total=Sum("heart_rate_sum")
+            ).order_by():
+                body[row["month"]] = (row["total"], row["body_total"], row["hr_total"])
+        else:
+            for day, total, body_sum, hr_sum in HealthDailyRollup.objects.filter(
+                user=user, date__range=[range_start, range_end]
+            ).values_list("date", "count", "body_sum", "heart_rate_sum"):
+                body[day] = (total, body_sum, hr_sum)
+
+        # 睡眠データ: 日付（year は月初） -> 睡眠時間
+        sleep_queryset = SleepData.objects.filter(user=user, date__range=[range_start, range_end])
+        if granularity == "year":
+            sleep = {
+                row["month"]: round(float(row["average"]), 2)
+                for row in sleep_queryset.annotate(month=TruncMonth("date"))
+                .values("month").annotate(average=Avg("sleep_hours")).order_by()
+            }
+        else:
+            sleep = {day: float(hours) for day, hours in sleep_queryset.values_list("date", "sleep_hours")}
+
+        windows = []
+        for periods_ago, start, end in ranges:
+            keys, labels = HealthWindowService._points(granularity, start, end)
+
+            heart_rate = []
+            temperature = []
+            for key in keys:
+                total, body_sum, hr_sum = body.get(key, (0, 0, 0))
+                heart_rate.append(round(hr_sum / total) if total else None)
+                temperature.append(round(body_sum / total, 1) if total else None)
+
+            if granularity == "day":
+                sleep_hours = [sleep.get(start)]
+            else:
+                sleep_hours = [sleep.get(key) for key in keys]
+
+            windows.append({
+                "periods_ago": periods_ago,
+                "start": start,
+                "end": end,
+                "period_label": HealthWindowService._period_label(granularity, start, end),
+                "labels": labels,
+                "heart_rate": heart_rate,
+                "temperature": temperature,
+                "sleep_hours": sleep_hours,
+            })
+
+        return windows
+
+
+class HealthRollupService:
+    """
+    HealthData の日別・時間別集計テーブルと心拍数の日別ヒストグラムの更新
+    登録時は差分を加算し、更新・削除時は該当バケットだけを再集計する
+    """
+
+    @staticmethod
+    def local_bucket(measured_at):
+        """
+        測定日時を日本時間のバケットに変換
+
+        Returns:
+            tuple: (date, hour)
+        """
+        local_date, local_minute = HealthData.local_fields(measured_at)
+        return local_date, local_minute // 60
+
+    @staticmethod
+    def _summarize(rows):
+        """(measured_at, body, heart_rate) の行を日別・時間別に集計"""
+        daily = {}
+        hourly = {}
+
+        for measured_at, body, heart_rate, *_ in rows:
+            day, hour = HealthRollupService.local_bucket(measured_at)
+            body = Decimal(str(body))
+            heart_rate = int(heart_rate)
+
+            for buckets, key in ((daily, day), (hourly, (day, hour))):
+                stats = buckets.get(key)
+                if stats is None:
+                    buckets[key] = {
+                        "count": 1,
+                        "body_sum": float(body),
+                        "body_min": body,
+                        "body_max": body,
+                        "heart_rate_sum": heart_rate,
+                        "heart_rate_min": heart_rate,
+                        "heart_rate_max": heart_rate,
+                    }
+                else:
+                    stats["count"] += 1
+                    stats["body_sum"] += float(body)
+                    stats["body_min"] = min(stats["body_min"], body)
+                    stats["body_max"] = max(stats["body_max"], body)
+                    stats["heart_rate_sum"] += heart_rate
+                    stats["heart_rate_min"] = min(stats["heart_rate_min"], heart_rate)
+                    stats["heart_rate_max"] = max(stats["heart_rate_max"], heart_rate)
+
+        return daily, hourly
+
+    @staticmethod
+    def _increment(model, keys, stats):
+        """集計行に差分を加算（行がなければ作成）"""
+        changes = {
+            "count": F("count") + stats["count"],
+            "body_sum": F("body_sum") + stats["body_sum"],
+            "body_min": Least("body_min", Value(stats["body_min"], output_field=CentiDegreeField())),
+            "body_max": Greatest("body_max", Value(stats["body_max"], output_field=CentiDegreeField())),
+            "heart_rate_sum": F("heart_rate_sum") + stats["heart_rate_sum"],
+            "heart_rate_min": Least("heart_rate_min", Value(stats["heart_rate_min"])),
+            "heart_rate_max": Greatest("heart_rate_max", Value(stats["heart_rate_max"])),
+        }
+
+        with transaction.atomic():
+            if model.objects.filter(**keys).update(**changes):
+                return
+            try:
+                with transaction.atomic():
+                    model.objects.create(**keys, **stats)
+            except IntegrityError:
+                # 同時に作成された場合は加算し直す
+                model.objects.filter(**keys).update(**changes)
+
+    @staticmethod
+    def apply_samples(user_id, rows):
+        """
+        新規登録された行を集計テーブルに加算
+
+        Args:
+            user_id: ユーザーID
+            rows: [(measured_at, body, heart_rate), ...]
+        """
+        daily, hourly = HealthRollupService._summarize(rows)
+
+        for day, stats in daily.items():
+            HealthRollupService._increment(
+                HealthDailyRollup, {"user_id": user_id, "date": day}, stats
+            )
+        for (day, hour), stats in hourly.items():
+            HealthRollupService._increment(
+                HealthHourlyRollup, {"user_id": user_id, "date": day, "hour": hour}, stats
+            )
+
+        heart_rates = {}
+        for measured_at, _, heart_rate, *_ in rows:
+            heart_rates.setdefault(HealthRollupService.local_bucket(measured_at)[0], []).append(heart_rate)
+        for day, values in heart_rates.items():
+            HealthRollupService._add_histogram(user_id, day, histogram.from_values(values))
+
+    @staticmethod
+    def _add_histogram(user_id, day, counts):
+        """日別ヒストグラムに度数を加算（バイナリのため行をロックして読み書きする）"""
+        with transaction.atomic():
+            row = HealthHeartRateHistogram.objects.select_for_update().filter(
+                user_id=user_id, date=day
+            ).first()
+            if row is not None:
+                merged = histogram.unpack(row.counts) + counts
+                row.counts = histogram.pack(merged)
+                row.count = int(merged.sum())
+                row.save(update_fields=["counts", "count", "updated_at"])
+                return
+            try:
+                with transaction.atomic():
+                    HealthHeartRateHistogram.objects.create(
+                        user_id=user_id, date=day, count=int(counts.sum()), counts=histogram.pack(counts)
+                    )
+            except IntegrityError:
+                # 同時に作成された場合は加算し直す
+                HealthRollupService._add_histogram(user_id, day, counts)
+
+    @staticmethod
+    def _recompute_histogram(user_id, day):
+        """生データから1日分のヒストグラムを作り直す（データがなければ削除）"""
+        counts = histogram.from_counts(
+            HealthData.objects.filter(user_id=user_id, local_date=day).order_by()
+            .values_list("heart_rate").annotate(total=models.Count("id"))
+        )
+        total = int(counts.sum())
+        if not total:
+            HealthHeartRateHistogram.objects.filter(user_id=user_id, date=day).delete()
+            return
+
+        HealthHeartRateHistogram.objects.update_or_create(
+            user_id=user_id, date=day,
+            defaults={"count": total, "counts": histogram.pack(counts)},
+        )
+
+    @staticmethod
+    def _recompute(model, keys, **filters):
+        """生データから1バケット分を再集計（データがなければ集計行を削除）"""
+        stats = HealthData.objects.filter(
+            user_id=keys["user_id"],
+            **filters
+        ).aggregate(
+            count=models.Count("id"),
+            body_sum=Sum("body"),
+            body_min=Min("body"),
+            body_max=Max("body"),
+            heart_rate_sum=Sum("heart_rate"),
+            heart_rate_min=Min("heart_rate"),
+            heart_rate_max=Max("heart_rate"),
+        )
+
+        if not stats["count"]:
+            model.objects.filter(**keys).delete()
+            return
+
+        stats["body_sum"] = float(stats["body_sum"])
+        model.objects.update_or_create(**keys, defaults=stats)
+
+    @staticmethod
+    def recompute_buckets(user_id, measured_at_list):
+        """
+        更新・削除された行が属するバケットを再集計
+
+        Args:
+            user_id: ユーザーID
+            measured_at_list: 影響を受けた測定日時のリスト
+        """
+        buckets = {
+            HealthRollupService.local_bucket(measured_at)
+            for measured_at in measured_at_list
+            if measured_at is not None
+        }
+
+        for day in {day for day, _ in buckets}:
+            HealthRollupService._recompute(
+                HealthDailyRollup,
+                {"user_id": user_id, "date": day},
+                local_date=day
+            )
+            HealthRollupService._recompute_histogram(user_id, day)
+
+        for day, hour in buckets:
+            HealthRollupService._recompute(
+                HealthHourlyRollup,
+                {"user_id": user_id, "date": day, "hour": hour},
+                local_date=day,
+                local_minute__gte=hour * 60,
+                local_minute__lt=(hour + 1) * 60
+            )
+
+    @staticmethod
+    def rebuild_for_user(user, since=None):
+        """
+        ユーザーの集計テーブルを生データから作り直す（バックフィル用）
+        生データの保持期間が設定されている場合、期限切れの日の集計は生データが
+        残っていないため作り直さずにそのまま残す
+
+        Args:
+            user: Userインスタンス
+            since: この日（日本時間）以降だけ作り直す。省略時は保持期間の境界
+
+        Returns:
+            tuple: (日別の行数, 時間別の行数)
+        """
+        aggregates = {
+            "count": models.Count("id"),
+            "body_sum": Sum("body"),
+            "body_min": Min("body"),
+            "body_max": Max("body"),
+            "heart_rate_sum": Sum("heart_rate"),
+            "heart_rate_min": Min("heart_rate"),
+            "heart_rate_max": Max("heart_rate"),
+        }
+        if since is None:
+            since = HealthRetentionService.rollup_floor()
+
+        base = HealthData.objects.filter(user=user).order_by()
+        daily_rollups = HealthDailyRollup.objects.filter(user=user)
+        hourly_rollups = HealthHourlyRollup.objects.filter(user=user)
+        histograms = HealthHeartRateHistogram.objects.filter(user=user)
+        if since is not None:
+            base = base.filter(local_date__gte=since)
+            daily_rollups = daily_rollups.filter(date__gte=since)
+            hourly_rollups = hourly_rollups.filter(date__gte=since)
+            histograms = histograms.filter(date__gte=since)
+
+        with transaction.atomic():
+            # 作り直しの間に登録・削除が割り込まないよう、取り込みと同じユーザー単位のロックを取る
+            HealthCounterService.lock(user.pk)
+            daily_rollups.delete()
+            hourly_rollups.delete()
+            histograms.delete()
+
+            daily = []
+            for row in base.values("local_date").annotate(**aggregates):
+                day = row.pop("local_date")
+                daily.append(HealthDailyRollup(
+                    user=user,
+                    date=day,
+                    **dict(row, body_sum=float(row["body_sum"]))
+                ))
+            HealthDailyRollup.objects.bulk_create(daily, batch_size=BATCH_CHUNK_SIZE)
+
+            hourly = []
+            for row in base.annotate(hour=Floor(F("local_minute") / 60)) \
+                    .values("local_date", "hour").annotate(**aggregates):
+                day = row.pop("local_date")
+                hour = int(row.pop("hour"))
+                hourly.append(HealthHourlyRollup(
+                    user=user,
+                    date=day,
+                    hour=hour,
+                    **dict(row, body_sum=float(row["body_sum"]))
+                ))
+            HealthHourlyRollup.objects.bulk_create(hourly, batch_size=BATCH_CHUNK_SIZE)
+
+            # 日×心拍数ごとの件数を DB で数え、日ごとの度数の配列にする
+            per_day = {}
+            for day, heart_rate, total in base.values_list("local_date", "heart_rate") \
+                    .annotate(total=models.Count("id")).order_by("local_date"):
+                per_day.setdefault(day, []).append((heart_rate, total))
+            HealthHeartRateHistogram.objects.bulk_create([
+                HealthHeartRateHistogram(
+                    user=user, date=day, count=int(counts.sum()), counts=histogram.pack(counts)
+                )
+                for day, pairs in per_day.items()
+                for counts in [histogram.from_counts(pairs)]
+            ], batch_size=BATCH_CHUNK_SIZE)
+
+            # 集計を書き換えたため ETag とサマリーキャッシュを無効にする
+            HealthCounterService.touch(user.pk)
+
+        return len(daily), len(hourly)
+
+
+class HealthCounterService:
+    """
+    ユーザーごとの HealthData 件数カウンタとデータバージョンの更新・取得
+    データバージョンは HealthData / SleepData の書き込みのたびに進み、条件付きGETの ETag に使う
+    """
+
+    @staticmethod
+    def _initialize(user_id):
+        """
+        カウンタ行がない場合に実件数から作成（初回のみ COUNT を実行）
+
+        Returns:
+            bool: 作成した場合 True（同時に作成されていた場合は False）
+        """
+        count = HealthData.objects.filter(user_id=user_id).count()
+        try:
+            with transaction.atomic():
+                HealthDataCounter.objects.create(
+                    user_id=user_id,
+                    health_records=count,
+                    data_version=1,
+                    data_modified_at=timezone.now(),
+                )
+            return True
+        except IntegrityError:
+            # 同時に作成された場合はそちらを使う
+            return False
+
+    @staticmethod
+    def _bump(user_id, **changes):
+        """
+        データバージョンを1つ進め、進めた後の値を返す
+        （UPDATE で行をロックしたまま読むため、返す値はこの書き込みのバージョンに一致する）
+        """
+        with transaction.atomic(savepoint=False):
+            updated = HealthDataCounter.objects.filter(user_id=user_id).update(
+                data_version=F("data_version") + 1,
+                data_modified_at=timezone.now(),
+                **changes,
+            )
+            # 行がなければ実件数から作成（今回の増減も反映済み）
+            if not updated and not HealthCounterService._initialize(user_id):
+                HealthDataCounter.objects.filter(user_id=user_id).update(
+                    data_version=F("data_version") + 1,
+                    data_modified_at=timezone.now(),
+                    **changes,
+                )
+            return HealthDataCounter.objects.filter(user_id=user_id).values_list(
+                "data_version", flat=True
+            ).get()
+
+    @staticmethod
+    def lock(user_id):
+        """トランザクション内でユーザーのカウンタ行をロック（なければ作成してからロック）"""
+        if not HealthDataCounter.objects.select_for_update().filter(user_id=user_id).exists():
+            HealthCounterService._initialize(user_id)
+            HealthDataCounter.objects.select_for_update().filter(user_id=user_id).exists()
+
+    @staticmethod
+    def increment(user_id, amount=1):
+        """
+        件数を加算（削除時は負の値）し、データバージョンを進める
+
+        Args:
+            user_id: ユーザーID
+            amount: 増減数
+
+        Returns:
+            int: 進めた後のデータバージョン（サマリーキャッシュの差分更新に渡す）
+        """
+        return HealthCounterService._bump(user_id, health_records=F("health_records") + amount)
+
+    @staticmethod
+    def touch(user_id):
+        """
+        件数の変わらない書き込み（更新・睡眠データ）でデータバージョンだけを進める
+
+        Returns:
+            int: 進めた後のデータバージョン
+        """
+        return HealthCounterService._bump(user_id)
+
+    @staticmethod
+    def get_version(user_id):
+        """
+        データバージョンを取得（主キー1行の参照）
+
+        Returns:
+            tuple: (data_version, data_modified_at)。行がなければ (0, None)
+        """
+        version = HealthDataCounter.objects.filter(user_id=user_id).values_list(
+            "data_version", "data_modified_at"
+        ).first()
+        return version or (0, None)
+
+    @staticmethod
+    def get_count(user_id):
+        """件数を取得（主キー1行の参照）"""
+        return HealthCounterService.get_count_and_version(user_id)[0]
+
+    @staticmethod
+    def get_count_and_version(user_id):
+        """
+        件数とデータバージョンを同じ行から取得（行がなければ実件数から作成）
+
+        Returns:
+            tuple: (件数, データバージョン)
+        """
+        state = HealthDataCounter.objects.filter(user_id=user_id).values_list(
+            "health_records", "data_version"
+        ).first()
+        if state is None:
+            HealthCounterService._initialize(user_id)
+            state = HealthDataCounter.objects.filter(user_id=user_id).values_list(
+                "health_records", "data_version"
+            ).get()
+        return state
+
+    @staticmethod
+    def reconcile(user_id):
+        """
+        カウンタを実件数に合わせる
+
+        Returns:
+            tuple: (修正前の値 or None, 実件数)
+        """
+        with transaction.atomic():
+            counter = HealthDataCounter.objects.select_for_update().filter(user_id=user_id).first()
+            actual = HealthData.objects.filter(user_id=user_id).count()
+
+            if counter is None:
+                HealthDataCounter.objects.create(user_id=user_id, health_records=actual)
+                return None, actual
+
+            previous = counter.health_records
+            if previous != actual:
+                # 件数はサマリーに含まれるため、データバージョンも進めて ETag とキャッシュを無効にする
+                counter.health_records = actual
+                counter.data_version = F("data_version") + 1
+                counter.data_modified_at = timezone.now()
+                counter.save(update_fields=["health_records", "data_version", "data_modified_at", "updated_at"])
+            return previous, actual
+
+
+class HealthVitalsService:
+    """
+    ユーザーごとの心拍数・体温の基準値の更新と異常値の検出
+    登録された行だけを反映する（更新・削除は反映しないため、必要なら rebuild で作り直す）
+    """
+
+    METRICS = ("heart_rate", "body")
+
+    @staticmethod
+    def _lock(user_id):
+        """基準値の行をロックして取得（なければ作成）"""
+        stats = HealthVitalStats.objects.select_for_update().filter(user_id=user_id).first()
+        if stats is None:
+            try:
+                with transaction.atomic():
+                    stats = HealthVitalStats.objects.create(user_id=user_id)
+            except IntegrityError:
+                stats = HealthVitalStats.objects.select_for_update().get(user_id=user_id)
+        return stats
+
+    @staticmethod
+    def _observe_value(stats, metric, value):
+        """
+        1つの値を判定してから基準値に反映（stats.count は反映前の件数）
+
+        Returns:
+            tuple | None: 外れ値なら (平均, 標準偏差, zスコア)
+        """
+        n = stats.count
+        mean = getattr(stats, f"{metric}_mean")
+        m2 = getattr(stats, f"{metric}_m2")
+        ewma = getattr(stats, f"{metric}_ewma")
+
+        outlier = None
+        if n >= VITALS_MIN_SAMPLES:
+            std = max(math.sqrt(m2 / (n - 1)), VITALS_MIN_STD[metric])
+            z_score = (value - mean) / std
+            if abs(z_score) >= VITALS_ZSCORE_THRESHOLD:
+                outlier = (mean, std, z_score)
+
+        delta = value - mean
+        mean += delta / (n + 1)
+        m2 += delta * (value - mean)
+        ewma = value if ewma is None else ewma + VITALS_EWMA_ALPHA * (value - ewma)
+
+        setattr(stats, f"{metric}_mean", mean)
+        setattr(stats, f"{metric}_m2", m2)
+        setattr(stats, f"{metric}_ewma", ewma)
+        return outlier
+
+    @staticmethod
+    def observe(user_id, rows):
+        """
+        登録された行を測定日時順に基準値へ反映し、外れ値を HealthAnomaly に記録
+        （1件あたり O(1)。基準値の行はトランザクション中ロックする）
+
+        Args:
+            user_id: ユーザーID
+            rows: [(measured_at, body, heart_rate, ...), ...]
+
+        Returns:
+            int: 記録した異常値の件数
+        """
+        if not rows:
+            return 0
+
+        with transaction.atomic():
+            stats = HealthVitalsService._lock(user_id)
+            anomalies = []
+
+            for measured_at, body, heart_rate, *_ in sorted(rows, key=lambda row: row[0]):
+                values = {"heart_rate": float(heart_rate), "body": float(body)}
+                for metric in HealthVitalsService.METRICS:
+                    outlier = HealthVitalsService._observe_value(stats, metric, values[metric])
+                    if outlier is not None:
+                        baseline, std, z_score = outlier
+                        anomalies.append(HealthAnomaly(
+                            user_id=user_id,
+                            measured_at=measured_at,
+                            metric=metric,
+                            value=values[metric],
+                            baseline=baseline,
+                            std=std,
+                            z_score=z_score,
+                        ))
+
+                stats.count += 1
+                if stats.last_measured_at is None or measured_at > stats.last_measured_at:
+                    stats.last_measured_at = measured_at
+
+            stats.save()
+            HealthAnomaly.objects.bulk_create(anomalies)
+
+        return len(anomalies)
+
+    @staticmethod
+    def get_baseline(user):
+        """
+        基準値を取得（1行の読み込みのみ）
+
+        Returns:
+            dict: HealthBaselineSerializer の各項目（データがなければ count=0、他は None）
+        """
+        stats = HealthVitalStats.objects.filter(user=user).first()
+        if stats is None or not stats.count:
+            return {
+                "count": 0,
+                "heart_rate_mean": None,
+                "heart_rate_std": None,
+                "heart_rate_ewma": None,
+                "body_mean": None,
+                "body_std": None,
+                "body_ewma": None,
+                "last_measured_at": None,
+            }
+
+        heart_rate_std = stats.heart_rate_std
+        body_std = stats.body_std
+        return {
+            "count": stats.count,
+            "heart_rate_mean": round(stats.heart_rate_mean, 1),
+            "heart_rate_std": round(heart_rate_std, 2) if heart_rate_std is not None else None,
+            "heart_rate_ewma": round(stats.heart_rate_ewma, 1),
+            "body_mean": round(stats.body_mean, 2),
+            "body_std": round(body_std, 3) if body_std is not None else None,
+            "body_ewma": round(stats.body_ewma, 2),
+            "last_measured_at": stats.last_measured_at,
+        }
+
+    @staticmethod
+    def rebuild(user_id, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        基準値と異常値を全履歴から作り直す（測定日時順に再生する）
+
+        Returns:
+            tuple: (反映したサンプル数, 記録した異常値の件数)
+
+        削除から再生の完了までユーザー単位のロックを保持する（その間の取り込みは待たされる）
+        """
+        samples = 0
+        anomalies = 0
+        cursor = None
+        with transaction.atomic():
+            HealthCounterService.lock(user_id)
+            HealthVitalStats.objects.filter(user_id=user_id).delete()
+            HealthAnomaly.objects.filter(user_id=user_id).delete()
+
+            while True:
+                queryset = HealthData.objects.filter(user_id=user_id)
+                if cursor is not None:
+                    queryset = queryset.filter(
+                        Q(measured_at__gt=cursor[0]) | Q(measured_at=cursor[0], id__gt=cursor[1])
+                    )
+                rows = list(
+                    queryset.order_by("measured_at", "id")
+                    .values_list("measured_at", "body", "heart_rate", "id")[:chunk_size]
+                )
+                if not rows:
+                    break
+
+                anomalies += HealthVitalsService.observe(user_id, rows)
+                samples += len(rows)
+                cursor = (rows[-1][0], rows[-1][3])
+
+            # 異常値を書き換えたため ETag を無効にする
+            HealthCounterService.touch(user_id)
+
+        return samples, anomalies
+
+
+class HealthPercentileService:
+    """
+    心拍数の日別ヒストグラムを足し合わせてパーセンタイルを求める
+    期間が長くても読み込むのは日数分の固定長バイナリだけ
+    """
+
+    PERCENTILES = (5, 25, 50, 75, 95)
+
+    @staticmethod
+    def _stats(counts):
+        values = histogram.percentiles(counts, HealthPercentileService.PERCENTILES)
+        mean = histogram.mean(counts)
+        nonzero = np.flatnonzero(counts)
+        return {
+            "count": int(counts.sum()),
+            "mean": round(mean, 1) if mean is not None else None,
+            "min": int(nonzero[0]) + histogram.HR_MIN if len(nonzero) else None,
+            "max": int(nonzero[-1]) + histogram.HR_MIN if len(nonzero) else None,
+            "percentiles": {
+                f"p{q}": value for q, value in zip(HealthPercentileService.PERCENTILES, values)
+            },
+        }
+
+    @staticmethod
+    def get_percentiles(user, granularity="week", offset=0):
+        """
+        期間全体と日ごとの心拍数のパーセンタイルを取得
+
+        Args:
+            user: Userインスタンス
+            granularity: 'day' | 'week' | 'month' | 'year'
+            offset: 何期間前か（0=今日・今週・今月・今年）
+
+        Returns:
+            dict: {'start', 'end', 'period_label', 'count', 'mean', 'min', 'max',
+                   'percentiles': {'p5', 'p25', 'p50', 'p75', 'p95'},
+                   'daily': [{'date', 'count', 'p50', 'p95'}, ...]}
+        """
+        today = timezone.now().astimezone(JST).date()
+        start, end = HealthWindowService.window_range(granularity, today, offset)
+
+        total = histogram.empty()
+        daily = []
+        for day, blob in HealthHeartRateHistogram.objects.filter(
+            user=user, date__range=(start, end)
+        ).order_by("date").values_list("date", "counts"):
+            counts = histogram.unpack(blob)
+            total += counts
+            p50, p95 = histogram.percentiles(counts, (50, 95))
+            daily.append({"date": day, "count": int(counts.sum()), "p50": p50, "p95": p95})
+
+        return {
+            "start": start,
+            "end": end,
+            "period_label": HealthWindowService._period_label(granularity, start, end),
+            **HealthPercentileService._stats(total),
+            "daily": daily,
+        }
+
+
+class HealthSummaryService:
+    """
+    ヘルスデータサマリーのユーザー別キャッシュ
+    書き込み時にシグナルから差分を反映するため、読み込みは通常DBにアクセスしない
+    （差分で追えない変更はエントリを破棄し、次回の読み込みで作り直す）
+
+    エントリには作成・更新時点のデータバージョンを持たせ、読み込み時に現在の
+    バージョンと一致するものだけを使う。差分は「1つ前のバージョンのエントリ」にだけ
+    適用するため、キャッシュがプロセスごと（LocMem）でも、他のプロセスやコマンドでの
+    書き込み後に古いサマリーを返すことはない（そのプロセスのエントリは作り直される）。
+    """
+
+    WINDOW_DAYS = 7
+
+    @staticmethod
+    def _cache():
+        return caches[settings.HEALTH_SUMMARY_CACHE]
+
+    @staticmethod
+    def _key(user_id):
+        return f"health_summary:{user_id}"
+
+    @staticmethod
+    def _window_start():
+        today_jst = timezone.now().astimezone(JST).date()
+        return today_jst - timedelta(days=HealthSummaryService.WINDOW_DAYS)
+
+    @staticmethod
+    def get_summary(user, version=None):
+        """
+        サマリーを取得（キャッシュがない・古い場合は作成して保存）
+
+        Args:
+            user: Userインスタンス
+            version: 現在のデータバージョン（条件付きGETで取得済みなら渡す。省略時は読み込む）
+
+        Returns:
+            dict: HealthSummarySerializer の各項目
+        """
+        cache = HealthSummaryService._cache()
+        key = HealthSummaryService._key(user.pk)
+
+        if version is None:
+            version, _ = HealthCounterService.get_version(user.pk)
+
+        entry = cache.get(key)
+        if entry is None or entry.get("version") != version:
+            entry = HealthSummaryService._build(user)
+            cache.set(key, entry, settings.HEALTH_SUMMARY_CACHE_TIMEOUT)
+
+        return HealthSummaryService._render(entry)
+
+    @staticmethod
+    def _build(user):
+        """
+        DBからキャッシュエントリを作成
+        データバージョンと集計を同じトランザクション（一貫した読み取り）で読む
+        """
+        with transaction.atomic():
+            total_records, version = HealthCounterService.get_count_and_version(user.pk)
+            entry = HealthSummaryService._read(user)
+
+        entry["version"] = version
+        entry["total_records"] = total_records
+        return entry
+
+    @staticmethod
+    def _read(user):
+        window_start = HealthSummaryService._window_start()
+
+        latest_health = HealthData.objects.filter(user=user).order_by(
+            "-measured_at"
+        ).values_list("measured_at", "body", "heart_rate").first()
+        latest_sleep = SleepData.objects.filter(user=user).order_by(
+            "-date"
+        ).values_list("date", "sleep_hours").first()
+
+        health_days = {
+            row["date"]: [row["count"], row["body_sum"], row["heart_rate_sum"]]
+            for row in HealthDailyRollup.objects.filter(
+                user=user, date__gte=window_start
+            ).values("date", "count", "body_sum", "heart_rate_sum")
+        }
+        sleep_days = {
+            day: float(hours)
+            for day, hours in SleepData.objects.filter(
+                user=user, date__gte=window_start
+            ).values_list("date", "sleep_hours")
+        }
+
+        return {
+            "latest_health": (
+                (latest_health[0], float(latest_health[1]), int(latest_health[2]))
+                if latest_health else None
+            ),
+            "latest_sleep": (latest_sleep[0], float(latest_sleep[1])) if latest_sleep else None,
+            "health_days": health_days,
+            "sleep_days": sleep_days,
+        }
+
+    @staticmethod
+    def _render(entry):
+        """キャッシュエントリからサマリーを計算"""
+        window_start = HealthSummaryService._window_start()
+
+        count = body_sum = hr_sum = 0
+        for day, (day_count, day_body_sum, day_hr_sum) in entry["health_days"].items():
+            if day >= window_start:
+                count += day_count
+                body_sum += day_body_sum
+                hr_sum += day_hr_sum
+
+        sleep_hours = [hours for day, hours in entry["sleep_days"].items() if day >= window_start]
+        avg_sleep = sum(sleep_hours) / len(sleep_hours) if sleep_hours else None
+
+        latest_health = entry["latest_health"]
+        latest_sleep = entry["latest_sleep"]
+
+        return {
+            "latest_body_temp": latest_health[1] if latest_health else None,
+            "latest_heart_rate": latest_health[2] if latest_health else None,
+            "latest_sleep_hours": latest_sleep[1] if latest_sleep else None,
+            "avg_body_temp_week": round(body_sum / count, 1) if count else None,
+            "avg_heart_rate_week": round(hr_sum / count) if count else None,
+            "avg_sleep_hours_week": round(avg_sleep, 1) if avg_sleep else None,
+            "total_records": entry["total_records"],
+        }
+
+    @staticmethod
+    def _update(user_id, version, apply):
+        """
+        コミット後にキャッシュエントリへ差分を反映
+
+        Args:
+            version: この書き込みで進めたデータバージョン（HealthCounterService.increment / touch の戻り値）
+            apply: apply(entry) が False を返した場合はエントリを破棄する
+
+        エントリが version - 1 のものでなければ（他のプロセスでの書き込みを反映していない）
+        差分を当てずに破棄する。
+        """
+        def run():
+            cache = HealthSummaryService._cache()
+            key = HealthSummaryService._key(user_id)
+            entry = cache.get(key)
+            if entry is None:
+                return
+            if entry.get("version") != version - 1 or apply(entry) is False:
+                cache.delete(key)
+            else:
+                entry["version"] = version
+                cache.set(key, entry, settings.HEALTH_SUMMARY_CACHE_TIMEOUT)
+
+        transaction.on_commit(run)
+
+    @staticmethod
+    def _add_health_rows(entry, rows):
+        window_start = HealthSummaryService._window_start()
+        for measured_at, body, heart_rate, *_ in rows:
+            entry["total_records"] += 1
+            latest = entry["latest_health"]
+            if latest is None or measured_at >= latest[0]:
+                entry["latest_health"] = (measured_at, float(body), int(heart_rate))
+
+            day, _ = HealthRollupService.local_bucket(measured_at)
+            if day >= window_start:
+                stats = entry["health_days"].setdefault(day, [0, 0.0, 0])
+                stats[0] += 1
+                stats[1] += float(body)
+                stats[2] += int(heart_rate)
+
+    @staticmethod
+    def _remove_health_rows(entry, rows):
+        window_start = HealthSummaryService._window_start()
+        for measured_at, body, heart_rate, *_ in rows:
+            latest = entry["latest_health"]
+            if latest is not None and measured_at >= latest[0]:
+                # 最新値が消えた場合は直前の値が分からないため作り直す
+                return False
+
+            entry["total_records"] -= 1
+            day, _ = HealthRollupService.local_bucket(measured_at)
+            stats = entry["health_days"].get(day)
+            if day >= window_start and stats:
+                stats[0] -= 1
+                stats[1] -= float(body)
+                stats[2] -= int(heart_rate)
+        return True
+
+    @staticmethod
+    def health_added(user_id, version, rows):
+        """身体データの登録を反映 rows: [(measured_at, body, heart_rate), ...]"""
+        rows = list(rows)
+        HealthSummaryService._update(
+            user_id, version,
+            lambda entry: HealthSummaryService._add_health_rows(entry, rows)
+        )
+
+    @staticmethod
+    def health_changed(user_id, version, old_row, new_row):
+        """身体データの更新を反映（旧行を取り除いて新行を加える）"""
+        def apply(entry):
+            if HealthSummaryService._remove_health_rows(entry, [old_row]) is False:
+                return False
+            HealthSummaryService._add_health_rows(entry, [new_row])
+
+        HealthSummaryService._update(user_id, version, apply)
+
+    @staticmethod
+    def health_removed(user_id, version, rows):
+        """身体データの削除を反映"""
+        rows = list(rows)
+        HealthSummaryService._update(
+            user_id, version,
+            lambda entry: HealthSummaryService._remove_health_rows(entry, rows)
+        )
+
+    @staticmethod
+    def records_expired(user_id, version, count, bound):
+        """保持期間を過ぎた生データの削除を反映（bound より前の count 件が消えた）"""
+        def apply(entry):
+            latest = entry["latest_health"]
+            if latest is not None and latest[0] < bound:
+                return False
+            entry["total_records"] -= count
+
+        HealthSummaryService._update(user_id, version, apply)
+
+    @staticmethod
+    def sleep_saved(user_id, version, sleeps, previous_date=None):
+        """
+        睡眠データの登録・更新を反映
+
+        Args:
+            sleeps: [(date, sleep_hours), ...]（1回の書き込みで保存した夜）
+            previous_date: 1件の更新で日付が変わった場合の旧日付
+        """
+        sleeps = list(sleeps)
+
+        def apply(entry):
+            if previous_date is not None and previous_date not in [date for date, _ in sleeps]:
+                if HealthSummaryService._remove_sleep(entry, previous_date) is False:
+                    return False
+
+            for date, sleep_hours in sleeps:
+                latest = entry["latest_sleep"]
+                if latest is None or date >= latest[0]:
+                    entry["latest_sleep"] = (date, float(sleep_hours))
+                if date >= HealthSummaryService._window_start():
+                    entry["sleep_days"][date] = float(sleep_hours)
+
+        HealthSummaryService._update(user_id, version, apply)
+
+    @staticmethod
+    def _remove_sleep(entry, date):
+        latest = entry["latest_sleep"]
+        if latest is not None and date >= latest[0]:
+            return False
+        entry["sleep_days"].pop(date, None)
+        return True
+
+    @staticmethod
+    def sleep_removed(user_id, version, date):
+        """睡眠データの削除を反映"""
+        HealthSummaryService._update(
+            user_id, version,
+            lambda entry: HealthSummaryService._remove_sleep(entry, date)
+        )
+
+
+class HealthRetentionService:
+    """
+    生データの保持期間とパーティションの管理
+    期限切れの生データは削除（設定により healthdata_archive へ退避）し、
+    日別・時間別の集計テーブルにだけ残す。削除はシグナルを通さないため
+    件数カウンタとサマリーキャッシュはここで直接更新する
+    """
+
+    @staticmethod
+    def cutoff(days=None):
+        """
+        保持期間の境界（日本時間の0時、aware）。これより前の生データが期限切れ
+
+        Returns:
+            datetime | None: 保持期間が無期限（0日）の場合は None
+        """
+        days = settings.HEALTH_RAW_RETENTION_DAYS if days is None else days
+        if not days:
+            return None
+        today_jst = timezone.now().astimezone(JST).date()
+        return datetime.combine(today_jst - timedelta(days=days), time.min, tzinfo=JST)
+
+    @staticmethod
+    def rollup_floor():
+        """生データから作り直してよい集計の最初の日（これより前は集計テーブルが正）"""
+        cutoff = HealthRetentionService.cutoff()
+        return cutoff.date() if cutoff else None
+
+    @staticmethod
+    def enable_partitioning(months_ahead=None):
+        """
+        healthdata を月別パーティションに変換（MySQLのみ・1回だけ）
+
+        Returns:
+            list[tuple]: 作成したパーティション [(year, month), ...]
+        """
+        if not partitioning.is_supported(connection):
+            raise ValueError("パーティション化は MySQL でのみ利用できます")
+        if partitioning.is_partitioned(connection):
+            raise ValueError("healthdata は既にパーティション化されています")
+
+        months_ahead = settings.HEALTH_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+        oldest = HealthData.objects.order_by("measured_at").values_list("measured_at", flat=True).first()
+        first = (oldest or timezone.now()).astimezone(JST)
+        now_jst = timezone.now().astimezone(JST)
+        last = partitioning.add_months(now_jst.year, now_jst.month, months_ahead)
+
+        partitioning.enable(connection, (first.year, first.month), last)
+        return partitioning.list_partitions(connection)
+
+    @staticmethod
+    def ensure_partitions(months_ahead=None, dry_run=False):
+        """
+        今月から months_ahead か月先までのパーティションを作成
+
+        Returns:
+            list[tuple]: 作成した（dry_run では作成する）パーティション [(year, month), ...]
+        """
+        existing = partitioning.list_partitions(connection)
+        if not existing:
+            return []
+
+        months_ahead = settings.HEALTH_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+        now_jst = timezone.now().astimezone(JST)
+        target = partitioning.add_months(now_jst.year, now_jst.month, months_ahead)
+
+        months = []
+        month = partitioning.add_months(*existing[-1], 1)
+        while month <= target:
+            months.append(month)
+            month = partitioning.add_months(*month, 1)
+
+        if not dry_run:
+            partitioning.add_partitions(connection, months)
+        return months
+
+    @staticmethod
+    def expire(days=None, archive=None, dry_run=False, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        保持期間を過ぎた生データを削除する
+        パーティション化されていれば月全体が期限切れのパーティションを DROP し、
+        そうでなければ chunk_size 件ずつ DELETE する
+
+        Args:
+            days: 保持日数（省略時は HEALTH_RAW_RETENTION_DAYS）
+            archive: healthdata_archive へ退避するか（省略時は HEALTH_RETENTION_ARCHIVE）
+            dry_run: 削除せず対象件数だけ数える
+
+        Returns:
+            dict: {'cutoff', 'rows', 'users', 'partitions'}
+        """
+        cutoff = HealthRetentionService.cutoff(days)
+        archive = settings.HEALTH_RETENTION_ARCHIVE if archive is None else archive
+        result = {"cutoff": cutoff, "rows": 0, "users": 0, "partitions": []}
+        if cutoff is None:
+            return result
+
+        partitions = partitioning.list_partitions(connection)
+        if partitions:
+            expired = [
+                month for month in partitions
+                if partitioning.month_start(*partitioning.add_months(*month, 1)) <= cutoff
+            ]
+            result["partitions"] = [partitioning.partition_name(*month) for month in expired]
+            if not expired:
+                return result
+
+            bound = partitioning.month_start(*partitioning.add_months(*expired[-1], 1))
+            counts = dict(
+                HealthData.objects.filter(measured_at__lt=bound).order_by()
+                .values_list("user_id").annotate(total=Count("id"))
+            )
+            result["rows"] = sum(counts.values())
+            result["users"] = len(counts)
+            if dry_run:
+                return result
+
+            if archive:
+                HealthRetentionService._archive_before(bound, chunk_size)
+            partitioning.drop_partitions(connection, expired)
+
+            # DDL はトランザクション外で確定するため、ここで失敗した場合は
+            # reconcile_health_counters で件数を照合する
+            for user_id, total in counts.items():
+                version = HealthCounterService.increment(user_id, -total)
+                HealthSummaryService.records_expired(user_id, version, total, bound)
+            return result
+
+        queryset = HealthData.objects.filter(measured_at__lt=cutoff)
+        if dry_run:
+            counts = queryset.order_by().values("user_id").distinct().count()
+            result["rows"] = queryset.count()
+            result["users"] = counts
+            return result
+
+        users = set()
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    queryset.order_by("measured_at", "id").values(
+                        "id", "user_id", "measured_at", "body", "heart_rate", "device_id", "created_at"
+                    )[:chunk_size]
+                )
+                if not rows:
+                    break
+
+                if archive:
+                    HealthDataArchive.objects.bulk_create(
+                        [HealthDataArchive(**row) for row in rows], ignore_conflicts=True
+                    )
+                HealthRetentionService._raw_delete([row["id"] for row in rows])
+
+                counts = {}
+                for row in rows:
+                    counts[row["user_id"]] = counts.get(row["user_id"], 0) + 1
+                for user_id, total in counts.items():
+                    version = HealthCounterService.increment(user_id, -total)
+                    HealthSummaryService.records_expired(user_id, version, total, cutoff)
+
+            users.update(counts)
+            result["rows"] += len(rows)
+
+        result["users"] = len(users)
+        return result
+
+    @staticmethod
+    def _archive_before(bound, chunk_size):
+        """bound より前の生データを healthdata_archive へコピー（再実行しても重複しない）"""
+        last_id = 0
+        while True:
+            rows = list(
+                HealthData.objects.filter(measured_at__lt=bound, id__gt=last_id)
+                .order_by("id").values(
+                    "id", "user_id", "measured_at", "body", "heart_rate", "device_id", "created_at"
+                )[:chunk_size]
+            )
+            if not rows:
+                return
+            HealthDataArchive.objects.bulk_create(
+                [HealthDataArchive(**row) for row in rows], ignore_conflicts=True
+            )
+            last_id = rows[-1]["id"]
+
+    @staticmethod
+    def _raw_delete(ids):
+        """シグナルを通さずに削除（post_delete が集計を生データから作り直さないように）"""
+        table = connection.ops.quote_name(HealthData._meta.db_table)
+        placeholders = ", ".join(["%s"] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
 
 
 class SleepDataService:
@@ -159,6 +1911,7 @@ class SleepDataService:
             defaults={
                 'sleep_hours': sleep_hours,
                 'sleep_quality': sleep_quality,
+                'detected': False,
             }
         )
         
@@ -237,4 +1990,150 @@ class SleepDataService:
             "average_sleep_hours": round(avg_sleep, 1) if avg_sleep else None,
             "total_days": qs.count(),
             "quality_distribution": quality_dist,
-        }
\ No newline at end of file
+        }
+
+
+class SleepDetectionService:
+    """
+    保存済みの分単位データ（心拍数・動き）から夜ごとの睡眠をサーバー側で判定
+    複数ユーザー分をまとめて読み込み、NumPy で一括して睡眠区間を切り出す
+    """
+
+    @staticmethod
+    def night_range(date):
+        """起床日 date の夜の範囲 [前日12時, 当日12時)（日本時間、aware）"""
+        end = datetime.combine(date, time(SLEEP_DAY_BOUNDARY_HOUR), tzinfo=JST)
+        return end - timedelta(days=1), end
+
+    @staticmethod
+    def users_with_motion(start_date, end_date):
+        """期間内に動きのデータがあるユーザーID（昇順）"""
+        start, _ = SleepDetectionService.night_range(start_date)
+        _, end = SleepDetectionService.night_range(end_date)
+
+        return list(
+            HealthData.objects.filter(
+                measured_at__gte=start, measured_at__lt=end, motion__isnull=False
+            ).order_by("user_id").values_list("user_id", flat=True).distinct()
+        )
+
+    @staticmethod
+    def detect(user_ids, start_date, end_date, dry_run=False):
+        """
+        user_ids の start_date〜end_date（起床日）の睡眠を判定し、
+        SleepData（既存は上書き）と SleepPeriod を保存する
+        以前の判定で作成した SleepData のうち、今回は睡眠と判定されなかった夜の分は削除する
+        （利用者が登録・修正した SleepData は削除しない）
+
+        Args:
+            user_ids: 対象のユーザーIDのリスト（1バッチ分）
+            start_date, end_date: 起床日の範囲（両端を含む）
+            dry_run: 保存せずに判定結果だけ返す
+
+        Returns:
+            dict: {'samples': 読み込んだ件数, 'nights': 判定した夜の数,
+                   'periods': 睡眠区間の数, 'removed': 削除する（した）夜の数,
+                   'results': [(user_id, date, sleep_hours), ...]}
+        """
+        start, _ = SleepDetectionService.night_range(start_date)
+        _, end = SleepDetectionService.night_range(end_date)
+        index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+        users, times, heart_rates, motions = [], [], [], []
+        for user_id, measured_at, heart_rate, motion in HealthData.objects.filter(
+            user_id__in=user_ids, measured_at__gte=start, measured_at__lt=end, motion__isnull=False
+        ).order_by("user_id", "measured_at").values_list(
+            "user_id", "measured_at", "heart_rate", "motion"
+        ).iterator(chunk_size=SERIES_CHUNK_SIZE):
+            users.append(index[user_id])
+            times.append(int(measured_at.timestamp()))
+            heart_rates.append(heart_rate)
+            motions.append(float(motion))
+
+        nights, periods = segment_sleep(
+            users, times, heart_rates, motions,
+            boundary_hour=SLEEP_DAY_BOUNDARY_HOUR,
+            hr_min=SLEEP_HEART_RATE_MIN,
+            hr_max=SLEEP_HEART_RATE_MAX,
+            motion_max=SLEEP_MOTION_MAX,
+            max_gap=SLEEP_MAX_GAP_SECONDS,
+            min_period=SLEEP_MIN_PERIOD_MINUTES * 60,
+        )
+
+        epoch = datetime(1970, 1, 1).date()
+        results = {}
+        for user, night, samples, seconds in zip(
+            nights["user"].tolist(), nights["night"].tolist(),
+            nights["samples"].tolist(), nights["sleep_seconds"].tolist()
+        ):
+            if samples >= SLEEP_MIN_COVERAGE_MINUTES:
+                key = (user_ids[user], epoch + timedelta(days=night + 1))
+                results[key] = Decimal(seconds / 3600).quantize(Decimal("0.01"))
+
+        period_rows = []
+        for user, night, period_start, period_end in zip(
+            periods["user"].tolist(), periods["night"].tolist(),
+            periods["start"].tolist(), periods["end"].tolist()
+        ):
+            key = (user_ids[user], epoch + timedelta(days=night + 1))
+            if key in results:
+                period_rows.append(SleepPeriod(
+                    user_id=key[0],
+                    date=key[1],
+                    start=datetime.fromtimestamp(period_start, tz=JST),
+                    end=datetime.fromtimestamp(period_end, tz=JST),
+                    minutes=(period_end - period_start) // 60,
+                ))
+
+        # 以前の判定結果のうち、今回は睡眠と判定されなかった夜
+        stale = [
+            (pk, user_id, day)
+            for pk, user_id, day in SleepData.objects.filter(
+                user_id__in=user_ids, date__gte=start_date, date__lte=end_date, detected=True
+            ).values_list("pk", "user_id", "date")
+            if (user_id, day) not in results
+        ]
+
+        if not dry_run and (results or stale):
+            # MySQL は競合対象の指定に対応しない（一意制約 (user, date) で判定される）
+            unique_fields = ["user", "date"] if connection.features.supports_update_conflicts_with_target else None
+
+            with transaction.atomic():
+                SleepData.objects.bulk_create(
+                    [
+                        SleepData(
+                            user_id=user_id,
+                            date=day,
+                            sleep_hours=hours,
+                            sleep_quality="good" if hours >= SLEEP_GOOD_HOURS else "poor",
+                            detected=True,
+                        )
+                        for (user_id, day), hours in results.items()
+                    ],
+                    batch_size=BATCH_CHUNK_SIZE,
+                    update_conflicts=True,
+                    unique_fields=unique_fields,
+                    update_fields=["sleep_hours", "sleep_quality", "detected"],
+                )
+                # 判定中に利用者が修正した夜は残す（サマリーキャッシュは削除のシグナルで更新される）
+                SleepData.objects.filter(pk__in=[pk for pk, _, _ in stale], detected=True).delete()
+                SleepPeriod.objects.filter(
+                    user_id__in=user_ids, date__gte=start_date, date__lte=end_date
+                ).delete()
+                SleepPeriod.objects.bulk_create(period_rows, batch_size=BATCH_CHUNK_SIZE)
+
+                # bulk_create はシグナルを発火しないためバージョンとサマリーキャッシュを直接更新
+                nights_by_user = {}
+                for (user_id, day), hours in results.items():
+                    nights_by_user.setdefault(user_id, []).append((day, hours))
+                for user_id, nights in nights_by_user.items():
+                    version = HealthCounterService.touch(user_id)
+                    HealthSummaryService.sleep_saved(user_id, version, nights)
+
+        return {
+            "samples": len(times),
+            "nights": len(results),
+            "periods": len(period_rows),
+            "removed": len(stale),
+            "results": [(user_id, day, hours) for (user_id, day), hours in results.items()],
+        }
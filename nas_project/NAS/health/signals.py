@@ -0,0 +1,99 @@
+# health/signals.py
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from accounts.models import User
+from .models import HealthData, SleepData
+from .services import (
+    HealthRollupService,
+    HealthCounterService,
+    HealthSummaryService,
+    HealthVitalsService,
+)
+
+
+def _as_row(instance):
+    """HealthData を (measured_at, body, heart_rate) に変換（文字列・naive の日時も補正）"""
+    measured_at = HealthData._meta.get_field("measured_at").to_python(instance.measured_at)
+    if timezone.is_naive(measured_at):
+        measured_at = timezone.make_aware(measured_at, timezone.get_current_timezone())
+    return measured_at, instance.body, instance.heart_rate
+
+
+@receiver(pre_save, sender=HealthData)
+def remember_previous_health_row(sender, instance, **kwargs):
+    """
+    ユーザー単位のロックを取り、更新前の値を保持（旧バケットの再集計とサマリーの差分計算に使う）
+    一括登録と同じロックで、重複判定と集計の更新を直列化する（HealthData.save がトランザクションを張る）
+    """
+    HealthCounterService.lock(instance.user_id)
+    if instance.pk:
+        instance._previous_row = HealthData.objects.filter(
+            pk=instance.pk
+        ).values_list("measured_at", "body", "heart_rate").first()
+
+
+@receiver(post_save, sender=HealthData)
+def update_aggregates_on_save(sender, instance, created, **kwargs):
+    """登録時は集計に加算、更新時は影響するバケットを再集計"""
+    row = _as_row(instance)
+    previous = getattr(instance, "_previous_row", None)
+
+    if created or previous is None:
+        HealthRollupService.apply_samples(instance.user_id, [row])
+        version = HealthCounterService.increment(instance.user_id)
+        HealthSummaryService.health_added(instance.user_id, version, [row])
+        HealthVitalsService.observe(instance.user_id, [row])
+    else:
+        HealthRollupService.recompute_buckets(instance.user_id, [row[0], previous[0]])
+        version = HealthCounterService.touch(instance.user_id)
+        HealthSummaryService.health_changed(instance.user_id, version, previous, row)
+
+
+@receiver(pre_delete, sender=HealthData)
+def lock_before_delete(sender, instance, origin=None, **kwargs):
+    """削除も登録と同じユーザー単位のロックで直列化（削除はトランザクション内で実行される）"""
+    if isinstance(origin, User):
+        return
+    HealthCounterService.lock(instance.user_id)
+
+
+@receiver(post_delete, sender=HealthData)
+def update_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    """削除されたバケットを再集計し件数を減らす（ユーザー削除に伴うカスケード時は集計も消えるため不要）"""
+    if isinstance(origin, User):
+        return
+    row = _as_row(instance)
+    HealthRollupService.recompute_buckets(instance.user_id, [row[0]])
+    version = HealthCounterService.increment(instance.user_id, -1)
+    HealthSummaryService.health_removed(instance.user_id, version, [row])
+
+
+@receiver(pre_save, sender=SleepData)
+def remember_previous_sleep_date(sender, instance, **kwargs):
+    """更新前の日付を保持（日付が変更された場合に旧日付を取り除くため）"""
+    if instance.pk:
+        instance._previous_date = SleepData.objects.filter(
+            pk=instance.pk
+        ).values_list("date", flat=True).first()
+
+
+@receiver(post_save, sender=SleepData)
+def update_summary_on_sleep_save(sender, instance, **kwargs):
+    version = HealthCounterService.touch(instance.user_id)
+    date = SleepData._meta.get_field("date").to_python(instance.date)
+    HealthSummaryService.sleep_saved(
+        instance.user_id,
+        version,
+        [(date, instance.sleep_hours)],
+        previous_date=getattr(instance, "_previous_date", None),
+    )
+
+
+@receiver(post_delete, sender=SleepData)
+def update_summary_on_sleep_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User):
+        return
+    version = HealthCounterService.touch(instance.user_id)
+    HealthSummaryService.sleep_removed(instance.user_id, version, instance.date)
@@ -0,0 +1,102 @@
+# health/sleep_detection.py
+
+"""
+分単位の心拍数・動きからの睡眠区間検出（NumPy でベクトル化）
+
+複数ユーザー・複数夜分のサンプルを1本の配列として受け取り、ループを使わずに
+「夜」ごとの睡眠区間を切り出す。夜は日本時間の boundary_hour 時で区切り、
+区切りの翌日（起床日）をその夜の日付とする。
+
+判定条件はアプリの SensorDataManager.calculateSleep と同じで、
+心拍数が hr_min〜hr_max かつ動きが motion_max 未満の分を「睡眠中」とみなす。
+"""
+
+import numpy as np
+
+
+JST_OFFSET_SECONDS = 9 * 3600
+DAY_SECONDS = 86400
+SAMPLE_SECONDS = 60
+
+
+def night_index(t, boundary_hour):
+    """
+    epoch 秒を夜の通し番号に変換
+
+    Returns:
+        np.ndarray: 1970-01-01 からの日数。+1 日した日が起床日
+    """
+    return (t + JST_OFFSET_SECONDS - boundary_hour * 3600) // DAY_SECONDS
+
+
+def segment(user, t, heart_rate, motion, *, boundary_hour, hr_min, hr_max,
+            motion_max, max_gap, min_period):
+    """
+    睡眠区間を検出する
+
+    Args:
+        user: ユーザー番号 (int)。(user, t) の昇順に並んでいること
+        t: 測定日時の epoch 秒 (int64)
+        heart_rate: 心拍数
+        motion: 動きの大きさ
+        boundary_hour: 夜の区切りの時刻（日本時間）
+        hr_min, hr_max: 睡眠中とみなす心拍数の範囲
+        motion_max: 睡眠中とみなす動きの上限（未満）
+        max_gap: これより間隔が空いたサンプルは別の区間とする [秒]
+        min_period: これより短い区間は捨てる [秒]
+
+    Returns:
+        tuple: (nights, periods)
+            nights: {'user', 'night', 'samples', 'sleep_seconds'} サンプルのある夜ごとの配列
+            periods: {'user', 'night', 'start', 'end'} 区間ごとの配列（end は最後の分の終わり）
+    """
+    user = np.asarray(user, dtype=np.int64)
+    t = np.asarray(t, dtype=np.int64)
+    heart_rate = np.asarray(heart_rate, dtype=np.float64)
+    motion = np.asarray(motion, dtype=np.float64)
+
+    n = len(t)
+    if n == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return (
+            {"user": empty, "night": empty, "samples": empty, "sleep_seconds": empty},
+            {"user": empty, "night": empty, "start": empty, "end": empty},
+        )
+
+    night = night_index(t, boundary_hour)
+    asleep = (heart_rate >= hr_min) & (heart_rate <= hr_max) & (motion < motion_max)
+
+    # 夜（ユーザー×夜）の切れ目
+    new_group = np.empty(n, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = (user[1:] != user[:-1]) | (night[1:] != night[:-1])
+    group_id = np.cumsum(new_group) - 1
+    group_start = np.flatnonzero(new_group)
+
+    # 直前のサンプルと同じ睡眠区間につながるか
+    linked = ~new_group[1:] & (np.diff(t) <= max_gap) & asleep[1:] & asleep[:-1]
+    starts = np.flatnonzero(asleep & ~np.concatenate(([False], linked)))
+    ends = np.flatnonzero(asleep & ~np.concatenate((linked, [False])))
+
+    start_t = t[starts]
+    end_t = t[ends] + SAMPLE_SECONDS
+    keep = (end_t - start_t) >= min_period
+    starts, start_t, end_t = starts[keep], start_t[keep], end_t[keep]
+
+    sleep_seconds = np.bincount(
+        group_id[starts], weights=end_t - start_t, minlength=len(group_start)
+    ).astype(np.int64)
+
+    nights = {
+        "user": user[group_start],
+        "night": night[group_start],
+        "samples": np.diff(np.append(group_start, n)),
+        "sleep_seconds": sleep_seconds,
+    }
+    periods = {
+        "user": user[starts],
+        "night": night[starts],
+        "start": start_t,
+        "end": end_t,
+    }
+    return nights, periods
@@ -1,3 +1,572 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import OperationalError, connection
+from django.db.models import Count, Max, Min, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from . import partitioning, write_behind
+from .models import (
+    HealthDailyRollup,
+    HealthData,
+    HealthDataCounter,
+    HealthHeartRateHistogram,
+    HealthHourlyRollup,
+    SleepData,
+    SleepPeriod,
+)
+from .services import (
+    HealthCounterService,
+    HealthDataService,
+    HealthPercentileService,
+    HealthRetentionService,
+    HealthRollupService,
+    HealthSummaryService,
+    HealthWindowService,
+    JST,
+    SleepDataService,
+    SleepDetectionService,
+)
+
+
+def make_rows(end, count, step=timedelta(minutes=7), body="36.5", heart_rate=60):
+    """end から遡って count 件の (measured_at, body, heart_rate, motion) を作る"""
+    return [
+        (end - step * i, Decimal(body) + Decimal(i % 7) / 10, heart_rate + i % 40, None)
+        for i in range(count)
+    ]
+
+
+def rollup_snapshot(user):
+    """集計テーブルの内容（比較用）"""
+    fields = ["count", "body_sum", "body_min", "body_max", "heart_rate_sum", "heart_rate_min", "heart_rate_max"]
+
+    def rows(model, keys):
+        return {
+            tuple(row[key] for key in keys): {
+                name: round(row[name], 2) if name == "body_sum" else row[name] for name in fields
+            }
+            for row in model.objects.filter(user=user).values(*keys, *fields)
+        }
+
+    return (
+        rows(HealthDailyRollup, ["date"]),
+        rows(HealthHourlyRollup, ["date", "hour"]),
+        dict(HealthHeartRateHistogram.objects.filter(user=user).values_list("date", "count")),
+    )
+
+
+class HealthTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.HEALTH_SUMMARY_CACHE].clear()
+        self.user = User.objects.create_user(email="health@example.com", password="pw12345!x", gender="男性")
+        self.now = timezone.now().replace(second=0, microsecond=0)
+
+
+# ==========================================================
+# 登録・重複・集計の整合
+# ==========================================================
+class IngestTests(HealthTestCase):
+
+    def test_bulk_create_skips_duplicates(self):
+        rows = make_rows(self.now, 50)
+
+        self.assertEqual(HealthDataService.bulk_create_health_data(self.user, rows[:20], chunk_size=7), (20, 0))
+        self.assertEqual(HealthDataService.bulk_create_health_data(self.user, rows, chunk_size=7), (30, 20))
+        self.assertEqual(HealthData.objects.filter(user=self.user).count(), 50)
+        self.assertEqual(HealthCounterService.get_count(self.user.pk), 50)
+
+    def test_rows_inserted_outside_the_lock_are_not_counted(self):
+        rows = make_rows(self.now, 10)
+        # ロックを取らない経路で先に登録された行（bulk_create の一意制約違反）
+        HealthDataService._insert_rows(self.user, rows[3:5], None)
+
+        self.assertEqual(len(HealthDataService._insert_rows(self.user, rows, None)), 8)
+        self.assertEqual(HealthData.objects.filter(user=self.user).count(), 10)
+
+    def test_single_create_is_idempotent(self):
+        data = {"measured_at": self.now, "body": "36.6", "heart_rate": 70}
+
+        _, created = HealthDataService.create_health_data(self.user, data)
+        _, created_again = HealthDataService.create_health_data(self.user, data)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(HealthCounterService.get_count(self.user.pk), 1)
+
+    def test_rollups_and_counter_match_rebuild_after_mixed_writes(self):
+        HealthDataService.bulk_create_health_data(self.user, make_rows(self.now, 300), chunk_size=64)
+        HealthDataService.create_health_data(
+            self.user, {"measured_at": self.now + timedelta(minutes=3), "body": "38.2", "heart_rate": 140}
+        )
+        changed = HealthData.objects.filter(user=self.user).order_by("measured_at")[10]
+        changed.heart_rate = 180
+        changed.measured_at -= timedelta(days=3)
+        changed.save()
+        HealthData.objects.filter(user=self.user).order_by("measured_at")[50].delete()
+
+        incremental = rollup_snapshot(self.user)
+        HealthRollupService.rebuild_for_user(self.user)
+
+        self.assertEqual(incremental, rollup_snapshot(self.user))
+        self.assertEqual(HealthCounterService.reconcile(self.user.pk), (300, 300))
+
+    def test_rollups_and_counter_stay_consistent_after_deletes(self):
+        HealthDataService.bulk_create_health_data(self.user, make_rows(self.now, 200), chunk_size=64)
+        rows = HealthData.objects.filter(user=self.user)
+        # 1件ずつの削除と一括削除（日・時間ごとの最小・最大を持つ行を含む）
+        rows.order_by("-heart_rate").first().delete()
+        rows.order_by("body").first().delete()
+        deleted, _ = rows.filter(measured_at__lt=self.now - timedelta(hours=12)).delete()
+
+        incremental = rollup_snapshot(self.user)
+        HealthRollupService.rebuild_for_user(self.user)
+
+        self.assertEqual(incremental, rollup_snapshot(self.user))
+        remaining = 198 - deleted
+        self.assertEqual(HealthData.objects.filter(user=self.user).count(), remaining)
+        self.assertEqual(HealthCounterService.reconcile(self.user.pk), (remaining, remaining))
+
+    def test_reconcile_fixes_counter_and_bumps_version(self):
+        HealthDataService.bulk_create_health_data(self.user, make_rows(self.now, 5))
+        HealthDataCounter.objects.filter(user=self.user).update(health_records=1)
+        version, _ = HealthCounterService.get_version(self.user.pk)
+
+        self.assertEqual(HealthCounterService.reconcile(self.user.pk), (1, 5))
+        self.assertEqual(HealthCounterService.get_count(self.user.pk), 5)
+        self.assertEqual(HealthCounterService.get_version(self.user.pk)[0], version + 1)
+
+    def test_rebuild_bumps_version(self):
+        HealthDataService.bulk_create_health_data(self.user, make_rows(self.now, 5))
+        version, _ = HealthCounterService.get_version(self.user.pk)
+
+        HealthRollupService.rebuild_for_user(self.user)
+
+        self.assertEqual(HealthCounterService.get_version(self.user.pk)[0], version + 1)
+
+
+# ==========================================================
+# 直近 N 日の平均（先頭の端数の時間帯）
+# ==========================================================
+class AverageTests(HealthTestCase):
+
+    def test_average_window_matches_raw_rows(self):
+        HealthDataService.bulk_create_health_data(self.user, make_rows(self.now, 700, step=timedelta(minutes=5)))
+        since = timezone.now() - timedelta(days=1)
+
+        with mock.patch("health.services.timezone.now", return_value=since + timedelta(days=1)):
+            result = HealthDataService.get_average_data(self.user, days=1)
+
+        raw = HealthData.objects.filter(user=self.user, measured_at__gte=since).aggregate(
+            count=Count("id"), body_sum=Sum("body"), min_body=Min("body"), max_body=Max("body"),
+            hr_sum=Sum("heart_rate"), min_hr=Min("heart_rate"), max_hr=Max("heart_rate"),
+        )
+        self.assertEqual(result["data_count"], raw["count"])
+        self.assertEqual(result["average_body"], round(raw["body_sum"] / raw["count"], 1))
+        self.assertEqual(result["average_heart_rate"], round(raw["hr_sum"] / raw["count"]))
+        self.assertEqual((result["min_body"], result["max_body"]), (raw["min_body"], raw["max_body"]))
+        self.assertEqual((result["min_heart_rate"], result["max_heart_rate"]), (raw["min_hr"], raw["max_hr"]))
+
+    def test_no_data(self):
+        self.assertIsNone(HealthDataService.get_average_data(self.user, days=7))
+
+
+# ==========================================================
+# 体温の固定小数点（0.01℃単位の整数）での保存
+# ==========================================================
+class CentiDegreeTests(HealthTestCase):
+
+    def test_body_round_trips_as_degrees(self):
+        values = [Decimal("36.57"), 36.5, "37.05", 35.999]
+        for i, value in enumerate(values):
+            HealthDataService.create_health_data(
+                self.user, {"measured_at": self.now - timedelta(minutes=i), "body": value, "heart_rate": 60}
+            )
+
+        bodies = list(HealthData.objects.filter(user=self.user).order_by("-measured_at").values_list("body", flat=True))
+
+        self.assertEqual(bodies, [36.57, 36.5, 37.05, 36.0])
+        self.assertTrue(all(isinstance(body, float) for body in bodies))
+        # 比較は 0.01℃ 単位で行う（float の右辺を整数に切り上げない）
+        self.assertEqual(HealthData.objects.filter(user=self.user, body__gte=36.57).count(), 2)
+        self.assertEqual(HealthData.objects.filter(user=self.user, body__lt=36.5).count(), 1)
+        self.assertEqual(HealthData.objects.filter(user=self.user, body__range=(36.5, 36.57)).count(), 2)
+        self.assertEqual(HealthData.objects.filter(user=self.user, body=37.05).count(), 1)
+        self.assertEqual(
+            HealthData.objects.filter(user=self.user).aggregate(low=Min("body"), high=Max("body")),
+            {"low": 36.0, "high": 37.05},
+        )
+
+    def test_rollup_extremes_and_sum_are_in_degrees(self):
+        HealthDataService.bulk_create_health_data(self.user, [
+            (self.now, Decimal("36.41"), 60, None),
+            (self.now - timedelta(minutes=1), Decimal("37.29"), 60, None),
+        ])
+
+        rollup = HealthDailyRollup.objects.get(user=self.user)
+
+        self.assertEqual((rollup.body_min, rollup.body_max), (36.41, 37.29))
+        self.assertAlmostEqual(float(rollup.body_sum), 73.70, places=2)
+
+
+# ==========================================================
+# 複数期間のグラフデータ
+# ==========================================================
+class WindowTests(HealthTestCase):
+
+    def test_window_ranges(self):
+        today = date(2028, 3, 15)  # 水曜日
+
+        self.assertEqual(HealthWindowService.window_range("day", today, 1), (date(2028, 3, 14), date(2028, 3, 14)))
+        self.assertEqual(HealthWindowService.window_range("week", today, 0), (date(2028, 3, 12), date(2028, 3, 18)))
+        self.assertEqual(HealthWindowService.window_range("month", today, 1), (date(2028, 2, 1), date(2028, 2, 29)))
+        self.assertEqual(HealthWindowService.window_range("month", today, 3), (date(2027, 12, 1), date(2027, 12, 31)))
+        self.assertEqual(HealthWindowService.window_range("year", today, 1), (date(2027, 1, 1), date(2027, 12, 31)))
+
+    def test_windows_place_values_by_period(self):
+        yesterday = self.now.astimezone(JST).date() - timedelta(days=1)
+        ten = datetime(yesterday.year, yesterday.month, yesterday.day, 10, tzinfo=JST)
+        HealthDataService.bulk_create_health_data(self.user, [
+            (ten, Decimal("36.4"), 60, None),
+            (ten + timedelta(minutes=30), Decimal("36.6"), 70, None),
+        ])
+        SleepDataService.create_sleep_data(self.user, {"date": yesterday, "sleep_hours": 7.5})
+
+        today_window, yesterday_window = HealthWindowService.get_windows(self.user, "day", 2)
+
+        self.assertEqual((today_window["periods_ago"], yesterday_window["start"]), (0, yesterday))
+        self.assertEqual(set(today_window["heart_rate"]), {None})
+        self.assertEqual((yesterday_window["heart_rate"][10], yesterday_window["temperature"][10]), (65, 36.5))
+        self.assertEqual(sum(v is not None for v in yesterday_window["heart_rate"]), 1)
+        self.assertEqual(yesterday_window["sleep_hours"], [7.5])
+
+        years_ago = self.now.astimezone(JST).year - yesterday.year
+        (year_window,) = HealthWindowService.get_windows(self.user, "year", 1, offset=years_ago)
+        self.assertEqual(year_window["heart_rate"][yesterday.month - 1], 65)
+        self.assertEqual(year_window["sleep_hours"][yesterday.month - 1], 7.5)
+
+    def test_query_count_does_not_depend_on_periods(self):
+        with self.assertNumQueries(2):
+            windows = HealthWindowService.get_windows(self.user, "month", 12)
+        self.assertEqual([w["periods_ago"] for w in windows], list(range(12)))
+
+
+# ==========================================================
+# 心拍数のパーセンタイル（日別ヒストグラム）
+# ==========================================================
+class PercentileTests(HealthTestCase):
+
+    def test_percentiles_match_raw_data(self):
+        midnight = self.now.astimezone(JST).replace(hour=0, minute=0)
+        heart_rates = [40 + (i * 37) % 120 for i in range(500)] + [20, 260]
+        rows = [
+            (midnight + timedelta(minutes=i), Decimal("36.5"), heart_rate, None)
+            for i, heart_rate in enumerate(heart_rates)
+        ]
+        HealthDataService.bulk_create_health_data(self.user, rows, chunk_size=64)
+        HealthData.objects.filter(user=self.user, measured_at=midnight).delete()
+
+        result = HealthPercentileService.get_percentiles(self.user, "day")
+
+        values = np.clip(np.sort(heart_rates[1:]), 30, 250)
+        expected = {f"p{q}": int(values[max(int(np.ceil(q / 100 * len(values))), 1) - 1]) for q in (5, 25, 50, 75, 95)}
+        self.assertEqual(result["count"], len(values))
+        self.assertEqual(result["percentiles"], expected)
+        self.assertEqual((result["min"], result["max"]), (30, 250))
+        self.assertEqual([(d["date"], d["p50"]) for d in result["daily"]], [(midnight.date(), expected["p50"])])
+
+    def test_empty_period(self):
+        result = HealthPercentileService.get_percentiles(self.user, "week", offset=5)
+
+        self.assertEqual((result["count"], result["mean"], result["daily"]), (0, None, []))
+        self.assertEqual(set(result["percentiles"].values()), {None})
+
+
+# ==========================================================
+# サマリーキャッシュ（データバージョンでの照合）
+# ==========================================================
+class SummaryCacheTests(HealthTestCase):
+
+    def _entry(self):
+        return caches[settings.HEALTH_SUMMARY_CACHE].get(HealthSummaryService._key(self.user.pk))
+
+    def test_write_patches_entry_of_previous_version(self):
+        HealthSummaryService.get_summary(self.user)
+        measured_at = self.now - timedelta(minutes=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HealthDataService.create_health_data(self.user, {"measured_at": measured_at, "body": "37.1", "heart_rate": 77})
+
+        entry = self._entry()
+        self.assertEqual(entry["version"], HealthCounterService.get_version(self.user.pk)[0])
+        self.assertEqual(entry["total_records"], 1)
+        with self.assertNumQueries(1):
+            summary = HealthSummaryService.get_summary(self.user)
+        self.assertEqual(summary["total_records"], 1)
+
+    def test_entry_missing_a_version_is_dropped(self):
+        HealthSummaryService.get_summary(self.user)
+        # 他のプロセスでの書き込み（このプロセスのキャッシュには差分が届かない）
+        HealthDataService.bulk_create_health_data(self.user, make_rows(self.now, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HealthDataService.create_health_data(self.user, {"measured_at": self.now + timedelta(minutes=1), "body": "36.4", "heart_rate": 65})
+
+        self.assertIsNone(self._entry())
+        self.assertEqual(HealthSummaryService.get_summary(self.user)["total_records"], 4)
+
+    def test_stale_entry_is_rebuilt_on_read(self):
+        HealthSummaryService.get_summary(self.user)
+        HealthDataService.bulk_create_health_data(self.user, make_rows(self.now, 3))
+
+        self.assertEqual(HealthSummaryService.get_summary(self.user)["total_records"], 3)
+
+
+# ==========================================================
+# 生データの保持期間
+# ==========================================================
+class RetentionTests(HealthTestCase):
+
+    def test_expire_deletes_old_rows_and_keeps_rollups(self):
+        old_rows = make_rows(self.now - timedelta(days=20), 30)
+        HealthDataService.bulk_create_health_data(self.user, old_rows + make_rows(self.now, 10))
+        rollups = rollup_snapshot(self.user)
+        version, _ = HealthCounterService.get_version(self.user.pk)
+
+        self.assertEqual(HealthRetentionService.expire(days=10, dry_run=True)["rows"], 30)
+        result = HealthRetentionService.expire(days=10, archive=False, chunk_size=7)
+
+        self.assertEqual((result["rows"], result["users"]), (30, 1))
+        self.assertEqual(HealthData.objects.filter(user=self.user).count(), 10)
+        self.assertEqual(HealthCounterService.get_count(self.user.pk), 10)
+        self.assertGreater(HealthCounterService.get_version(self.user.pk)[0], version)
+        self.assertEqual(rollup_snapshot(self.user), rollups)
+
+    def test_rebuild_keeps_rollups_older_than_retention(self):
+        HealthDataService.bulk_create_health_data(
+            self.user, make_rows(self.now - timedelta(days=20), 30) + make_rows(self.now, 10)
+        )
+        rollups = rollup_snapshot(self.user)
+
+        with override_settings(HEALTH_RAW_RETENTION_DAYS=10):
+            HealthRetentionService.expire(archive=False)
+            HealthRollupService.rebuild_for_user(self.user)
+
+        self.assertEqual(rollup_snapshot(self.user), rollups)
+
+    @unittest.skipIf(connection.vendor == "mysql", "MySQL は PartitioningTests で確認する")
+    def test_partitioning_is_mysql_only(self):
+        with self.assertRaises(ValueError):
+            HealthRetentionService.enable_partitioning()
+        self.assertEqual(HealthRetentionService.ensure_partitions(), [])
+
+    def test_unlimited_retention_does_nothing(self):
+        HealthDataService.bulk_create_health_data(self.user, make_rows(self.now - timedelta(days=400), 5))
+
+        with override_settings(HEALTH_RAW_RETENTION_DAYS=0):
+            self.assertEqual(HealthRetentionService.expire()["rows"], 0)
+        self.assertEqual(HealthData.objects.count(), 5)
+
+
+@unittest.skipUnless(connection.vendor == "mysql", "月別パーティションは MySQL のみ")
+class PartitioningTests(TransactionTestCase):
+    """パーティションの DDL は暗黙にコミットされるため TransactionTestCase で実行する"""
+
+    def setUp(self):
+        caches[settings.HEALTH_SUMMARY_CACHE].clear()
+        self.user = User.objects.create_user(email="partition@example.com", password="pw12345!x", gender="男性")
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        now_jst = self.now.astimezone(JST)
+        self.this_month = (now_jst.year, now_jst.month)
+        self.old_month = partitioning.add_months(*self.this_month, -3)
+
+        old = partitioning.month_start(*self.old_month) + timedelta(days=1)
+        HealthDataService.bulk_create_health_data(self.user, make_rows(old, 20) + make_rows(self.now, 10))
+
+    def tearDown(self):
+        if partitioning.is_partitioned(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE `{HealthData._meta.db_table}` REMOVE PARTITIONING")
+
+    def test_create_rotate_and_drop(self):
+        created = HealthRetentionService.enable_partitioning(months_ahead=1)
+
+        self.assertEqual(created[0], self.old_month)
+        self.assertEqual(created[-1], partitioning.add_months(*self.this_month, 1))
+        self.assertEqual(HealthData.objects.count(), 30)
+
+        # 先の月の追加（pfuture の分割）は既存の最後の月の翌月から
+        added = HealthRetentionService.ensure_partitions(months_ahead=3)
+        self.assertEqual(added, [partitioning.add_months(*self.this_month, n) for n in (2, 3)])
+        self.assertEqual(partitioning.list_partitions(connection)[-1], added[-1])
+        self.assertEqual(HealthRetentionService.ensure_partitions(months_ahead=3), [])
+
+        # 月全体が期限切れのパーティションだけを DROP する（境界を old_month の翌月初にする）
+        bound = partitioning.month_start(*partitioning.add_months(*self.old_month, 1))
+        days = (self.now.astimezone(JST).date() - bound.date()).days
+        result = HealthRetentionService.expire(days=days, archive=False)
+        self.assertEqual(result["partitions"], [partitioning.partition_name(*self.old_month)])
+        self.assertEqual((result["rows"], result["users"]), (20, 1))
+        self.assertEqual(partitioning.list_partitions(connection)[0], partitioning.add_months(*self.old_month, 1))
+        self.assertEqual(HealthData.objects.filter(user=self.user).count(), 10)
+        self.assertEqual(HealthCounterService.get_count(self.user.pk), 10)
+
+    def test_enable_twice_is_rejected(self):
+        HealthRetentionService.enable_partitioning(months_ahead=0)
+
+        with self.assertRaises(ValueError):
+            HealthRetentionService.enable_partitioning()
+
+
+# ==========================================================
+# 書き込み遅延（スプールの再試行・隔離）
+# ==========================================================
+class WriteBehindTests(HealthTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+        self.other = User.objects.create_user(email="other@example.com", password="pw12345!x", gender="男性")
+
+    def _buffer(self):
+        buffer = write_behind.WriteBehindBuffer(
+            self.spool_dir, flush_ms=3600 * 1000, flush_rows=10 ** 9, fsync=False, max_attempts=2
+        )
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def _failing_for(self, user):
+        original = HealthDataService.bulk_create_health_data
+
+        def bulk_create(target, rows, device_id=None, **kwargs):
+            if target.pk == user.pk:
+                raise ValueError("bad row")
+            return original(target, rows, device_id=device_id, **kwargs)
+
+        return mock.patch.object(HealthDataService, "bulk_create_health_data", side_effect=bulk_create)
+
+    def test_records_round_trip_through_segment(self):
+        rows = make_rows(self.now, 3)
+        path = os.path.join(self.spool_dir, "segment.seg")
+        with open(path, "wb") as f:
+            f.write(write_behind.encode_record(self.user.pk, "dev-1", rows))
+            f.write(b"\x10\x00\x00\x00broken")
+
+        with self.assertLogs("health.write_behind", "WARNING"):
+            records = write_behind.read_segment(path)
+
+        self.assertEqual(len(records), 1)
+        user_id, device_id, decoded = records[0]
+        self.assertEqual((user_id, device_id), (self.user.pk, "dev-1"))
+        self.assertEqual([row[:3] for row in decoded], [row[:3] for row in rows])
+
+    def test_connection_errors_are_retried_without_limit(self):
+        buffer = self._buffer()
+        buffer.enqueue(self.user.pk, make_rows(self.now, 3))
+
+        with mock.patch.object(HealthDataService, "bulk_create_health_data", side_effect=OperationalError):
+            for _ in range(3):
+                with self.assertRaises(OperationalError):
+                    buffer.flush()
+
+        self.assertEqual(buffer.queued_rows, 3)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(buffer.queued_rows, 0)
+
+    def test_failing_records_are_quarantined_after_max_attempts(self):
+        buffer = self._buffer()
+        buffer.enqueue(self.user.pk, make_rows(self.now, 3))
+        buffer.enqueue(self.other.pk, make_rows(self.now, 2))
+
+        with self._failing_for(self.other), self.assertLogs("health.write_behind", "WARNING"):
+            self.assertEqual(buffer.flush(), 3)
+            self.assertEqual(buffer.queued_rows, 2)
+            self.assertEqual(buffer.flush(), 0)
+
+        self.assertEqual(buffer.queued_rows, 0)
+        quarantine_dir = os.path.join(self.spool_dir, write_behind.QUARANTINE_DIR)
+        self.assertEqual(len(os.listdir(quarantine_dir)), 1)
+
+        self.assertEqual(write_behind.replay_quarantine(self.spool_dir), (1, 2, 0))
+        self.assertEqual(HealthData.objects.filter(user=self.other).count(), 2)
+        self.assertEqual(os.listdir(quarantine_dir), [])
+
+    def test_orphan_spool_is_recovered(self):
+        directory = os.path.join(self.spool_dir, "1234-dead")
+        os.makedirs(directory)
+        with open(os.path.join(directory, "000000000001.seg"), "wb") as f:
+            f.write(write_behind.encode_record(self.user.pk, None, make_rows(self.now, 4)))
+            f.write(write_behind.encode_record(self.other.pk, None, make_rows(self.now, 2)))
+
+        with self._failing_for(self.other), self.assertLogs("health.write_behind", "ERROR"):
+            self.assertEqual(write_behind.recover_orphans(self.spool_dir), (1, 4))
+
+        self.assertFalse(os.path.exists(directory))
+        self.assertEqual(HealthData.objects.filter(user=self.user).count(), 4)
+        quarantined = os.listdir(os.path.join(self.spool_dir, write_behind.QUARANTINE_DIR))
+        self.assertEqual(quarantined, ["1234-dead-000000000001.seg"])
+
+
+# ==========================================================
+# サーバー側の睡眠判定
+# ==========================================================
+class SleepDetectionTests(HealthTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.day = (self.now.astimezone(JST) - timedelta(days=2)).date()
+        bedtime = SleepDetectionService.night_range(self.day)[0] + timedelta(hours=10)  # 前日22時
+        # 22時〜6時に1分ごと、2時に5分の途切れ（区間が2つに分かれる）
+        rows = [
+            (bedtime + timedelta(minutes=i), Decimal("36.2"), 58, 0.1)
+            for i in range(8 * 60) if not 240 <= i < 245
+        ]
+        HealthDataService.bulk_create_health_data(self.user, rows)
+
+    def test_night_is_split_into_periods(self):
+        result = SleepDetectionService.detect([self.user.pk], self.day, self.day)
+
+        self.assertEqual((result["nights"], result["periods"]), (1, 2))
+        sleep = SleepData.objects.get(user=self.user, date=self.day)
+        self.assertTrue(sleep.detected)
+        self.assertAlmostEqual(float(sleep.sleep_hours), 8, delta=0.2)
+        self.assertEqual(sleep.sleep_quality, "good")
+        minutes = list(SleepPeriod.objects.filter(user=self.user, date=self.day).values_list("minutes", flat=True))
+        self.assertAlmostEqual(sum(minutes), 475, delta=5)
+
+    def test_redetection_removes_nights_that_no_longer_qualify(self):
+        SleepDetectionService.detect([self.user.pk], self.day, self.day)
+        other_day = self.day - timedelta(days=1)
+        SleepDataService.create_sleep_data(self.user, {"date": other_day, "sleep_hours": 7})
+
+        # 1晩の判定に必要なサンプル数を下回る（23時以降を削除）
+        night_start, _ = SleepDetectionService.night_range(self.day)
+        HealthData.objects.filter(user=self.user, measured_at__gte=night_start + timedelta(hours=11)).delete()
+        result = SleepDetectionService.detect([self.user.pk], other_day, self.day)
+
+        self.assertEqual((result["nights"], result["removed"]), (0, 1))
+        self.assertFalse(SleepData.objects.filter(user=self.user, date=self.day).exists())
+        self.assertFalse(SleepPeriod.objects.filter(user=self.user).exists())
+        # 利用者が登録した夜は残す
+        self.assertTrue(SleepData.objects.filter(user=self.user, date=other_day).exists())
+
+    def test_dry_run_does_not_write(self):
+        SleepDetectionService.detect([self.user.pk], self.day, self.day)
+        HealthData.objects.filter(user=self.user).delete()
+
+        result = SleepDetectionService.detect([self.user.pk], self.day, self.day, dry_run=True)
+
+        self.assertEqual(result["removed"], 1)
+        self.assertTrue(SleepData.objects.filter(user=self.user, date=self.day).exists())
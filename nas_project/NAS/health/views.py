@@ -1,13 +1,13 @@
 # health/views.py
 
-from datetime import date, timedelta, datetime
+from datetime import date, timedelta
 from zoneinfo import ZoneInfo
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg
 from django.utils import timezone
-from .models import HealthData, SleepData
+from .models import SleepData
+from .services import HealthDataService
 
 
 def get_week_range(weeks_ago=0):
@@ -52,37 +52,10 @@ def body_data_json(request):
     user = request.user
     weeks_ago = int(request.GET.get("weeks_ago", 0))
 
-    jst = ZoneInfo('Asia/Tokyo')
     start_of_week, end_of_week, date_list = get_week_range(weeks_ago)
 
     labels = ["日", "月", "火", "水", "木", "金", "土"]
-    heart_rate = []
-    temperature = []
-
-    for day in date_list:
-        day_start = timezone.make_aware(
-            datetime.combine(day, datetime.min.time()), jst
-        )
-        day_end = timezone.make_aware(
-            datetime.combine(day, datetime.max.time()), jst
-        )
-
-        day_data = HealthData.objects.filter(
-            user=user,
-            measured_at__gte=day_start,
-            measured_at__lte=day_end
-        )
-
-        if day_data.exists():
-            avg = day_data.aggregate(
-                avg_hr=Avg('heart_rate'),
-                avg_temp=Avg('body')
-            )
-            heart_rate.append(round(avg['avg_hr']) if avg['avg_hr'] else None)
-            temperature.append(round(float(avg['avg_temp']), 1) if avg['avg_temp'] else None)
-        else:
-            heart_rate.append(None)
-            temperature.append(None)
+    heart_rate, temperature = HealthDataService.get_daily_averages(user, date_list)
 
     period_label = f"{start_of_week.month}/{start_of_week.day} ~ {end_of_week.month}/{end_of_week.day}"
 
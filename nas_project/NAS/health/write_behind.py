@@ -0,0 +1,557 @@
+# health/write_behind.py
+
+"""
+身体データの書き込み遅延（write-behind）バッファ
+
+検証済みのサンプルをプロセス内のキューに積み、同時にローカルのスプールファイル
+（追記専用のセグメント）へ書き出してからレスポンスを返す。
+バックグラウンドのフラッシャーが flush_ms ミリ秒ごと、または flush_rows 件たまるごとに
+HealthDataService.bulk_create_health_data でまとめてDBへ登録し、
+登録が終わったセグメントを削除する。
+
+スプールの構成:
+    <spool_dir>/<プロセスごとのディレクトリ>/
+        lock               プロセスが生きている間 flock で排他ロックを保持する
+        000000000001.seg   セグメント（レコードを追記するだけ）
+        ...
+
+1レコードは「長さ(uint32) + CRC32(uint32) + JSON」。書き込み途中で落ちた末尾の
+レコードは長さかCRCが合わないため、そこで読み込みを打ち切る。
+
+プロセスが落ちた・再起動した場合、ロックが外れたディレクトリのセグメントを
+次に起動したプロセス（または flush_health_spool コマンド）が登録し直す。
+(user, measured_at) の重複は bulk_create_health_data がスキップするため、
+フラッシュ途中で落ちたセグメントを再登録しても二重にはならない。
+追記ごとに fsync する設定（既定）では、OSの停止・電源断でも応答済みのサンプルは残る。
+
+DBに接続できない間はキューとセグメントを残して再試行し続ける。それ以外のエラー
+（データ起因など）はユーザー・デバイス単位で切り分け、max_attempts 回失敗したレコードを
+<spool_dir>/.quarantine/ へ隔離して再試行から外す（flush_health_spool --quarantine で再登録）。
+"""
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<II")  # (JSONの長さ, CRC32)
+SEGMENT_SUFFIX = ".seg"
+LOCK_FILE = "lock"
+QUARANTINE_DIR = ".quarantine"
+RETRY_SECONDS = 5  # DBへの登録に失敗した場合の再試行間隔
+
+# DBの停止・接続断など、同じデータで再試行すれば成功しうるエラー（試行回数に数えない）
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+# ==========================================================
+# スプールファイルの読み書き
+# ==========================================================
+def encode_record(user_id, device_id, rows):
+    """(measured_at, body, heart_rate, motion) の行を1レコードのバイト列にする"""
+    payload = json.dumps({
+        "u": user_id,
+        "d": device_id,
+        "r": [
+            [
+                measured_at.isoformat(),
+                str(body),
+                heart_rate,
+                None if motion is None else str(motion),
+            ]
+            for measured_at, body, heart_rate, motion, *_ in rows
+        ],
+    }, separators=(",", ":")).encode()
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_payload(payload):
+    data = json.loads(payload)
+    rows = [
+        (
+            datetime.fromisoformat(measured_at),
+            Decimal(body),
+            heart_rate,
+            None if motion is None else Decimal(motion),
+        )
+        for measured_at, body, heart_rate, motion in data["r"]
+    ]
+    return data["u"], data["d"], rows
+
+
+def read_segment(path):
+    """
+    セグメントのレコードを先頭から読む
+
+    Returns:
+        list[tuple]: [(user_id, device_id, rows), ...]
+            末尾が書きかけ（長さ・CRC不一致）の場合はその手前まで
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    records = []
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            logger.warning("スプールの破損したレコード以降を読み飛ばしました: %s (offset=%d)", path, offset)
+            break
+        records.append(_decode_payload(payload))
+        offset = start + length
+
+    return records
+
+
+def _segment_paths(directory):
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def _ingest(records, failed=None):
+    """
+    スプールのレコードをユーザー・デバイスごとにまとめてDBへ登録する
+
+    Args:
+        records: [(user_id, device_id, rows), ...]
+        failed: リストを渡すと、DB接続以外のエラーで登録できなかった (user_id, device_id) を
+                追加して残りのグループの登録を続ける（省略時は例外をそのまま送出）
+
+    Returns:
+        int: 登録件数（重複としてスキップした分は含まない）
+    """
+    from accounts.models import User
+    from .services import HealthDataService
+
+    grouped = defaultdict(list)
+    for user_id, device_id, rows in records:
+        grouped[(user_id, device_id)].extend(rows)
+
+    users = User.objects.in_bulk({user_id for user_id, _ in grouped})
+    created = 0
+    for (user_id, device_id), rows in grouped.items():
+        user = users.get(user_id)
+        if user is None:
+            # バッファ中に退会したユーザーのデータは捨てる
+            logger.warning("退会済みユーザーのスプールデータを破棄しました: user=%s rows=%d", user_id, len(rows))
+            continue
+        rows.sort(key=lambda row: row[0])
+        try:
+            created += HealthDataService.bulk_create_health_data(user, rows, device_id=device_id)[0]
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception:
+            if failed is None:
+                raise
+            logger.exception("身体データを登録できませんでした: user=%s device=%s", user_id, device_id)
+            failed.append((user_id, device_id))
+
+    return created
+
+
+def quarantine(spool_dir, name, records):
+    """
+    登録できないレコードを隔離ディレクトリのセグメントへ書き出す（以降の再試行から外す）
+
+    Args:
+        spool_dir: スプールのルートディレクトリ
+        name: 隔離先のセグメント名（拡張子なし）
+        records: [(user_id, device_id, rows), ...]
+    """
+    directory = os.path.join(spool_dir, QUARANTINE_DIR)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd = os.open(os.path.join(directory, f"{name}{SEGMENT_SUFFIX}"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    try:
+        os.write(fd, b"".join(encode_record(user_id, device_id, rows) for user_id, device_id, rows in records))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    logger.error(
+        "登録できない身体データを隔離しました: %s (%d件)",
+        name, sum(len(rows) for _, _, rows in records)
+    )
+
+
+def _ingest_segment(spool_dir, name, records):
+    """
+    セグメント1つ分を登録し、DB接続以外のエラーで登録できなかったレコードは隔離する
+    （終了したプロセスのスプールは失敗回数を持たないため、再試行せずに隔離する）
+
+    Returns:
+        int: 登録件数
+    """
+    failed = []
+    created = _ingest(records, failed=failed)
+    if failed:
+        quarantine(spool_dir, name, [
+            record for record in records if (record[0], record[1]) in failed
+        ])
+    return created
+
+
+def replay_quarantine(spool_dir):
+    """
+    隔離したレコードをDBへ登録し直す（原因を取り除いた後に実行する）
+    登録できたセグメントだけを削除する
+
+    Returns:
+        tuple: (登録できたセグメント数, 登録件数, 残ったセグメント数)
+    """
+    directory = os.path.join(spool_dir, QUARANTINE_DIR)
+    if not os.path.isdir(directory):
+        return 0, 0, 0
+
+    replayed = 0
+    created = 0
+    remaining = 0
+    for path in _segment_paths(directory):
+        failed = []
+        created += _ingest(read_segment(path), failed=failed)
+        if failed:
+            # 登録済みのグループは再実行しても重複としてスキップされる
+            remaining += 1
+            continue
+        os.remove(path)
+        replayed += 1
+
+    return replayed, created, remaining
+
+
+def recover_orphans(spool_dir, exclude=None):
+    """
+    終了したプロセスが残したスプールをDBへ登録して削除する
+
+    Args:
+        spool_dir: スプールのルートディレクトリ
+        exclude: 対象外にするディレクトリ（自プロセスのもの）
+
+    Returns:
+        tuple: (処理したディレクトリ数, 登録件数)
+    """
+    if not os.path.isdir(spool_dir):
+        return 0, 0
+
+    directories = 0
+    created = 0
+    for name in sorted(os.listdir(spool_dir)):
+        directory = os.path.join(spool_dir, name)
+        if name.startswith(".") or directory == exclude or not os.path.isdir(directory):
+            continue
+
+        lock_fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # 稼働中のプロセスのスプール
+
+            for path in _segment_paths(directory):
+                name = f"{os.path.basename(directory)}-{os.path.basename(path)[:-len(SEGMENT_SUFFIX)]}"
+                created += _ingest_segment(spool_dir, name, read_segment(path))
+                os.remove(path)
+            shutil.rmtree(directory, ignore_errors=True)
+            directories += 1
+        finally:
+            os.close(lock_fd)
+
+    return directories, created
+
+
+# ==========================================================
+# プロセス内バッファ
+# ==========================================================
+class WriteBehindBuffer:
+    """
+    プロセス内キュー + 追記専用スプール + バックグラウンドのフラッシャー
+
+    enqueue() はスプールへの追記（1回の write と fsync）とキューへの追加だけを行う。
+    DBへの登録はフラッシャースレッドがまとめて行う。
+    """
+
+    def __init__(self, spool_dir, flush_ms=200, flush_rows=1000, max_rows=200000,
+                 segment_bytes=8 * 1024 * 1024, fsync=True, max_attempts=5):
+        self.spool_dir = spool_dir
+        self.flush_interval = flush_ms / 1000
+        self.flush_rows = flush_rows
+        self.max_rows = max_rows
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue = []        # [(segment_no, user_id, device_id, rows, 失敗回数), ...]
+        self._queued_rows = 0
+        self._stopping = False
+
+        # ロックを取ってから公開する（作成直後のディレクトリを他プロセスが回収しないように）
+        name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        staging = os.path.join(spool_dir, f".{name}")
+        os.makedirs(staging, mode=0o700)
+        self._lock_fd = os.open(os.path.join(staging, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        self.directory = os.path.join(spool_dir, name)
+        os.rename(staging, self.directory)
+
+        self._segment_no = 0
+        self._segment_fd = None
+        self._segment_size = 0
+        self._open_segment()
+
+        self._thread = threading.Thread(target=self._run, name="health-write-behind", daemon=True)
+        self._thread.start()
+
+    def _segment_path(self, segment_no):
+        return os.path.join(self.directory, f"{segment_no:012d}{SEGMENT_SUFFIX}")
+
+    def _open_segment(self):
+        """新しいセグメントに切り替える（_lock を保持して呼ぶ）"""
+        if self._segment_fd is not None:
+            os.close(self._segment_fd)
+        self._segment_no += 1
+        self._segment_fd = os.open(
+            self._segment_path(self._segment_no),
+            os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600
+        )
+        self._segment_size = 0
+        if self.fsync:
+            # 新しいファイルのディレクトリエントリも永続化する
+            directory_fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(directory_fd)
+            finally:
+                os.close(directory_fd)
+
+    @property
+    def queued_rows(self):
+        return self._queued_rows
+
+    def enqueue(self, user_id, rows, device_id=None):
+        """
+        検証済みの行をスプールに追記してキューに積む
+
+        Returns:
+            bool: 積めた場合 True。キューが上限（DB停止が長引いた場合など）なら False
+        """
+        if not rows:
+            return True
+
+        record = encode_record(user_id, device_id, rows)
+
+        with self._lock:
+            if self._stopping or self._queued_rows + len(rows) > self.max_rows:
+                return False
+
+            if self._segment_size >= self.segment_bytes:
+                self._open_segment()
+            os.write(self._segment_fd, record)
+            if self.fsync:
+                os.fsync(self._segment_fd)
+            self._segment_size += len(record)
+
+            self._queue.append((self._segment_no, user_id, device_id, list(rows), 0))
+            self._queued_rows += len(rows)
+            if self._queued_rows >= self.flush_rows:
+                self._wakeup.notify()
+
+        return True
+
+    def flush(self):
+        """
+        キューの内容をDBへ登録し、登録済みのセグメントを削除する
+
+        Returns:
+            int: 登録件数
+        """
+        with self._lock:
+            if not self._queue:
+                return 0
+            # 以降の追記は新しいセグメントへ。取り出した分は閉じたセグメントにだけ入っている
+            batch, self._queue = self._queue, []
+            self._queued_rows -= sum(len(entry[3]) for entry in batch)
+            self._open_segment()
+            flushed_through = self._segment_no - 1
+
+        failed = []
+        try:
+            created = _ingest(
+                [(user_id, device_id, rows) for _, user_id, device_id, rows, _ in batch],
+                failed=failed,
+            )
+        except TRANSIENT_ERRORS:
+            # DBに接続できない場合はキューの先頭に戻し、セグメントも残して次回やり直す
+            # （登録済みのグループは次回重複としてスキップされる）
+            self._requeue(batch)
+            raise
+
+        retained = self._count_failures(batch, failed) if failed else []
+        self._requeue(retained)
+
+        # 再試行するレコードが残っているセグメントは消さない
+        kept = {entry[0] for entry in retained}
+        for segment_no in range(batch[0][0], flushed_through + 1):
+            if segment_no in kept:
+                continue
+            try:
+                os.remove(self._segment_path(segment_no))
+            except FileNotFoundError:
+                pass
+
+        return created
+
+    def _count_failures(self, batch, failed):
+        """
+        登録できなかったグループのエントリの失敗回数を数え、max_attempts 回に達したものを隔離する
+
+        Returns:
+            list: 再試行するエントリ
+        """
+        retained = []
+        for segment_no, user_id, device_id, rows, attempts in batch:
+            if (user_id, device_id) not in failed:
+                continue
+            attempts += 1
+            if attempts < self.max_attempts:
+                logger.warning(
+                    "身体データの登録を再試行します（%d/%d回失敗）: user=%s",
+                    attempts, self.max_attempts, user_id
+                )
+                retained.append((segment_no, user_id, device_id, rows, attempts))
+            else:
+                quarantine(
+                    self.spool_dir,
+                    f"{os.path.basename(self.directory)}-{segment_no:012d}",
+                    [(user_id, device_id, rows)],
+                )
+        return retained
+
+    def _requeue(self, entries):
+        """登録できなかったエントリをキューの先頭に戻す"""
+        if not entries:
+            return
+        with self._lock:
+            self._queue[:0] = entries
+            self._queued_rows += sum(len(entry[3]) for entry in entries)
+
+    def _run(self):
+        # 前回の起動で残ったスプールを登録する（DBが止まっていれば成功するまで毎回試す）
+        recovered = False
+
+        while True:
+            if not recovered:
+                recovered = self._call_db(recover_orphans, self.spool_dir, exclude=self.directory)
+
+            with self._lock:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and self._queued_rows < self.flush_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                stopping = self._stopping
+
+            if not self._call_db(self.flush):
+                if stopping:
+                    return
+                time.sleep(RETRY_SECONDS)
+            if stopping:
+                return
+
+    def _call_db(self, func, *args, **kwargs):
+        close_old_connections()
+        try:
+            func(*args, **kwargs)
+            return True
+        except Exception:
+            logger.exception("身体データのスプールをDBへ登録できませんでした（スプールに残して再試行します）")
+            return False
+        finally:
+            close_old_connections()
+
+    def close(self, timeout=10):
+        """
+        フラッシャーを止める（残りを登録してから終了）。
+        登録できなかった分はスプールに残り、次の起動時に登録される
+        """
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return  # 登録が終わらなかった分はスプールに残る
+
+        with self._lock:
+            os.close(self._segment_fd)
+            if not self._queue:
+                shutil.rmtree(self.directory, ignore_errors=True)
+            os.close(self._lock_fd)
+
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def is_enabled():
+    return settings.HEALTH_WRITE_BEHIND
+
+
+def get_buffer():
+    """
+    このプロセスのバッファ（初回呼び出し時に作成）
+    gunicorn の prefork 後に各ワーカーで作られるよう、import 時には作らない
+    """
+    global _buffer, _buffer_pid
+
+    pid = os.getpid()
+    if _buffer is not None and _buffer_pid == pid:
+        return _buffer
+
+    with _buffer_lock:
+        if _buffer is None or _buffer_pid != pid:
+            _buffer = WriteBehindBuffer(
+                settings.HEALTH_WRITE_BEHIND_SPOOL_DIR,
+                flush_ms=settings.HEALTH_WRITE_BEHIND_FLUSH_MS,
+                flush_rows=settings.HEALTH_WRITE_BEHIND_FLUSH_ROWS,
+                max_rows=settings.HEALTH_WRITE_BEHIND_MAX_ROWS,
+                fsync=settings.HEALTH_WRITE_BEHIND_FSYNC,
+                max_attempts=settings.HEALTH_WRITE_BEHIND_MAX_ATTEMPTS,
+            )
+            _buffer_pid = pid
+            atexit.register(_buffer.close)
+
+    return _buffer
+
+
+def enqueue(user, rows, device_id=None):
+    """
+    write-behind が有効ならバッファに積む
+
+    Returns:
+        bool: 積めた場合 True。無効・上限超過の場合 False（呼び出し側で同期登録する）
+    """
+    if not is_enabled():
+        return False
+    return get_buffer().enqueue(user.pk, rows, device_id=device_id)
@@ -1,4 +1,5 @@
 from django.db import models
+from accounts.sequences import format_id, max_suffix, next_value
 
 class HelpCategory(models.Model):
     category_id = models.CharField(
@@ -33,18 +34,13 @@ class HelpArticle(models.Model):
     def save(self, *args, **kwargs):
         # help_id が指定されていない時に自動生成
         if not self.help_id:
-            prefix = self.category.category_id  # A, B, C...
-            last_article = HelpArticle.objects.filter(
-                help_id__startswith=prefix
-            ).order_by('-help_id').first()
-
-            if last_article:
-                last_num = int(last_article.help_id[1:])
-                next_num = last_num + 1
-            else:
-                next_num = 1
-
-            self.help_id = f"{prefix}{next_num:03d}"
+            prefix = self.category_id  # A, B, C...
+            # カテゴリごとに999件までなので、欠番が出ないよう1つずつ払い出す
+            next_num = next_value(f"help:{prefix}", block_size=1, initial=lambda: max_suffix(
+                HelpArticle.objects.filter(help_id__startswith=prefix).order_by('-help_id')
+                .values_list('help_id', flat=True)[:1], prefix
+            ))
+            self.help_id = format_id(prefix, next_num, HelpArticle._meta.get_field('help_id').max_length)
 
         super().save(*args, **kwargs)
 
@@ -5,6 +5,7 @@ from typing import List, Dict, Optional, Any
 from datetime import datetime
 import uuid
 
+from accounts.sequences import max_suffix, next_value
 from .repository import InquiryRepository
 from .data_models import Inquiry, InquiryThreadEntry
 
@@ -14,19 +15,19 @@ logger = logging.getLogger(__name__)
 class InquiryService:
 
     @staticmethod
-    def _generate_inquiry_id() -> str:
+    def _max_inquiry_number() -> int:
+        """JSON 内の問い合わせIDの最大番号（採番カウンタの初期値。初回のみ全件を読む）"""
         all_data = InquiryRepository.get_all_inquiries_by_user()
-        max_id = 0
-
-        for user_entry in all_data:
-            for inquiry in user_entry.inquiries:
-                try:
-                    num = int(inquiry.inquiryID.replace("I", ""))
-                    max_id = max(max_id, num)
-                except:
-                    pass
+        return max_suffix(
+            [inquiry.inquiryID for user_entry in all_data for inquiry in user_entry.inquiries],
+            "I"
+        )
 
-        return f"I{max_id + 1:05d}"
+    @staticmethod
+    def _generate_inquiry_id() -> str:
+        # 問い合わせIDは利用者に表示されるため、欠番が出ないよう1つずつ払い出す
+        next_num = next_value("inquiry", block_size=1, initial=InquiryService._max_inquiry_number)
+        return f"I{next_num:05d}"
 
 
     @staticmethod
@@ -44,10 +44,18 @@ INSTALLED_APPS = [
 # ==========================================================
 AUTH_USER_MODEL = 'accounts.User'
 
+# ID の採番で一度に予約する個数の既定値（プロセス再起動時は未使用分が欠番になる）
+# 利用者ID・問い合わせIDなど利用者に見えるIDは、この設定によらず1つずつ払い出す
+ID_SEQUENCE_BLOCK_SIZE = int(os.getenv('ID_SEQUENCE_BLOCK_SIZE', '20'))
+
 AUTHENTICATION_BACKENDS = [
     'accounts.backends.UserOrAdminBackend',
 ]
 
+# セッション復元時のユーザーをプロセス内にキャッシュする秒数（0 で無効）
+# 自プロセスでの変更は即時破棄、他プロセスでの変更はこの秒数以内に反映される
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '30'))
+
 # ==========================================================
 # ミドルウェア
 # ==========================================================
@@ -170,7 +178,7 @@ LOGOUT_REDIRECT_URL = '/'
 # ==========================================================
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -204,6 +212,8 @@ SIMPLE_JWT = {
     'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.tokens.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.tokens.TokenRefreshSerializer',
     'TOKEN_TYPE_CLAIM': 'token_type',
     
     'JTI_CLAIM': 'jti',
@@ -213,6 +223,53 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# ==========================================================
+# キャッシュ設定（既定はプロセス内メモリ、環境変数で Redis 等に差し替え可能）
+# ==========================================================
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'nas-default'),
+    }
+}
+
+# ヘルスデータサマリーのキャッシュ（CACHES のエイリアスと有効期限[秒]）
+# エントリはデータバージョン付きで、読み込み時に現在のバージョンと照合する。
+# LocMem（プロセスごと）でも古いサマリーは返らないが、他プロセスでの書き込み後は
+# そのプロセスで作り直しになるため、共有キャッシュの方がDBアクセスは少ない
+HEALTH_SUMMARY_CACHE = os.getenv('HEALTH_SUMMARY_CACHE', 'default')
+HEALTH_SUMMARY_CACHE_TIMEOUT = int(os.getenv('HEALTH_SUMMARY_CACHE_TIMEOUT', '300'))
+
+# JWT のトークンバージョンのキャッシュ（CACHES のエイリアスと有効期限[秒]）
+# 共有キャッシュ（Redis / Memcached など）を指定した場合だけ使う。
+# LocMem などプロセスごとのキャッシュでは失効が他プロセスに届かないため、毎回DBから読む
+# （その場合は起動時のチェックで accounts.W001 を警告する。本番では CACHE_BACKEND に共有キャッシュを指定すること）
+AUTH_TOKEN_VERSION_CACHE = os.getenv('AUTH_TOKEN_VERSION_CACHE', 'default')
+AUTH_TOKEN_VERSION_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_VERSION_CACHE_TIMEOUT', '300'))
+
+# リフレッシュトークンのブラックリスト照合用 Bloom フィルタを作り直す間隔[秒]（0 で無効・毎回DBを引く）
+AUTH_TOKEN_BLACKLIST_FILTER_TTL = int(os.getenv('AUTH_TOKEN_BLACKLIST_FILTER_TTL', '300'))
+
+# ヘルスデータ生データの保持期間[日]（0 は無期限。期限切れは集計テーブルにのみ残る）
+HEALTH_RAW_RETENTION_DAYS = int(os.getenv('HEALTH_RAW_RETENTION_DAYS', '0'))
+# 期限切れの生データを healthdata_archive へ退避するか
+HEALTH_RETENTION_ARCHIVE = os.getenv('HEALTH_RETENTION_ARCHIVE', 'False') == 'True'
+# 月別パーティション（MySQL）を何か月先まで作成しておくか
+HEALTH_PARTITION_MONTHS_AHEAD = int(os.getenv('HEALTH_PARTITION_MONTHS_AHEAD', '3'))
+
+# 身体データの書き込み遅延（検証済みサンプルをローカルのスプールに追記し、まとめてDBへ登録する）
+HEALTH_WRITE_BEHIND = os.getenv('HEALTH_WRITE_BEHIND', 'False') == 'True'
+HEALTH_WRITE_BEHIND_SPOOL_DIR = os.getenv('HEALTH_WRITE_BEHIND_SPOOL_DIR', os.path.join(BASE_DIR, 'spool', 'health'))
+# 登録間隔[ミリ秒]・この件数たまったら間隔を待たずに登録
+HEALTH_WRITE_BEHIND_FLUSH_MS = int(os.getenv('HEALTH_WRITE_BEHIND_FLUSH_MS', '200'))
+HEALTH_WRITE_BEHIND_FLUSH_ROWS = int(os.getenv('HEALTH_WRITE_BEHIND_FLUSH_ROWS', '1000'))
+# プロセス内に保持する上限件数（超えた分は同期で登録する）
+HEALTH_WRITE_BEHIND_MAX_ROWS = int(os.getenv('HEALTH_WRITE_BEHIND_MAX_ROWS', '200000'))
+# 追記ごとに fsync する（False にすると、OSの停止・電源断で応答済みの直近のサンプルを失うことがある）
+HEALTH_WRITE_BEHIND_FSYNC = os.getenv('HEALTH_WRITE_BEHIND_FSYNC', 'True') == 'True'
+# DB接続以外のエラーで登録に失敗したレコードを隔離するまでの試行回数
+HEALTH_WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv('HEALTH_WRITE_BEHIND_MAX_ATTEMPTS', '5'))
+
 # ==========================================================
 # フロントエンド/メール設定
 # ==========================================================